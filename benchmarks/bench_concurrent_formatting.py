@@ -0,0 +1,58 @@
+#!/usr/bin/env python3
+"""
+    Time Formatter.format_input_data on a dashboard with many panels for
+    an increasing number of threads (n_jobs).
+
+    To run:
+    >>> python benchmarks/bench_concurrent_formatting.py --panels 48
+"""
+import argparse
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+from stocksdashboard import Formatter
+
+
+def many_panels(n_panels, n_tickers, n_dates, seed=42):
+    rng = np.random.RandomState(seed)
+    dates = pd.bdate_range('1990-01-01', periods=n_dates)
+    input_data = {}
+    for h in range(n_panels):
+        input_data['panel_%02d' % h] = {
+            'T%02d_%02d' % (h, i): {
+                'date': dates.strftime('%Y-%m-%d').tolist(),
+                'adj_close': rng.normal(100, 1, n_dates)}
+            for i in range(n_tickers)}
+    return input_data
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--panels', type=int, default=48)
+    parser.add_argument('--tickers', type=int, default=10)
+    parser.add_argument('--dates', type=int, default=2500)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    input_data = many_panels(args.panels, args.tickers, args.dates)
+    n_jobs = [1]
+    while n_jobs[-1] * 2 <= (os.cpu_count() or 1):
+        n_jobs.append(n_jobs[-1] * 2)
+    print("%-8s %12s %8s" % ('n_jobs', 'seconds', 'speedup'))
+    reference = None
+    for n in n_jobs:
+        timings = []
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            Formatter(n_jobs=n).format_input_data(input_data)
+            timings.append(time.perf_counter() - start)
+        best = min(timings)
+        reference = reference or best
+        print("%-8d %12.3f %8.2f" % (n, best, reference / best))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+"""
+    Latency of the events of a pan of a zoomed-in heatmap panel, with and
+    without the prefetch of the next window in a background thread
+    (StocksDashboard.heatmap_prefetch). The user pauses ``--pause`` seconds
+    between the events of the pan, as when dragging.
+
+    To run:
+    >>> python benchmarks/bench_heatmap_pan.py --tickers 500 --dates 20000
+"""
+import argparse
+import time
+import warnings
+
+import numpy as np
+import pandas as pd
+from bokeh.events import RangesUpdate
+from bokeh.models import Plot
+
+from stocksdashboard import StocksDashboard
+
+
+def create_dashboard(n_tickers, n_dates, prefetch, seed=42):
+    rng = np.random.RandomState(seed)
+    index = pd.bdate_range('1950-01-01', periods=n_dates)
+    values = 100 * np.exp(rng.normal(0, 0.01, (n_dates, n_tickers)).cumsum(0))
+    universe = {'T%04d' % i: pd.Series(values[:, i], index=index)
+                for i in range(n_tickers)}
+    sdb = StocksDashboard(width=800)
+    sdb.heatmap_prefetch = prefetch
+    sdb.build_dashboard(input_data={'universe': universe}, show=False,
+                        panel_type='heatmap')
+    return sdb
+
+
+def percentiles(timings):
+    return tuple(1000 * np.percentile(timings, [50, 99]))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--tickers', type=int, default=500)
+    parser.add_argument('--dates', type=int, default=20000)
+    parser.add_argument('--window', type=int, default=5000,
+                        help='dates visible')
+    parser.add_argument('--step', type=int, default=250,
+                        help='dates panned per event')
+    parser.add_argument('--events', type=int, default=40)
+    parser.add_argument('--pause', type=float, default=0.05)
+    args = parser.parse_args()
+    warnings.simplefilter('ignore')
+
+    print("%d tickers x %d dates, window of %d dates, %d events" % (
+        args.tickers, args.dates, args.window, args.events))
+    for prefetch in [False, True]:
+        sdb = create_dashboard(args.tickers, args.dates, prefetch)
+        p = sdb.layout.select_one({'type': Plot})
+        x = sdb.heatmaps['universe']['x']
+        timings = []
+        for i in range(args.events):
+            lo = (i * args.step) % (len(x) - args.window)
+            event = RangesUpdate(p, x0=x[lo], x1=x[lo + args.window])
+            start = time.perf_counter()
+            p._trigger_event(event)
+            timings.append(time.perf_counter() - start)
+            time.sleep(args.pause)
+        print("prefetch=%-5s p50 %8.2f ms, p99 %8.2f ms" % (
+            (prefetch,) + percentiles(timings)))
+
+
+if __name__ == '__main__':
+    main()
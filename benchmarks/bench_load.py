@@ -0,0 +1,240 @@
+#!/usr/bin/env python3
+"""
+    Load test of concurrent dashboard sessions.
+
+    Starts a Bokeh server with the application load_app.py, opens
+    ``--sessions`` client sessions with bokeh.client, each in its own
+    thread, and replays slider and x range events on all of them. Reports
+    the session open time, the p50/p99 latency of the updates and the
+    resident memory (RSS) of the server.
+
+    - slider: time until the signals updated by the server are received.
+      Only with ``--mode server``: in the 'client' and 'auto' modes the
+      signals are computed in the browser and the server sends nothing,
+      so only the range events are replayed.
+    - range: time until the server has applied the new x range.
+
+    To run:
+    >>> python benchmarks/bench_load.py --sessions 1 5 10 20 --events 20
+
+    Linux only (the RSS is read from /proc).
+
+    Supports Bokeh 2.4 only (the version in requirements.txt): bokeh.client
+    has no public API to wait for the updates pushed by the server
+    (``force_roundtrip`` drops the patches received while waiting for its
+    reply), so the client loop is run with private methods of the
+    session and its connection, which may change in other releases. They
+    are only used by ``wait_for_patch`` and ``count_patches``.
+"""
+import argparse
+import os
+import socket
+import subprocess
+import sys
+import threading
+import time
+import urllib.request
+
+import numpy as np
+import bokeh
+from bokeh.client import pull_session
+from bokeh.models import Plot, Slider
+
+# Versions of Bokeh whose private client API is used (see the docstring).
+BOKEH_VERSIONS = ((2, 4), (3, 0))
+APP = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'load_app.py')
+
+
+def check_bokeh_version():
+    version = tuple([int(v) for v in bokeh.__version__.split('.')[:2]])
+    if not BOKEH_VERSIONS[0] <= version < BOKEH_VERSIONS[1]:
+        raise(RuntimeError(
+            "bench_load.py supports Bokeh >=%d.%d,<%d.%d " %
+            (BOKEH_VERSIONS[0] + BOKEH_VERSIONS[1]) +
+            "(found %s)." % bokeh.__version__))
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('localhost', 0))
+        return s.getsockname()[1]
+
+
+def rss(pid):
+    """ Resident memory (bytes) of the process ``pid`` and its children. """
+    total = 0
+    try:
+        with open('/proc/%d/status' % pid) as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    total += int(line.split()[1]) * 1024
+        for task in os.listdir('/proc/%d/task' % pid):
+            with open('/proc/%d/task/%s/children' % (pid, task)) as f:
+                total += sum([rss(int(child)) for child in f.read().split()])
+    except (IOError, OSError):
+        pass
+    return total
+
+
+class MemorySampler(threading.Thread):
+    """ Sample the RSS of the server every ``interval`` seconds. """
+
+    def __init__(self, pid, interval=0.05):
+        super(MemorySampler, self).__init__(daemon=True)
+        self.pid = pid
+        self.interval = interval
+        self.peak = 0
+        self._stop_event = threading.Event()
+
+    def run(self):
+        while not self._stop_event.is_set():
+            self.peak = max(self.peak, rss(self.pid))
+            time.sleep(self.interval)
+
+    def stop(self):
+        self._stop_event.set()
+        self.join()
+
+
+def start_server(port, app_args, num_procs=1):
+    env = dict(os.environ)
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    env['PYTHONPATH'] = os.pathsep.join(
+        [root] + [p for p in [env.get('PYTHONPATH')] if p])
+    server = subprocess.Popen(
+        [sys.executable, '-m', 'bokeh', 'serve', APP, '--port', str(port),
+         '--num-procs', str(num_procs), '--allow-websocket-origin',
+         'localhost:%d' % port, '--args'] + app_args,
+        env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    url = 'http://localhost:%d/load_app' % port
+    start = time.time()
+    while True:
+        try:
+            urllib.request.urlopen(url).read()
+            return server, url
+        except IOError:
+            if server.poll() is not None or time.time() - start > 60:
+                server.kill()
+                raise(RuntimeError("The Bokeh server did not start."))
+            time.sleep(0.2)
+
+
+def wait_for_patch(session, received, count, timeout=30.):
+    """
+        Run the client loop until ``count`` patches were received from the
+        server. ``force_roundtrip`` can not be used: the client drops the
+        patches received while waiting for a reply.
+    """
+    connection = session._connection
+    timer = connection.io_loop.call_later(timeout, connection.io_loop.stop)
+    connection._loop_until(lambda: len(received) >= count)
+    connection.io_loop.remove_timeout(timer)
+    if len(received) < count:
+        raise(RuntimeError("Timeout waiting for the server update."))
+
+
+def count_patches(session):
+    """
+        List to which the patches received by ``session`` are appended.
+
+        The patches are counted but not applied: the client only needs to
+        know when the update arrived (and bokeh.client can not deserialize
+        the binary arrays of the patches of column data).
+    """
+    received = []
+    session._handle_patch = received.append
+    return received
+
+
+def run_client(url, n_events, think, results, barrier, slider_events=True):
+    start = time.time()
+    session = pull_session(url=url)
+    results['open'].append(time.time() - start)
+    received = count_patches(session)
+    slider = session.document.select_one({'type': Slider})
+    x_range = list(session.document.select({'type': Plot}))[0].x_range
+    start_x, end_x = x_range.start, x_range.end
+    barrier.wait()
+    rng = np.random.RandomState(threading.get_ident() % 2 ** 32)
+    for i in range(n_events):
+        time.sleep(rng.uniform(0, 2 * think))
+        if i % 2 == 0 and slider_events:
+            value = slider.start + (slider.value + 7 - slider.start) % (
+                slider.end - slider.start)
+            count = len(received) + 1
+            start = time.time()
+            slider.value = value
+            wait_for_patch(session, received, count)
+            results['slider'].append(time.time() - start)
+        else:
+            shift = rng.uniform(0, 0.5) * (end_x - start_x)
+            start = time.time()
+            x_range.update(start=start_x + shift, end=end_x + shift)
+            session.force_roundtrip()
+            results['range'].append(time.time() - start)
+    session.close()
+
+
+def percentiles(timings):
+    if not timings:
+        return float('nan'), float('nan')
+    return tuple(1000 * np.percentile(timings, [50, 99]))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--sessions', type=int, nargs='+',
+                        default=[1, 5, 10, 20])
+    parser.add_argument('--events', type=int, default=20,
+                        help="Events replayed per session.")
+    parser.add_argument('--think', type=float, default=0.1,
+                        help="Mean seconds between the events of a session.")
+    parser.add_argument('--tickers', type=int, default=10)
+    parser.add_argument('--dates', type=int, default=2000)
+    parser.add_argument('--num-procs', type=int, default=1)
+    parser.add_argument('--mode', default='server',
+                        choices=['server', 'client', 'auto'])
+    args = parser.parse_args()
+    check_bokeh_version()
+    slider_events = args.mode == 'server'
+
+    port = free_port()
+    server, url = start_server(
+        port, ['--tickers', str(args.tickers), '--dates', str(args.dates),
+               '--mode', args.mode], args.num_procs)
+    try:
+        print("%d tickers x %d dates, %d events per session" % (
+            args.tickers, args.dates, args.events))
+        if not slider_events:
+            print("Mode '%s': the signals are computed in the browser, " %
+                  args.mode + "the slider latency is not measured.")
+        print("%9s %16s %16s %16s %11s %11s" % (
+            'sessions', 'open p50/p99 ms', 'slider p50/p99', 'range p50/p99',
+            'RSS MB', 'peak MB'))
+        for n_sessions in args.sessions:
+            results = {'open': [], 'slider': [], 'range': []}
+            sampler = MemorySampler(server.pid)
+            sampler.start()
+            barrier = threading.Barrier(n_sessions)
+            clients = [threading.Thread(
+                target=run_client,
+                args=(url, args.events, args.think, results, barrier,
+                      slider_events))
+                for i in range(n_sessions)]
+            for client in clients:
+                client.start()
+            for client in clients:
+                client.join()
+            sampler.stop()
+            print("%9d %7.1f/%-8.1f %7.1f/%-8.1f %7.1f/%-8.1f %11.1f %11.1f" %
+                  ((n_sessions,) + percentiles(results['open']) +
+                   percentiles(results['slider']) +
+                   percentiles(results['range']) +
+                   (rss(server.pid) / 2. ** 20, sampler.peak / 2. ** 20)))
+    finally:
+        server.terminate()
+        server.wait()
+
+
+if __name__ == '__main__':
+    main()
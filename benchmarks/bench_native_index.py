@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+"""
+    Compare the memory and payload size of aligned (union index) and
+    native (per series index) storage on a heterogeneous universe:
+    stocks listed at different dates plus an intraday series.
+
+    To run:
+    >>> python benchmarks/bench_native_index.py --tickers 20
+"""
+import argparse
+import json
+import warnings
+
+import numpy as np
+import pandas as pd
+from bokeh.embed import json_item
+
+from stocksdashboard import StocksDashboard
+
+
+def heterogeneous_universe(n_tickers, seed=42):
+    rng = np.random.RandomState(seed)
+    dates = pd.bdate_range('1990-01-01', '2024-12-31')
+    stocks = {}
+    for i in range(n_tickers):
+        # listing dates spread from 1990 to 2020
+        start = rng.randint(0, len(dates) - 1000)
+        ix = dates[start:]
+        stocks['T%03d' % i] = pd.Series(
+            100 * np.exp(np.cumsum(rng.normal(0, 0.01, len(ix)))), index=ix)
+    intraday_ix = pd.date_range('2024-12-23 09:30', periods=5 * 390,
+                                freq='T')
+    intraday = {'INTRADAY': pd.Series(
+        100 * np.exp(np.cumsum(rng.normal(0, 0.001, len(intraday_ix)))),
+        index=intraday_ix)}
+    return {'stocks': stocks, 'intraday': intraday}
+
+
+def measure(input_data, align):
+    dashboard = StocksDashboard()
+    dashboard.build_dashboard(input_data=input_data, show=False, align=align)
+    nbytes = sum([np.asarray(v).nbytes
+                  for ds in dashboard.datasources
+                  for v in ds.data.values()])
+    payload = len(json.dumps(json_item(dashboard.layout)))
+    return nbytes, payload
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--tickers', type=int, default=20)
+    args = parser.parse_args()
+    warnings.simplefilter('ignore')
+
+    input_data = heterogeneous_universe(args.tickers)
+    print("%-8s %15s %15s" % ('mode', 'source bytes', 'payload bytes'))
+    results = {}
+    for mode, align in (('aligned', True), ('native', False)):
+        results[mode] = measure(input_data, align)
+        print("%-8s %15d %15d" % ((mode, ) + results[mode]))
+    print("savings: %.1fx memory, %.1fx payload" % (
+        results['aligned'][0] / results['native'][0],
+        results['aligned'][1] / results['native'][1]))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+"""
+    Compare the latency of creating a session document by running the
+    whole example (format + build) with creating it from a DocumentTemplate
+    built once.
+
+    To run:
+    >>> python benchmarks/bench_session_template.py --sessions 50
+"""
+import argparse
+import time
+import warnings
+
+import numpy as np
+import pandas as pd
+from bokeh.document import Document
+
+from stocksdashboard import StocksDashboard
+from stocksdashboard.template_cache import DocumentTemplate
+
+
+def sampledata_like(n_tickers, n_dates, seed=42):
+    """ Dict of lists with string dates, as bokeh.sampledata.stocks. """
+    rng = np.random.RandomState(seed)
+    dates = pd.bdate_range('2000-01-01', periods=n_dates)
+    dates = dates.strftime('%Y-%m-%d').tolist()
+    stocks = {}
+    for i in range(n_tickers):
+        stocks['T%02d' % i] = {'date': list(dates),
+                               'adj_close': list(rng.normal(100, 1, n_dates))}
+    return {'input_data': {'stocks': stocks}, 'line_width': 2.5}
+
+
+def percentiles(timings):
+    return tuple(1000 * np.percentile(timings, [50, 99]))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--sessions', type=int, default=50)
+    parser.add_argument('--tickers', type=int, default=4)
+    parser.add_argument('--dates', type=int, default=3000)
+    args = parser.parse_args()
+    warnings.simplefilter('ignore')
+
+    build_params = sampledata_like(args.tickers, args.dates)
+    timings = []
+    for i in range(args.sessions):
+        start = time.perf_counter()
+        dashboard = StocksDashboard()
+        dashboard.build_dashboard(show=False, **build_params)
+        Document().add_root(dashboard.layout)
+        timings.append(time.perf_counter() - start)
+    print("build per session: p50 %.1f ms, p99 %.1f ms" %
+          percentiles(timings))
+
+    start = time.perf_counter()
+    template = DocumentTemplate(**build_params)
+    print("template (once):   %.1f ms" %
+          (1000 * (time.perf_counter() - start)))
+    timings = []
+    for i in range(args.sessions):
+        start = time.perf_counter()
+        template.new_document()
+        timings.append(time.perf_counter() - start)
+    print("from template:     p50 %.1f ms, p99 %.1f ms" %
+          percentiles(timings))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+"""
+    Per-event overhead of DashboardWithWidgets.update_data with many
+    columns: one cheap signal is evaluated, so the time is dominated by the
+    preparation of the data where the signals are evaluated.
+
+    - rebuilt: the working set is built on every event (as when the data
+      of the sources changes between events).
+    - reused: the working set is built once and reused.
+
+    To run:
+    >>> python benchmarks/bench_update_data.py --columns 200 --events 50
+"""
+import argparse
+import time
+import warnings
+
+import numpy as np
+import pandas as pd
+
+from stocksdashboard import StocksDashboard
+from stocksdashboard.dashboard_with_widgets import DashboardWithWidgets
+
+
+def create_dashboard(n_columns, n_dates, seed=42):
+    rng = np.random.RandomState(seed)
+    index = pd.bdate_range('2000-01-01', periods=n_dates)
+    # Category20: at most 20 lines per panel
+    input_data = {}
+    for i in range(n_columns):
+        input_data.setdefault('panel%02d' % (i // 20), {})['T%03d' % i] = \
+            pd.Series(rng.normal(100, 1, n_dates), index=index)
+    input_data['signals'] = {'SIGNAL': input_data['panel00']['T000']}
+    sdb = StocksDashboard()
+    sdb.build_dashboard(input_data=input_data, show=False)
+    dashboard = DashboardWithWidgets(
+        sdb, {'w': {'title': 'w', 'params': {'value': 5, 'start': 2,
+                                             'end': 200, 'step': 1}}},
+        {'SIGNAL': 'T000.shift(w)'})
+    dashboard.create_sliders()
+    dashboard.widget_on_change()
+    return dashboard
+
+
+def percentiles(timings):
+    return tuple(1000 * np.percentile(timings, [50, 99]))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--columns', type=int, default=200)
+    parser.add_argument('--dates', type=int, default=2500)
+    parser.add_argument('--events', type=int, default=50)
+    args = parser.parse_args()
+    warnings.simplefilter('ignore')
+
+    dashboard = create_dashboard(args.columns, args.dates)
+    slider = dashboard.sliders['w']
+    print("%d columns x %d dates, %d events" % (
+        args.columns, args.dates, args.events))
+    for name, rebuild in [('rebuilt', True), ('reused', False)]:
+        timings = []
+        for i in range(args.events):
+            if rebuild:
+                dashboard._working_set = None
+            start = time.perf_counter()
+            slider.value = slider.start + (slider.value + 7 - slider.start) \
+                % (slider.end - slider.start)
+            timings.append(time.perf_counter() - start)
+        print("%-8s p50 %8.2f ms, p99 %8.2f ms" % (
+            (name,) + percentiles(timings)))
+
+
+if __name__ == '__main__':
+    main()
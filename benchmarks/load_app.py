@@ -0,0 +1,56 @@
+#!/usr/bin/env python3
+"""
+    Bokeh application used by bench_load.py: a StocksDashboard with random
+    prices and a DashboardWithWidgets slider updating an EMA per ticker.
+
+    To run:
+    >>> bokeh serve benchmarks/load_app.py --args --tickers 10 --dates 2000
+"""
+import argparse
+import sys
+
+import numpy as np
+import pandas as pd
+from bokeh.io import curdoc
+from bokeh.layouts import column
+
+from stocksdashboard import StocksDashboard, DashboardWithWidgets
+
+
+def random_prices(n_tickers, n_dates, seed=42):
+    rng = np.random.RandomState(seed)
+    dates = pd.bdate_range('2000-01-01', periods=n_dates)
+    return {'T%02d' % i: pd.Series(
+        100 * np.exp(np.cumsum(rng.normal(0, 0.01, n_dates))), index=dates)
+        for i in range(n_tickers)}
+
+
+def main(args):
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--tickers', type=int, default=10)
+    parser.add_argument('--dates', type=int, default=2000)
+    parser.add_argument('--mode', default='server',
+                        choices=DashboardWithWidgets.modes)
+    args = parser.parse_args(args)
+
+    prices = random_prices(args.tickers, args.dates)
+    signals = {name + '_EMA': prices[name] for name in prices}
+    expressions = {name + '_EMA': '%s.ewm(span=w, min_periods=1).mean()' %
+                   name for name in prices}
+    sdb = StocksDashboard()
+    sdb.build_dashboard(input_data={'stocks': prices, 'signals': signals},
+                        show=False)
+    dashboard = DashboardWithWidgets(
+        sdb, {'w': {'title': 'EMA window',
+                    'params': {'value': 20, 'start': 2, 'end': 252,
+                               'step': 1}}},
+        expressions, mode=args.mode)
+    sliders = dashboard.create_sliders()
+    dashboard.widget_on_change()
+    curdoc().add_root(column(list(sliders.values()) + [sdb.layout]))
+    curdoc().title = 'Load test'
+
+
+# Run by bokeh serve.
+if __name__.startswith('bokeh_app_'):
+    main(sys.argv[1:])
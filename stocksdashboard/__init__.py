@@ -1,11 +1,9 @@
-from .stocksdashboard import StocksDashboard
-from .stocksdashboard import convert_to_datetime
-from .stocksdashboard import get_colors
 from .formatter import Formatter
-from .dashboard_with_widgets import DashboardWithWidgets
+from .formatter import convert_to_datetime
 
 import sys
 import os
+import importlib
 from os.path import dirname
 
 if sys.version_info[0] < 3:
@@ -14,7 +12,33 @@ else:
     from configparser import SafeConfigParser
 
 __all__ = ['StocksDashboard', 'convert_to_datetime', 'get_colors', 'Formatter',
-           'DashboardWithWidgets']
+           'DashboardWithWidgets', 'DocumentTemplate', 'SharedData',
+           'FileRefresher']
+
+# Bokeh dependent attributes and the module containing them. They are
+# imported on first use, so that importing the package (i.e. to use only
+# `Formatter`) does not import Bokeh.
+_lazy_attributes = {
+    'StocksDashboard': 'stocksdashboard',
+    'get_colors': 'stocksdashboard',
+    'DashboardWithWidgets': 'dashboard_with_widgets',
+    'DocumentTemplate': 'template_cache',
+    'SharedData': 'shared_data',
+    'FileRefresher': 'tailing',
+}
+
+
+def __getattr__(name):
+    if name in _lazy_attributes:
+        module = importlib.import_module('.' + _lazy_attributes[name],
+                                         __name__)
+        return getattr(module, name)
+    raise(AttributeError("module %r has no attribute %r" % (__name__, name)))
+
+
+def __dir__():
+    return sorted(list(globals().keys()) + list(_lazy_attributes.keys()))
+
 
 config = SafeConfigParser()
 path = config.read(os.path.join(os.path.abspath(
@@ -0,0 +1,259 @@
+#!/usr/bin/env python3
+# Authors: Mabel Villalba Jimenez <mabelvj@gmail.com>,
+#          Emilio Molina Martinez <emilio.mol.mar@gmail.com>
+# License: GPLv3
+
+"""
+    Aggregations of the series of a panel, used by the panels that do not
+    plot each series as a line (see ``panel_type`` in
+    :meth:`StocksDashboard.build_dashboard`).
+"""
+
+import warnings
+
+import numpy as np
+
+# Bytes of the 2-D blocks built to aggregate the series.
+CHUNK_BYTES = 2 ** 25
+
+
+def common_index(series):
+    """
+        Index shared by all the ``series`` (the union of their indices if
+        they differ) and the series aligned to it. Series already on the
+        index are not copied.
+    """
+    index = series[0].index
+    for s in series[1:]:
+        if not (s.index is index or s.index.equals(index)):
+            index = index.union(s.index)
+    return index, [s if s.index is index or s.index.equals(index)
+                   else s.reindex(index) for s in series]
+
+
+def _row_chunks(n_rows, n_columns, chunk_size=None):
+    if chunk_size is None:
+        chunk_size = max(1, CHUNK_BYTES // (8 * max(n_columns, 1)))
+    for start in range(0, n_rows, chunk_size):
+        yield slice(start, min(start + chunk_size, n_rows))
+
+
+def cross_sectional_quantiles(series, q=(5, 25, 50, 75, 95),
+                              chunk_size=None):
+    """
+        Percentiles ``q`` of the values of all the ``series`` at each date,
+        ignoring NaN.
+
+        The series are not concatenated: the percentiles are computed over
+        blocks of ``chunk_size`` dates x series, so the memory used does not
+        grow with the number of dates.
+
+        Params
+        ------
+        series: list of pd.Series
+            Series of a panel. If their indices differ, they are aligned to
+            the union of the indices.
+        q: sequence of float, default (5, 25, 50, 75, 95)
+            Percentiles, between 0 and 100.
+        chunk_size: int, optional
+            Dates per block. Default: blocks of about ``CHUNK_BYTES``.
+
+        Returns
+        -------
+        index: pd.Index
+            Dates of the percentiles.
+        quantiles: np.ndarray
+            Array of shape (len(q), len(index)). NaN for the dates without
+            values.
+    """
+    index, series = common_index(series)
+    values = [np.asarray(s, dtype=float) for s in series]
+    result = np.empty((len(q), len(index)))
+    for rows in _row_chunks(len(index), len(values), chunk_size):
+        block = np.column_stack([v[rows] for v in values])
+        with warnings.catch_warnings():
+            # All-NaN dates are NaN.
+            warnings.simplefilter('ignore', RuntimeWarning)
+            result[:, rows] = np.nanpercentile(block, q, axis=1)
+    return index, result
+
+
+def quantile_column(q):
+    """ Name of the column of the percentile ``q`` in the sources. """
+    return 'q%s' % ('%g' % q)
+
+
+def returns_matrix(series):
+    """
+        Returns (%) of the ``series`` from one date to the next, as a 2-D
+        array (dates x series). The first date and the dates after a NaN
+        are NaN.
+
+        Returns
+        -------
+        index: pd.Index
+            Dates of the rows.
+        returns: np.ndarray
+    """
+    index, series = common_index(series)
+    values = np.empty((len(index), len(series)))
+    for i, s in enumerate(series):
+        values[:, i] = np.asarray(s, dtype=float)
+    result = np.full_like(values, np.nan)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        result[1:] = 100. * (values[1:] / values[:-1] - 1.)
+    result[~np.isfinite(result)] = np.nan
+    return index, result
+
+
+def bin_rows(x, values, start, end, n_bins):
+    """
+        Mean (ignoring NaN) of the rows of ``values`` in ``n_bins`` bins of
+        equal width between ``start`` and ``end``.
+
+        Params
+        ------
+        x: np.ndarray
+            Sorted coordinates of the rows of ``values``.
+        values: np.ndarray
+            2-D array (rows x series).
+        start, end: float
+            Limits of the bins.
+        n_bins: int
+            Number of bins, i.e. pixels.
+
+        Returns
+        -------
+        binned: np.ndarray
+            Array of shape (n_bins, series). NaN for the bins without
+            values.
+    """
+    n_bins = max(int(n_bins), 1)
+    lo = np.searchsorted(x, start, side='left')
+    hi = np.searchsorted(x, end, side='right')
+    binned = np.full((n_bins, values.shape[1]), np.nan)
+    if hi <= lo or end <= start:
+        return binned
+    bins = ((x[lo:hi] - start) * (n_bins / float(end - start))).astype(int)
+    np.clip(bins, 0, n_bins - 1, out=bins)
+    # the rows are sorted by bin: sum each run of rows at once.
+    used, first = np.unique(bins, return_index=True)
+    window = values[lo:hi]
+    observed = np.isfinite(window)
+    sums = np.add.reduceat(np.where(observed, window, 0.), first, axis=0)
+    counts = np.add.reduceat(observed, first, axis=0)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        binned[used] = np.where(counts > 0, sums / counts, np.nan)
+    return binned
+
+
+class RangeStats():
+
+    """
+        Statistics of each column of ``values`` (dates x series) over any
+        range of rows, without scanning the rows of the range:
+
+        - return, mean and volatility (standard deviation) of the returns
+          from prefix sums of the returns and of their squares: O(1).
+        - min and max with sparse tables of the extrema of the blocks of
+          2**k rows: O(1), with two overlapping blocks.
+        - max drawdown with a sparse table of the max drawdown of the
+          blocks. Overlapping blocks can not be combined for drawdowns, so
+          the range is split in disjoint blocks: O(log(rows)).
+
+        Params
+        ------
+        values: np.ndarray
+            2-D array (dates x series) of prices. NaN are ignored.
+    """
+
+    def __init__(self, values):
+        values = np.asarray(values, dtype=float)
+        if values.ndim == 1:
+            values = values[:, np.newaxis]
+        self.values = values
+        n = len(values)
+        returns = np.full_like(values, np.nan)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            returns[1:] = values[1:] / values[:-1] - 1.
+        observed = np.isfinite(returns)
+        returns[~observed] = 0.
+        zeros = np.zeros((1, values.shape[1]))
+        # prefix sums: _sum[i] = sum(returns[:i])
+        self._sum = np.concatenate([zeros, np.cumsum(returns, axis=0)])
+        self._sum_squares = np.concatenate(
+            [zeros, np.cumsum(returns ** 2, axis=0)])
+        self._count = np.concatenate([zeros, np.cumsum(observed, axis=0)])
+        # _min[k][i]: min of the rows [i, i + 2**k)
+        self._min = [values]
+        self._max = [values]
+        self._drawdown = [np.where(np.isnan(values), np.nan, 0.)]
+        k = 1
+        while 2 ** k <= n:
+            half = 2 ** (k - 1)
+            prev_min, prev_max = self._min[-1], self._max[-1]
+            left = slice(0, n - 2 ** k + 1)
+            right = slice(half, n - half + 1)
+            self._min.append(np.fmin(prev_min[left], prev_min[right]))
+            self._max.append(np.fmax(prev_max[left], prev_max[right]))
+            with np.errstate(divide='ignore', invalid='ignore'):
+                cross = 1. - prev_min[right] / prev_max[left]
+            self._drawdown.append(np.fmax(
+                np.fmax(self._drawdown[-1][left], self._drawdown[-1][right]),
+                cross))
+            k += 1
+
+    def __len__(self):
+        return len(self.values)
+
+    def _extrema(self, lo, hi):
+        k = int(np.log2(hi - lo))
+        return (np.fmin(self._min[k][lo], self._min[k][hi - 2 ** k]),
+                np.fmax(self._max[k][lo], self._max[k][hi - 2 ** k]))
+
+    def _max_drawdown(self, lo, hi):
+        running_max = np.full(self.values.shape[1], np.nan)
+        drawdown = np.full(self.values.shape[1], np.nan)
+        i = lo
+        for k in range(len(self._drawdown) - 1, -1, -1):
+            if i + 2 ** k <= hi:
+                with np.errstate(divide='ignore', invalid='ignore'):
+                    cross = 1. - self._min[k][i] / running_max
+                drawdown = np.fmax(np.fmax(drawdown, self._drawdown[k][i]),
+                                   cross)
+                running_max = np.fmax(running_max, self._max[k][i])
+                i += 2 ** k
+        return drawdown
+
+    def query(self, lo, hi):
+        """
+            Statistics of the rows [lo, hi) of each series.
+
+            Returns
+            -------
+            stats: dict of np.ndarray
+                'return': from the first to the last row, 'mean' and
+                'volatility' of the returns between consecutive rows,
+                'min', 'max' and 'max_drawdown' (a fraction of the
+                previous max). NaN if not defined.
+        """
+        lo, hi = max(int(lo), 0), min(int(hi), len(self))
+        nan = np.full(self.values.shape[1], np.nan)
+        if hi - lo < 1:
+            return {k: nan for k in ('return', 'mean', 'volatility', 'min',
+                                     'max', 'max_drawdown')}
+        # returns of the rows (lo, hi)
+        count = self._count[hi] - self._count[lo + 1]
+        total = self._sum[hi] - self._sum[lo + 1]
+        squares = self._sum_squares[hi] - self._sum_squares[lo + 1]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            mean = np.where(count > 0, total / count, np.nan)
+            variance = np.where(count > 1,
+                                (squares - count * mean ** 2) / (count - 1),
+                                np.nan)
+            _return = self.values[hi - 1] / self.values[lo] - 1.
+        _min, _max = self._extrema(lo, hi)
+        return {'return': _return, 'mean': mean,
+                'volatility': np.sqrt(np.maximum(variance, 0.)),
+                'min': _min, 'max': _max,
+                'max_drawdown': self._max_drawdown(lo, hi)}
@@ -0,0 +1,58 @@
+"""
+    Lifecycle hooks of the example application directory.
+    To run do in the command line: bokeh serve stocksdashboard
+
+    The example data is loaded, formatted and built once when the server
+    starts. Each new session creates its document from the cached
+    template (see main.py).
+
+    With several processes (bokeh serve --num-procs N stocksdashboard) the
+    formatted data is stored once in memory-mapped files attached by all
+    the processes (see shared_data.py). They are stored in the directory
+    given by the environment variable STOCKSDASHBOARD_SHARED_DATA, or by
+    default in a directory of the temporary directory named after the PID
+    of the bokeh serve process (this module is imported before the
+    workers are forked), removed when the server is unloaded.
+
+    If the environment variable STOCKSDASHBOARD_METRICS_PORT is set, the
+    runtime metrics are served in http://127.0.0.1:<port>/metrics (see
+    metrics.py). The metrics are per process: with --num-procs N, each
+    worker serves its own in the port <port> + <number of the worker>,
+    from <port> to <port> + N - 1.
+"""
+
+import os
+import tempfile
+
+from tornado.process import task_id
+
+from stocksdashboard import metrics
+from stocksdashboard.main import example_data, example_dashboard
+from stocksdashboard.shared_data import SharedData
+from stocksdashboard.template_cache import DocumentTemplate
+
+shared_data = SharedData(os.environ.get(
+    'STOCKSDASHBOARD_SHARED_DATA',
+    os.path.join(tempfile.gettempdir(),
+                 'stocksdashboard_example_%d' % os.getpid())))
+
+
+def on_server_loaded(server_context):
+    if os.environ.get('STOCKSDASHBOARD_METRICS_PORT'):
+        # one port per worker (task_id is None without --num-procs).
+        metrics.listen(int(os.environ['STOCKSDASHBOARD_METRICS_PORT']) +
+                       (task_id() or 0))
+    input_data = shared_data.get_or_create(example_data)
+    DocumentTemplate(**example_dashboard(input_data)).register(server_context)
+
+
+def on_server_unloaded(server_context):
+    shared_data.unlink()
+
+
+def on_session_created(session_context):
+    metrics.on_session_created(session_context)
+
+
+def on_session_destroyed(session_context):
+    metrics.on_session_destroyed(session_context)
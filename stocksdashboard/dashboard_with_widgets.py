@@ -6,27 +6,73 @@
 # Multiple formats for each line.
 from bokeh.models.widgets import Slider
 from bokeh.models.widgets import PreText
+from bokeh.models import CustomJS
+from bokeh.models import Plot
+from bokeh.models import GlyphRenderer
 
 import re
 import copy
+import contextlib
 import pandas as pd
 import numpy as np
 
-try:
-    from ..stocksdashboard.stocksdashboard import StocksDashboard
-except Exception as excinfo:
-    print(str(excinfo))
-    from stocksdashboard.stocksdashboard import StocksDashboard
-
-try:
-    from .formatter import Formatter
-except Exception as excinfo:
-    print(str(excinfo))
-    from formatter import Formatter
+from .stocksdashboard import StocksDashboard
+from .formatter import Formatter
+from .aggregations import RangeStats
+from .js_signals import JS_FUNCTIONS
+from .js_signals import translate_expression
+from .js_signals import sort_signals
+from .metrics import UPDATE_DATA_SECONDS
+from .profiling import CallbackProfiler
 
 
 class DashboardWithWidgets:
-    def __init__(self, sdb, sliders_params, signals_expressions):
+    """
+        Dashboard whose signals are updated when the sliders change.
+
+        Params
+        ------
+        sdb: StocksDashboard
+            Dashboard already built, whose sources contain the signals.
+        sliders_params: dict
+            Title and parameters of each slider.
+        signals_expressions: dict
+            Expression of each signal, using the names of the columns of
+            the sources, the sliders and other signals.
+
+            Templated signals contain '{T}' in the name and in the
+            expression, i.e. {'{T}_EMA': '{T}.ewm(span=w).mean()'}. They
+            are evaluated at once for all the tickers T whose columns
+            (i.e. 'AAPL' and 'AAPL_EMA') are in the sources, over
+            pd.DataFrames of dates x tickers. Only in 'server' mode.
+        mode: str, ('server', 'client', 'auto'), default 'server'
+            Where the signals are evaluated when a slider changes:
+
+            - 'server': with pandas, in a Python callback. Needs a
+              Bokeh server.
+            - 'client': in the browser, with a CustomJS callback (see
+              :mod:`stocksdashboard.js_signals` for the supported
+              expressions). Also works in standalone HTML.
+            - 'auto': 'client' if all the expressions are supported,
+              'server' otherwise.
+        profile: bool, str or CallbackProfiler, optional
+            Profile each :meth:`update_data` call, with the time of the
+            materialisation of the data, of the evaluation of each signal
+            and of the write to the sources (see
+            :mod:`stocksdashboard.profiling`). If a str, directory where
+            the collapsed stacks of each call are written.
+    """
+    modes = ('server', 'client', 'auto')
+    # Placeholder of the ticker in templated signals.
+    template = '{T}'
+    _template_pattern = re.compile(r'\w*\{T\}\w*')
+    # Statistics of :meth:`create_stats`: key, header and scale.
+    stats_columns = [('return', 'return %', 100.), ('mean', 'mean %', 100.),
+                     ('volatility', 'vol %', 100.), ('min', 'min', 1.),
+                     ('max', 'max', 1.), ('max_drawdown', 'max dd %', 100.)]
+
+    def __init__(self, sdb, sliders_params, signals_expressions,
+                 mode='server', profile=None):
         global _widget_type
         _widget_type = (Slider, PreText)
         self.sliders = {}
@@ -36,6 +82,37 @@ class DashboardWithWidgets:
         self.sliders_params = sliders_params
         self.__check_sliders()
         self.signals_expressions = signals_expressions
+        if mode not in self.modes:
+            raise(ValueError("Invalid mode '%s'. " % mode +
+                             "Valid modes: %s" % list(self.modes)))
+        self.mode = mode
+        if profile is None or profile is False:
+            self.profiler = None
+        elif isinstance(profile, CallbackProfiler):
+            self.profiler = profile
+        elif profile is True:
+            self.profiler = CallbackProfiler()
+        else:
+            self.profiler = CallbackProfiler(path=profile)
+        self._working_set = None
+        self._working_set_sources = []
+        self._writing = False
+        self._stats = None
+        # Layout, plots and sources watched by the statistics.
+        self.stats_x_range = None
+        self._stats_layout = None
+        self._stats_plots = []
+        self._stats_sources = []
+
+    def _profile(self, name):
+        if self.profiler is None:
+            return contextlib.suppress()
+        return self.profiler.profile(name)
+
+    def _phase(self, *names):
+        if self.profiler is None:
+            return contextlib.suppress()
+        return self.profiler.phase(*names)
 
     def __check_sliders(self):
         assert(self.sliders_params is not None)
@@ -66,6 +143,133 @@ class DashboardWithWidgets:
         self.sliders = sliders
         return sliders
 
+    def create_stats(self, names=None):
+        """
+            Create a PreText with the statistics of the series ``names`` in
+            the visible x range: return, mean and volatility of the daily
+            returns, min, max and max drawdown.
+
+            The statistics are computed from the structures of
+            :class:`aggregations.RangeStats`, built once per change of the
+            data, so a change of the x range (pan or zoom) does not scan the
+            series. They are updated in a Bokeh server, also when the lines
+            of the dashboard change (:meth:`StocksDashboard.update_dashboard`)
+            or it is rebuilt.
+
+            Params
+            ------
+            names: list of str, optional
+                Names of the series. Default: all the series of the
+                dashboard but the signals.
+        """
+        self.stats_names = names
+        pretext = PreText(text='', sizing_mode='stretch_width')
+        self.pretext['stats'] = pretext
+        self.update_stats()
+        return pretext
+
+    def _watch_stats(self):
+        """
+            Register the callbacks of the statistics on the x range, the
+            plots and the sources of the dashboard, moving them from the
+            previous ones if the dashboard was rebuilt or its lines
+            changed. The statistics are rebuilt if the sources changed.
+        """
+        if self.sdb.layout is not self._stats_layout:
+            for p in self._stats_plots:
+                p.remove_on_change('renderers',
+                                   self._on_stats_renderers_change)
+            if self.stats_x_range is not None:
+                self.stats_x_range.remove_on_change(
+                    'start', self._on_stats_range_change)
+                self.stats_x_range.remove_on_change(
+                    'end', self._on_stats_range_change)
+            self._stats_layout = self.sdb.layout
+            self._stats_plots = list(self.sdb.layout.select({'type': Plot}))
+            for p in self._stats_plots:
+                p.on_change('renderers', self._on_stats_renderers_change)
+            self.stats_x_range = self._stats_plots[0].x_range
+            self.stats_x_range.on_change('start', self._on_stats_range_change)
+            self.stats_x_range.on_change('end', self._on_stats_range_change)
+        # Not p.select(), which also finds the renderers of other plots
+        # referenced by callbacks.
+        sources = {}
+        for p in self._stats_plots:
+            for r in p.renderers:
+                if isinstance(r, GlyphRenderer):
+                    sources.setdefault(r.data_source.id, r.data_source)
+        sources = list(sources.values())
+        if (len(sources) != len(self._stats_sources) or
+                any([s is not w for s, w in zip(sources,
+                                                self._stats_sources)])):
+            for source in self._stats_sources:
+                source.remove_on_change('data', self._on_stats_source_change)
+            for source in sources:
+                source.on_change('data', self._on_stats_source_change)
+            self._stats_sources = sources
+            self._stats = None
+
+    def _build_stats(self):
+        names = self.stats_names
+        stats = []
+        for source in self._stats_sources:
+            x = source.data.get('x', [])
+            if len(x) < 2:
+                continue
+            columns = [name for name in source.data if name != 'x' and (
+                name in names if names is not None
+                else name not in self.signals_expressions)]
+            if not columns:
+                continue
+            values = np.column_stack([np.asarray(source.data[name],
+                                                 dtype=float)
+                                      for name in columns])
+            stats.append((StocksDashboard._to_milliseconds(pd.Index(x)),
+                          columns, RangeStats(values)))
+        self._stats = stats
+        return stats
+
+    def update_stats(self, start=None, end=None):
+        """
+            Update the PreText of :meth:`create_stats` with the statistics
+            between ``start`` and ``end`` (default: the x range).
+        """
+        self._watch_stats()
+        if self._stats is None:
+            self._build_stats()
+        start = StocksDashboard._to_milliseconds(
+            self.stats_x_range.start if start is None else start)
+        end = StocksDashboard._to_milliseconds(
+            self.stats_x_range.end if end is None else end)
+        rows = {}
+        for x, columns, stats in self._stats:
+            values = stats.query(np.searchsorted(x, start, side='left'),
+                                 np.searchsorted(x, end, side='right'))
+            for i, name in enumerate(columns):
+                rows[name] = [values[k][i] * scale
+                              for k, _, scale in self.stats_columns]
+        names = [name for name in (self.stats_names or list(rows.keys()))
+                 if name in rows]
+        width = max([len(name) for name in names] + [6])
+        lines = [' '.join(['%-*s' % (width, 'name')] +
+                          ['%10s' % h for _, h, _ in self.stats_columns])]
+        for name in names:
+            lines.append(' '.join(['%-*s' % (width, name)] +
+                                  ['%10.2f' % v for v in rows[name]]))
+        self.pretext['stats'].text = '\n'.join(lines)
+        return self.pretext['stats']
+
+    def _on_stats_range_change(self, attr, old, new):
+        self.update_stats()
+
+    def _on_stats_renderers_change(self, attr, old, new):
+        self.update_stats()
+
+    def _on_stats_source_change(self, attr, old, new):
+        if not self._writing:
+            self._stats = None
+            self.update_stats()
+
     @staticmethod
     def replace_var(expr, varname, dict_name):
         return expr.replace(varname, "%s[%s]" % (dict_name, varname))
@@ -91,6 +295,9 @@ class DashboardWithWidgets:
     def _format_signal_expressions(self, data_temp):
         signals_expressions_formatted = {}
         for signal_name, expr in list(self.signals_expressions.items()):
+            if self.template in signal_name:
+                # see _evaluate_template
+                continue
             expression_temp = copy.deepcopy(expr)
             expression_temp = self.update_expression(
                 data_temp,
@@ -108,46 +315,287 @@ class DashboardWithWidgets:
 
         return signals_expressions_formatted
 
+    @UPDATE_DATA_SECONDS.time()
     def update_data(self, attrname, old, new):
-        sliders_values = {}
-        data_temp = {}
-        result = {}
-        for k, v in list(self.sliders.items()):
-            sliders_values[k] = v.value
-        for i, __data_source in enumerate(self.sdb.datasources):
-            for name in list(__data_source.data.keys()):
+        with self._profile('update_data'):
+            self._update_data()
+        if (self._stats_layout is not None and
+                self.sdb.layout is not self._stats_layout):
+            # the dashboard was rebuilt: watch the new one.
+            self.update_stats()
+        self.sdb.push_notebook()
+
+    def working_set(self):
+        """
+            Series (or values, if their length is not greater than 1) of
+            the columns of the sources, by name, where the signals are
+            evaluated.
+
+            It is built once and reused by the callbacks until the data of
+            the sources is changed by others than :meth:`update_data` (or
+            the dashboard is rebuilt with other sources).
+        """
+        sources = list(self.sdb.datasources)
+        if (self._working_set is None or
+                len(sources) != len(self._working_set_sources) or
+                any([s is not w for s, w in zip(sources,
+                                                self._working_set_sources)])):
+            self._build_working_set(sources)
+        return self._working_set
+
+    def _build_working_set(self, sources):
+        for source in self._working_set_sources:
+            source.remove_on_change('data', self._on_source_change)
+        working_set = {}
+        for source in sources:
+            source.on_change('data', self._on_source_change)
+            if 'x' not in source.data:
+                # i.e. the multi_line of a picker panel.
+                continue
+            index = None
+            for name, values in list(source.data.items()):
                 if re.findall("\(\w+\)", name):
                     raise(ValueError("Variable should not contain " +
                                      "plain parentheses. "
                                      "If included use '\(' and '\)'." +
                                      "Found: %s" % name))
-                if len(__data_source.data[name]) > 1:
-                    data_temp[name] = pd.Series(
-                        copy.deepcopy(__data_source.data[name]),
-                        index=copy.deepcopy(__data_source.data['x']))
+                if len(values) > 1:
+                    if index is None:
+                        # shared by the Series of the source
+                        index = pd.Index(source.data['x'])
+                    working_set[name] = pd.Series(values, index=index)
                 else:
-                    data_temp[name] = copy.deepcopy(
-                        __data_source.data[name])
+                    working_set[name] = values
+        self._working_set_sources = sources
+        self._working_set = working_set
+        self._template_tickers_cache = {}
+        self._template_frames = {}
+        self._format_signal_expressions(working_set)
+
+    def _on_source_change(self, attr, old, new):
+        if not self._writing:
+            self._working_set = None
+
+    def _template_tickers(self, signal_name, data_temp):
+        """
+            Tickers of the templated signal ``signal_name``: those whose
+            output column and the columns of the templates of the
+            expression are in the sources.
+        """
+        if signal_name in self._template_tickers_cache:
+            return self._template_tickers_cache[signal_name]
+        patterns = set(self._template_pattern.findall(
+            self.signals_expressions[signal_name]))
+        prefix, suffix = signal_name.split(self.template, 1)
+        tickers = []
+        for name in data_temp:
+            if (len(name) > len(prefix) + len(suffix) and
+                    name.startswith(prefix) and name.endswith(suffix)):
+                ticker = name[len(prefix):len(name) - len(suffix)]
+                if all([p.replace(self.template, ticker) in data_temp
+                        for p in patterns]):
+                    tickers.append(ticker)
+        self._template_tickers_cache[signal_name] = tickers
+        return tickers
+
+    def _template_frame(self, pattern, tickers, data_temp):
+        """
+            pd.DataFrame (dates x tickers) with the columns of the template
+            ``pattern`` for each ticker. Cached if they are not signals.
+        """
+        key = (pattern, tuple(tickers))
+        if key in self._template_frames:
+            return self._template_frames[key]
+        columns = [pattern.replace(self.template, t) for t in tickers]
+        frame = pd.concat([data_temp[c] for c in columns], axis=1,
+                          keys=tickers)
+        signals = set()
+        for name in self.signals_expressions:
+            if self.template in name:
+                signals.update([name.replace(self.template, t) for t in
+                                self._template_tickers(name, data_temp)])
+            else:
+                signals.add(name)
+        is_signal = bool(signals.intersection(columns))
+        if not is_signal:
+            self._template_frames[key] = frame
+        return frame
 
-        if not hasattr(self, 'signal_expressions_formatted'):
-            self._format_signal_expressions(data_temp)
+    def _evaluate_template(self, signal_name, data_temp):
+        """
+            Evaluate the templated signal ``signal_name`` for all its
+            tickers at once, over the 2-D frames (dates x tickers) of the
+            templates of the expression.
+
+            Returns a dict with the result of each output column.
+        """
+        tickers = self._template_tickers(signal_name, data_temp)
+        if not tickers:
+            return {}
+        namespace = {name: value for name, value in list(data_temp.items())
+                     if name.isidentifier()}
+        namespace.update({'np': np, 'pd': pd})
+        namespace.update({name: slider.value for name, slider in
+                          list(self.sliders.items())})
+
+        def replace(match):
+            pattern = match.group(0)
+            variable = '__' + re.sub('\W', '_', pattern)
+            namespace[variable] = self._template_frame(pattern, tickers,
+                                                       data_temp)
+            return variable
+
+        expression = self.signals_expressions[signal_name]
+        frame = eval(self._template_pattern.sub(replace, expression),
+                     namespace)
+        # the frames are aligned on the union of the indices of the
+        # tickers: each output is taken on the index of its ticker (of
+        # the first template of the expression).
+        first = self._template_pattern.search(expression).group(0)
+        outputs = {}
+        for t in tickers:
+            value = frame[t]
+            own = data_temp[first.replace(self.template, t)]
+            if isinstance(own, pd.Series) and not (
+                    value.index is own.index or value.index.equals(own.index)):
+                value = value.reindex(own.index)
+            outputs[signal_name.replace(self.template, t)] = value
+        return outputs
+
+    def _update_data(self):
+        result = {}
+        with self._phase('materialise'):
+            data_temp = self.working_set()
         # Run twice since some singals depends on others
         for i in range(2):
             for signal_name, expr in list(self.signals_expressions.items()):
-                result[signal_name] = eval(
-                    self.signals_expressions_formatted[signal_name])
+                with self._phase('evaluate', signal_name):
+                    if self.template in signal_name:
+                        outputs = self._evaluate_template(signal_name,
+                                                          data_temp)
+                    else:
+                        outputs = {signal_name: eval(
+                            self.signals_expressions_formatted[signal_name])}
                 # Update result in data_temp. If it is not dependent
                 # of other variable signal, this result won't change.
-                data_temp[signal_name] = result[signal_name]
+                for name, value in list(outputs.items()):
+                    result[name] = value
+                    data_temp[name] = value
 
-        for i, __data_source in enumerate(self.sdb.datasources):
-            for name in result:
-                if name in __data_source.data:
-                    (__data_source.data['x'],
-                     __data_source.data[name]
-                     ) = copy.deepcopy(Formatter._get_x_y(result[name]))
+        with self._phase('write'):
+            self._write_results(result)
+
+    @staticmethod
+    def _equal_columns(old, new):
+        """ Whether the column ``old`` of a source has the values ``new``. """
+        if old is new:
+            return True
+        old = np.asarray(old)
+        new = np.asarray(new)
+        if old.shape != new.shape or old.dtype != new.dtype:
+            return False
+        return np.array_equal(old, new, equal_nan=old.dtype.kind in 'fc')
+
+    def _write_results(self, result):
+        """
+            Write the signals in their sources, with one change per source
+            (see ``ColumnDataSource.data.update``) that only contains the
+            columns whose values changed, and 'x' if the index changed.
+        """
+        x_changed = False
+        self._writing = True
+        try:
+            for __data_source in self.sdb.datasources:
+                changes = {}
+                for name in result:
+                    if name not in __data_source.data:
+                        continue
+                    x, y = Formatter._get_x_y(result[name])
+                    if not self._equal_columns(
+                            changes.get('x', __data_source.data['x']), x):
+                        changes['x'] = x
+                    if not self._equal_columns(__data_source.data[name], y):
+                        changes[name] = y
+                if changes:
+                    __data_source.data.update(changes)
+                    x_changed = x_changed or 'x' in changes
+        finally:
+            self._writing = False
+        if x_changed:
+            # the other columns of the sources are not aligned with the
+            # signals anymore.
+            self._working_set = None
+
+    def create_js_callback(self):
+        """
+            Create the CustomJS callback that evaluates the signals in the
+            browser and updates their sources.
+
+            The columns used by a signal should be in sources with the same
+            'x' than the source of the signal.
+
+            Raises
+            ------
+            ValueError: if any signal expression is not supported.
+        """
+        columns = {}
+        for __data_source in self.sdb.datasources:
+            for name in list(__data_source.data.keys()):
+                if name != 'x':
+                    columns.setdefault(name, __data_source)
+        codes = {}
+        used_columns = {}
+        dependencies = {}
+        for signal_name, expr in list(self.signals_expressions.items()):
+            if self.template in signal_name:
+                raise(ValueError("Templated signal '%s' " % signal_name +
+                                 "can only be evaluated in the server."))
+            if signal_name not in columns:
+                raise(ValueError("Signal '%s' is not " % signal_name +
+                                 "in the sources."))
+            (codes[signal_name], used_columns[signal_name],
+             dependencies[signal_name]) = translate_expression(
+                expr, columns, self.sliders, self.signals_expressions)
+            x = np.asarray(columns[signal_name].data['x'])
+            for name in used_columns[signal_name]:
+                if not np.array_equal(np.asarray(columns[name].data['x']),
+                                      x):
+                    raise(ValueError(
+                        "Signal '%s' and column '%s' " % (signal_name, name) +
+                        "should have the same 'x' to be evaluated in " +
+                        "the browser."))
+        order = sort_signals(dependencies)
+        outputs = {name: columns[name] for name in order}
+        code = [JS_FUNCTIONS,
+                "function column(name) { return columns[name].data[name] }",
+                "const signals = {}"]
+        code += ["signals['%s'] = %s" % (name, codes[name]) for name in order]
+        code += ["for (const name in signals)",
+                 "    outputs[name].data[name] = signals[name]",
+                 "for (const source of new Set(Object.values(outputs)))",
+                 "    source.change.emit()"]
+        return CustomJS(
+            args=dict(columns={name: columns[name] for name in
+                               set().union(*list(used_columns.values()))},
+                      outputs=outputs, sliders=self.sliders),
+            code='\n'.join(code))
 
     def widget_on_change(self):
+        """
+            Update the signals when the sliders change, in the server or
+            in the browser depending on ``self.mode``.
+        """
+        if self.mode != 'server':
+            try:
+                callback = self.create_js_callback()
+            except ValueError:
+                if self.mode == 'client':
+                    raise
+            else:
+                for _widget in list(self.sliders.values()):
+                    if isinstance(_widget, Slider):
+                        _widget.js_on_change('value', callback)
+                return callback
         list_of_widgets = list(self.sliders.values())
         for _widget in list_of_widgets:
             # print(w)
@@ -6,6 +6,9 @@
 import numpy as np
 import pandas as pd
 import copy
+import functools
+import os
+from concurrent.futures import ThreadPoolExecutor
 # try:
 #     from .stocksdashboard import convert_to_datetime
 # except Exception as excinfo:
@@ -47,10 +50,37 @@ class Formatter():
                 [{'dates': ..., 'adj_close': ...},
                  {'dates': ..., 'adj_close': ...}]
             - list of pd.Series / pd.DataFrame.
+
+        The value of the input data dictionary can also be a wide
+        pd.DataFrame (dates x names) or a 2-D np.ndarray (see
+        :meth:`Formatter.from_array`). Its columns are plotted directly,
+        without splitting, copying or re-aligning them.
+
+        Parameters
+        ----------
+        align: bool, default True
+            If True, every series is reindexed to the union of the indices
+            of all the series and panels, padding with NaN. If False, each
+            series keeps its own index, which avoids the NaN padding when
+            mixing series with very different date ranges.
+        dtypes: dict, default None
+            Target dtypes of the formatted series, i.e.:
+            {'values': 'float32', 'index': 'int64'}.
+            'values' is applied to numeric series (or to any series if
+            'category'). 'index' is applied to the indices; a datetime
+            index cast to 'int64' contains milliseconds since epoch.
+        n_jobs: int, default 1
+            Number of threads used to format the panels concurrently in
+            :meth:`Formatter.format_input_data`. -1 uses all the CPUs.
     """
 
-    def __init__(self):
+    def __init__(self, align=True, dtypes=None, n_jobs=1):
         self.name = None
+        self.align = align
+        self.dtypes = dtypes
+        self.n_jobs = n_jobs
+        # Parsed dates, shared by the series with the same dates.
+        self._dates_cache = {}
 
     def _format(self, data):
         """
@@ -64,15 +94,94 @@ class Formatter():
             return self.__process_dict(data)
 
         elif isinstance(data, (pd.Series, pd.DataFrame, np.ndarray)):
-            # Convert to a list of, at least,
-            # one element, to be able to iterate.
-            if not isinstance(data, pd.DataFrame):
-                data = [pd.DataFrame(data)]
-            else:
-                data = [data]
+            # Wide data: one column per name.
+            data = self._to_wide_frame(data)
+            self.names = list(data.columns)
+            return [data[c] for c in data.columns]
         else:
             raise(TypeError("Data type is not valid."))
 
+    @staticmethod
+    def from_array(values, index=None, columns=None):
+        """
+            Wrap a 2-D array (dates x names) in a pd.DataFrame without
+            copying it, to be used as the data of a panel.
+
+            Params
+            ------
+            values: np.ndarray
+                1-D or 2-D array with one column per timeseries. Use a
+                Fortran ordered array to keep each column contiguous.
+            index: sequence, default None
+                Dates or x coordinates of the rows.
+            columns: sequence of str, default None
+                Names of the columns. If None: '0', '1', ...
+        """
+        values = np.asarray(values)
+        if values.ndim == 1:
+            values = values[:, np.newaxis]
+        if columns is None:
+            columns = [str(i) for i in range(values.shape[1])]
+        return pd.DataFrame(values, index=index, columns=columns, copy=False)
+
+    @staticmethod
+    def _to_wide_frame(data):
+        """
+            Convert a wide panel (pd.DataFrame, pd.Series or np.ndarray)
+            to a pd.DataFrame with str column names, sharing its data.
+        """
+        if isinstance(data, np.ndarray):
+            return Formatter.from_array(data)
+        if isinstance(data, pd.Series):
+            data = data.to_frame('0' if data.name is None else data.name)
+        if not all([isinstance(c, str) for c in data.columns]):
+            data = data.copy(deep=False)
+            data.columns = [str(c) for c in data.columns]
+        return data
+
+    def _parse_dates(self, dates):
+        """
+            Parse a sequence of dates to a pd.DatetimeIndex.
+
+            Each distinct sequence is parsed once with a vectorised parser
+            and the resulting index is shared by all the series with the
+            same dates, i.e. tickers sharing the same list of dates.
+            If the dates cannot be parsed, they are used as they are.
+        """
+        if isinstance(dates, pd.DatetimeIndex):
+            return dates
+        values = np.asarray(dates)
+        if values.dtype.kind == 'M':
+            return pd.DatetimeIndex(values, name='date')
+        key = (len(values), ) + tuple(values[[0, -1]] if len(values) else ())
+        for _values, index in self._dates_cache.get(key, []):
+            if np.array_equal(_values, values):
+                return index
+        try:
+            # ISO 8601 strings
+            index = pd.DatetimeIndex(values.astype('datetime64[ns]'),
+                                     name='date')
+        except (ValueError, TypeError):
+            try:
+                index = pd.DatetimeIndex(pd.to_datetime(values), name='date')
+            except (ValueError, TypeError):
+                index = pd.Index(values, name='date')
+        self._dates_cache.setdefault(key, []).append((values, index))
+        return index
+
+    def _dict_to_frame(self, data):
+        """
+            Convert a dict of sequences containing the field 'date'
+            into a pd.DataFrame indexed by the parsed dates.
+
+            pd.Series values are taken by position, not aligned to the
+            dates by label.
+        """
+        index = self._parse_dates(data['date'])
+        return pd.DataFrame({k: v.values if isinstance(v, pd.Series) else v
+                             for k, v in list(data.items()) if k != 'date'},
+                            index=index)
+
     @staticmethod
     def __is_valid_type(data):
         _valid_types = (pd.DataFrame, pd.Series, list, dict, np.ndarray)
@@ -86,6 +195,10 @@ class Formatter():
         return True
 
     def reformat_x_list(self, data):
+        if not self.align:
+            # keep the native index of each series.
+            return [s.to_frame() for d in data
+                    for c, s in pd.DataFrame(d).items()]
         # if all are pd.DataFrame or pd.Series -> merge indices!!
         if any([isinstance(d, (pd.Series, pd.DataFrame)) for d in data]):
             # return each of the dataframes with the merged indices
@@ -94,6 +207,9 @@ class Formatter():
                                           axis=1).iteritems()]
 
     def reformat_x_dict(self, data):
+        if not self.align:
+            # keep the native index of each series.
+            return dict(data)
         # if all are pd.DataFrame or pd.Series -> merge indices!!
         if any([isinstance(d, (pd.Series, pd.DataFrame))
                 for d in list(data.values())]):
@@ -108,10 +224,11 @@ class Formatter():
         """
         # list of dicts
         if all([isinstance(d, dict) for d in data]):
-            result = [pd.DataFrame.from_dict(d) for d in data]
             # Has 'date' as a column -> format to common date
-            if all(['date' in df for df in result]):
-                result = [df.set_index('date') for df in result]
+            if all(['date' in d for d in data]):
+                result = [self._dict_to_frame(d) for d in data]
+            else:
+                result = [pd.DataFrame.from_dict(d) for d in data]
             n = len(result[0])
             # if not all([len(df) == n for df in result]):
             result = self.reformat_x_list(result)
@@ -143,16 +260,18 @@ class Formatter():
         """
             Format dictionary to valid type.
         """
-        data = copy.deepcopy(_data)
+        # The input is not modified, a shallow copy is enough.
+        data = dict(_data)
         self.names = list(data.keys())
         # dict of dicts
         if all([isinstance(d, dict) for d in list(data.values())]):
-            result = {k: pd.DataFrame.from_dict(
-                d) for k, d in list(data.items())}
             # Has 'date' as a column -> format to common date
-            if all(['date' in v for k, v in result.items()]):
-                result = {k: df.set_index('date')
-                          for k, df in list(result.items())}
+            if all(['date' in d for d in list(data.values())]):
+                result = {k: self._dict_to_frame(d)
+                          for k, d in list(data.items())}
+            else:
+                result = {k: pd.DataFrame.from_dict(
+                    d) for k, d in list(data.items())}
             result = self.reformat_x_dict(result)
             return list(result.values())
         # data is list of np.ndarray
@@ -166,6 +285,12 @@ class Formatter():
         # dict of dataframes, pd.Series
         elif any([isinstance(d, (pd.Series, pd.DataFrame))
                   for d in list(data.values())]):
+            # Has 'date' as a column -> format to common date
+            if all([isinstance(d, pd.DataFrame) and 'date' in d
+                    for d in list(data.values())]):
+                data = {k: d.drop(columns='date').set_index(
+                    self._parse_dates(d['date'].values))
+                    for k, d in list(data.items())}
             assert all([isinstance(d.index, type(list(data.values())[0].index))
                         for d in list(data.values())]), (
                 "All indices in a dict of pd.Series or pd.DataFrames " +
@@ -238,6 +363,61 @@ class Formatter():
         result = self._format(data)
         return result, self.names
 
+    @staticmethod
+    def _to_series(stock, column, name):
+        """
+            Get the timeseries to be plotted from `stock` as a pd.Series
+            named `name` and indexed by its own x coordinates.
+        """
+        x, y = Formatter._get_x_y(stock, column)
+        if isinstance(y, pd.Series):
+            # shallow copy, the data and the index are shared.
+            y = y.copy(deep=False)
+            y.name = name
+            return y
+        return pd.Series(y, index=x, name=name)
+
+    def _get_n_workers(self, n_tasks):
+        if self.n_jobs is None or self.n_jobs == 1 or n_tasks < 2:
+            return 1
+        if self.n_jobs < 0:
+            # -1 uses all the CPUs, -2 all the CPUs but one, ...
+            n_jobs = max((os.cpu_count() or 1) + 1 + self.n_jobs, 1)
+        else:
+            n_jobs = self.n_jobs
+        return min(n_jobs, n_tasks)
+
+    def _format_panel(self, data, column='adj_close'):
+        """
+            Format the data of a single panel (plot title).
+
+            Returns the dict of timeseries to be plotted (a pd.DataFrame
+            if the data is aligned) and the list of names. It does not
+            modify the Formatter, so panels can be formatted concurrently.
+        """
+        if isinstance(data, (pd.DataFrame, pd.Series, np.ndarray)):
+            # Wide panel (dates x names): its columns are already aligned,
+            # use them directly without splitting or concatenating.
+            self.__is_valid_type(data)
+            panel = self._to_wide_frame(data)
+            names = list(panel.columns)
+            if not self.align:
+                panel = {name: panel[name] for name in names}
+            return panel, names
+
+        formatter = copy.copy(self)
+        _temp, names = formatter.format_data(data)
+        panel = {}
+        for i, stock in enumerate(_temp):
+            if self.align:
+                _, y = self._get_x_y(stock, column)
+            else:
+                y = self._to_series(stock, column, names[i])
+            panel[names[i]] = y
+        if self.align:
+            panel = pd.concat(panel, axis=1)
+        return panel, names
+
     def format_input_data(self, input_data, column='adj_close'):
         assert isinstance(input_data, (dict, list)), (
             "Data should be contained in 'dict' object or 'list'")
@@ -248,26 +428,141 @@ class Formatter():
 
         names = {}
         dict_total = {}
-        _temp = {}
-        for j, (plot_title, data) in enumerate(result.items()):
-            _temp[plot_title], names[plot_title] = self.format_data(data)
-            dict_total[plot_title] = {}
-            for i, stock in enumerate(_temp[plot_title]):
-                _, y = self._get_x_y(stock, column)
-                dict_total[plot_title][names[plot_title][i]] = y
-        df_total = {k: pd.concat(l, axis=1)
-                    for k, l in list(dict_total.items())}
-        # it's in __process_dict
-        x_range = pd.concat(copy.deepcopy(df_total), axis=1).index
-        formatted_data = self.__process_dict(df_total)
-
+        n_workers = self._get_n_workers(len(result))
+        if n_workers > 1:
+            # Panels are independent, format them concurrently. The heavy
+            # parts run in pandas and NumPy, which release the GIL.
+            with ThreadPoolExecutor(max_workers=n_workers) as executor:
+                panels = list(executor.map(
+                    lambda data: self._format_panel(data, column),
+                    list(result.values())))
+        else:
+            panels = [self._format_panel(data, column)
+                      for data in list(result.values())]
+        for plot_title, (panel, _names) in zip(list(result.keys()), panels):
+            dict_total[plot_title], names[plot_title] = panel, _names
+
+        if not self.align:
+            # Each series keeps its own index. The x range is the union
+            # of the indices, which is only as long as the longest
+            # combination of dates and not padded per series.
+            formatted_result = {k: list(v.values())
+                                for k, v in list(dict_total.items())}
+            x_range = functools.reduce(
+                lambda a, b: a.union(b),
+                [s.index for v in list(formatted_result.values())
+                 for s in v])
+            return self._apply_dtypes(formatted_result, x_range, names)
+
+        # Align all the panels to the union of their indices. Panels
+        # already on the union index only share the index object, their
+        # data is not copied.
+        x_range = functools.reduce(
+            lambda a, b: a if a.equals(b) else a.union(b),
+            [df.index for df in list(dict_total.values())])
         formatted_result = {}
-        for j, (plot_title, v) in enumerate(list(names.items())):
-            _temp = {}
-            for i, name in enumerate(v):
-                _temp[name] = formatted_data[j][name]
-            formatted_result[plot_title] = list(_temp.values())
-        return formatted_result, x_range, names
+        for plot_title, df in list(dict_total.items()):
+            if df.index.equals(x_range):
+                df = df.copy(deep=False)
+                df.index = x_range
+            else:
+                df = df.reindex(x_range)
+            formatted_result[plot_title] = [df[name]
+                                            for name in names[plot_title]]
+        return self._apply_dtypes(formatted_result, x_range, names)
+
+    @staticmethod
+    def _cast_index(index, dtype):
+        """
+            Cast ``index`` to ``dtype``. A datetime index cast to 'int64'
+            is converted to milliseconds since epoch, which is the
+            representation of dates used by Bokeh.
+        """
+        if (np.dtype(dtype) == np.int64 and
+                isinstance(index, pd.DatetimeIndex)):
+            return pd.Index(index.asi8 // 10 ** 6)
+        return index.astype(dtype)
+
+    def _apply_dtypes(self, formatted_result, x_range, names):
+        """
+            Cast the values and the index of the formatted series to the
+            target ``dtypes`` of the Formatter. Indices shared by several
+            series are cast only once and remain shared.
+        """
+        if not self.dtypes:
+            return formatted_result, x_range, names
+        for k in self.dtypes:
+            if k not in ('values', 'index'):
+                raise(ValueError("Invalid key in 'dtypes': '%s'. " % k +
+                                 "Expected 'values' or 'index'."))
+        values_dtype = self.dtypes.get('values')
+        index_dtype = self.dtypes.get('index')
+        indices = {}
+
+        def _cast_index(index):
+            if id(index) not in indices:
+                indices[id(index)] = self._cast_index(index, index_dtype)
+            return indices[id(index)]
+
+        result = {}
+        for plot_title, series in list(formatted_result.items()):
+            result[plot_title] = []
+            for s in series:
+                if (values_dtype is not None and
+                        (pd.api.types.is_numeric_dtype(s) or
+                         values_dtype == 'category')):
+                    s = s.astype(values_dtype, copy=False)
+                if index_dtype is not None:
+                    s = s.copy(deep=False)
+                    s.index = _cast_index(s.index)
+                result[plot_title].append(s)
+        if index_dtype is not None:
+            x_range = _cast_index(x_range)
+        return result, x_range, names
+
+    @staticmethod
+    def memory_report(formatted_data):
+        """
+            Report the number of bytes used by formatted data.
+
+            Params
+            ------
+            formatted_data: dict
+                Dict with a list of pd.Series per plot title, as returned
+                by :meth:`Formatter.format_input_data`.
+
+            Returns
+            -------
+            report: dict
+                Dict in the form::
+
+                    {'nbytes': total,
+                     'panels': {plot_title: {'nbytes': panel_total,
+                                             'index': index_bytes,
+                                             'series': {name: bytes}}}}
+
+                The bytes of the series only include their values. Indices
+                shared by several series are counted once per panel and
+                once in the total.
+        """
+        report = {'nbytes': 0, 'panels': {}}
+        indices = {}
+        for plot_title, series in list(formatted_data.items()):
+            panel = {'nbytes': 0, 'index': 0, 'series': {}}
+            panel_indices = {}
+            for s in series:
+                panel['series'][s.name] = int(
+                    s.memory_usage(index=False, deep=True))
+                panel_indices[id(s.index)] = s.index
+            panel['index'] = int(sum([ix.memory_usage(deep=True)
+                                      for ix in panel_indices.values()]))
+            panel['nbytes'] = panel['index'] + sum(panel['series'].values())
+            indices.update(panel_indices)
+            report['panels'][plot_title] = panel
+            report['nbytes'] += sum(panel['series'].values())
+        report['nbytes'] += int(sum([ix.memory_usage(deep=True)
+                                     for ix in indices.values()]))
+        return report
 
     @staticmethod
     def _get_input_params(i, data, plot_title, params, data_dim):
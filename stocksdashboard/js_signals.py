@@ -0,0 +1,310 @@
+#!/usr/bin/env python3
+# Authors: Mabel Villalba Jimenez <mabelvj@gmail.com>,
+#          Emilio Molina Martinez <emilio.mol.mar@gmail.com>
+# License: GPLv3
+
+"""
+    Translation of signal expressions (see :class:`DashboardWithWidgets`)
+    to JavaScript, so they are evaluated in the browser.
+
+    Supported expressions combine the columns of the sources, the sliders,
+    other signals and numbers with:
+
+    - arithmetic operators: ``+``, ``-``, ``*``, ``/``, ``**``,
+    - ``x.rolling(window, min_periods=None).mean()``,
+    - ``x.ewm(com|span|halflife|alpha=..., min_periods=0, adjust=True,
+      ignore_na=False).mean()``,
+    - ``x.shift(periods=1)``.
+
+    The parameters can be numbers or sliders. The results match pandas.
+"""
+
+import ast
+
+
+# Functions used by the translated expressions. Series are arrays,
+# parameters are numbers.
+JS_FUNCTIONS = """
+function observed(value) {
+    return value !== null && !Number.isNaN(value)
+}
+
+function binop(a, b, f) {
+    const n = (a.length !== undefined) ? a.length : b.length
+    const result = new Float64Array(n)
+    for (let i = 0; i < n; i++) {
+        result[i] = f((a.length !== undefined) ? a[i] : a,
+                      (b.length !== undefined) ? b[i] : b)
+    }
+    return result
+}
+
+function rolling_mean(x, window, min_periods) {
+    window = Math.trunc(window)
+    min_periods = (min_periods === null) ? window : min_periods
+    const result = new Float64Array(x.length)
+    let sum = 0
+    let count = 0
+    for (let i = 0; i < x.length; i++) {
+        if (observed(x[i])) {
+            sum += x[i]
+            count++
+        }
+        if (i >= window && observed(x[i - window])) {
+            sum -= x[i - window]
+            count--
+        }
+        result[i] = (count > 0 && count >= min_periods) ? sum / count : NaN
+    }
+    return result
+}
+
+function ewm_mean(x, alpha, min_periods, adjust, ignore_na) {
+    min_periods = Math.max(min_periods, 1)
+    const result = new Float64Array(x.length)
+    const old_wt_factor = 1 - alpha
+    const new_wt = adjust ? 1 : alpha
+    let old_wt = 1
+    let avg = x[0]
+    let nobs = observed(avg) ? 1 : 0
+    result[0] = (nobs >= min_periods) ? avg : NaN
+    for (let i = 1; i < x.length; i++) {
+        const is_observation = observed(x[i])
+        nobs += is_observation ? 1 : 0
+        if (observed(avg)) {
+            if (is_observation || !ignore_na) {
+                old_wt *= old_wt_factor
+                if (is_observation) {
+                    if (avg != x[i])
+                        avg = (old_wt * avg + new_wt * x[i]) /
+                              (old_wt + new_wt)
+                    old_wt = adjust ? old_wt + new_wt : 1
+                }
+            }
+        } else if (is_observation) {
+            avg = x[i]
+        }
+        result[i] = (nobs >= min_periods) ? avg : NaN
+    }
+    return result
+}
+
+function shift(x, periods) {
+    periods = Math.trunc(periods)
+    const result = new Float64Array(x.length).fill(NaN)
+    for (let i = Math.max(periods, 0);
+         i < Math.min(x.length, x.length + periods); i++)
+        result[i] = x[i - periods]
+    return result
+}
+"""
+
+_OPERATORS = {ast.Add: '+', ast.Sub: '-', ast.Mult: '*', ast.Div: '/',
+              ast.Pow: '**'}
+
+_EWM_ALPHA = {'alpha': '(%s)',
+              'span': '2 / ((%s) + 1)',
+              'com': '1 / ((%s) + 1)',
+              'halflife': '1 - Math.exp(Math.log(0.5) / (%s))'}
+
+
+class _Translator(ast.NodeVisitor):
+
+    """
+        Translate a signal expression to a JavaScript expression.
+
+        Each visit returns the JavaScript code and whether it is a series
+        (array) or a scalar.
+    """
+
+    def __init__(self, expression, columns, sliders, signals):
+        self.expression = expression
+        self.columns = columns
+        self.sliders = sliders
+        self.signals = signals
+        self.used_columns = set()
+        self.used_signals = set()
+
+    def unsupported(self, node, msg=''):
+        raise(ValueError("Expression not supported in the browser: " +
+                         "'%s'. %s" % (self.expression, msg)))
+
+    def generic_visit(self, node):
+        self.unsupported(node)
+
+    def visit_Expression(self, node):
+        return self.visit(node.body)
+
+    def visit_Name(self, node):
+        if node.id in self.sliders:
+            return "sliders['%s'].value" % node.id, False
+        if node.id in self.signals:
+            self.used_signals.add(node.id)
+            return "signals['%s']" % node.id, True
+        if node.id in self.columns:
+            self.used_columns.add(node.id)
+            return "column('%s')" % node.id, True
+        self.unsupported(node, "Unknown name '%s'." % node.id)
+
+    def visit_Constant(self, node):
+        if isinstance(node.value, bool):
+            return ('true' if node.value else 'false'), False
+        if isinstance(node.value, (int, float)):
+            return repr(node.value), False
+        self.unsupported(node)
+
+    # Python < 3.8
+    def visit_Num(self, node):
+        return self.visit_Constant(ast.Constant(value=node.n))
+
+    def visit_NameConstant(self, node):
+        return self.visit_Constant(ast.Constant(value=node.value))
+
+    def visit_UnaryOp(self, node):
+        if not isinstance(node.op, (ast.USub, ast.UAdd)):
+            self.unsupported(node)
+        code, is_series = self.visit(node.operand)
+        op = '-' if isinstance(node.op, ast.USub) else '+'
+        if is_series:
+            return "binop(0, %s, (x, y) => x %s y)" % (code, op), True
+        return "(%s%s)" % (op, code), False
+
+    def visit_BinOp(self, node):
+        if type(node.op) not in _OPERATORS:
+            self.unsupported(node)
+        op = _OPERATORS[type(node.op)]
+        left, left_is_series = self.visit(node.left)
+        right, right_is_series = self.visit(node.right)
+        if left_is_series or right_is_series:
+            return "binop(%s, %s, (x, y) => x %s y)" % (left, right, op), True
+        return "(%s %s %s)" % (left, op, right), False
+
+    def scalar(self, node):
+        code, is_series = self.visit(node)
+        if is_series:
+            self.unsupported(node, "Parameters should be numbers or " +
+                             "sliders.")
+        return code
+
+    def arguments(self, node, names, defaults):
+        """ Arguments of a call by name, as JavaScript scalars. """
+        if len(node.args) > len(names):
+            self.unsupported(node)
+        args = {names[i]: self.scalar(a) for i, a in enumerate(node.args)}
+        for keyword in node.keywords:
+            if keyword.arg not in defaults or keyword.arg in args:
+                self.unsupported(node, "Invalid argument '%s'." %
+                                 keyword.arg)
+            args[keyword.arg] = self.scalar(keyword.value)
+        return args
+
+    def series(self, node):
+        code, is_series = self.visit(node)
+        if not is_series:
+            self.unsupported(node)
+        return code
+
+    def visit_Call(self, node):
+        if not isinstance(node.func, ast.Attribute):
+            self.unsupported(node)
+        method = node.func.attr
+        if method == 'shift':
+            args = self.arguments(node, ['periods'], {'periods': None})
+            return "shift(%s, %s)" % (self.series(node.func.value),
+                                      args.get('periods', '1')), True
+        if (method != 'mean' or node.args or node.keywords or
+                not isinstance(node.func.value, ast.Call) or
+                not isinstance(node.func.value.func, ast.Attribute)):
+            self.unsupported(node)
+        window = node.func.value
+        x = self.series(window.func.value)
+        if window.func.attr == 'rolling':
+            args = self.arguments(window, ['window', 'min_periods'],
+                                  {'window': None, 'min_periods': None})
+            if 'window' not in args:
+                self.unsupported(window, "Missing 'window'.")
+            return "rolling_mean(%s, %s, %s)" % (
+                x, args['window'], args.get('min_periods', 'null')), True
+        if window.func.attr == 'ewm':
+            defaults = {'com': None, 'span': None, 'halflife': None,
+                        'alpha': None, 'min_periods': '0', 'adjust': 'true',
+                        'ignore_na': 'false'}
+            args = self.arguments(window, ['com', 'span', 'halflife',
+                                           'alpha', 'min_periods', 'adjust',
+                                           'ignore_na'], defaults)
+            decay = [k for k in _EWM_ALPHA if k in args]
+            if len(decay) != 1:
+                self.unsupported(window, "Only one of %s should be given." %
+                                 list(_EWM_ALPHA.keys()))
+            defaults.update(args)
+            return "ewm_mean(%s, %s, %s, %s, %s)" % (
+                x, _EWM_ALPHA[decay[0]] % args[decay[0]],
+                defaults['min_periods'], defaults['adjust'],
+                defaults['ignore_na']), True
+        self.unsupported(node)
+
+
+def translate_expression(expression, columns=(), sliders=(), signals=()):
+    """
+        Translate the signal ``expression`` to JavaScript.
+
+        Params
+        ------
+        expression: str
+            Signal expression, i.e.: 'AAPL.ewm(span=w).mean()'.
+        columns, sliders, signals: sequences of str
+            Names of the columns of the sources, of the sliders and of the
+            signals that can be used in the expression.
+
+        Returns
+        -------
+        code: str
+            JavaScript expression. It uses the functions in
+            ``JS_FUNCTIONS``, ``column(name)`` to get the data of the
+            columns, ``sliders[name].value`` and ``signals[name]``.
+        used_columns, used_signals: set
+            Names of the columns and signals used in the expression.
+
+        Raises
+        ------
+        ValueError: if the expression is not supported.
+    """
+    try:
+        tree = ast.parse(expression.strip(), mode='eval')
+    except SyntaxError as excinfo:
+        raise(ValueError("Invalid expression '%s': %s" % (
+            expression, excinfo)))
+    translator = _Translator(expression, columns, sliders, signals)
+    code, is_series = translator.visit(tree)
+    if not is_series:
+        raise(ValueError("Expression not supported in the browser: " +
+                         "'%s'. The result should be a series." %
+                         expression))
+    return code, translator.used_columns, translator.used_signals
+
+
+def sort_signals(dependencies):
+    """
+        Sort the signals so that each one is after the signals it uses.
+
+        Params
+        ------
+        dependencies: dict
+            Names of the signals used by each signal.
+
+        Raises
+        ------
+        ValueError: if there are circular dependencies.
+    """
+    result = []
+    pending = dict(dependencies)
+    while pending:
+        ready = [name for name, used in list(pending.items())
+                 if not (set(used) & set(pending.keys()))]
+        if not ready:
+            raise(ValueError("Circular dependencies between signals: %s" %
+                             sorted(pending.keys())))
+        for name in sorted(ready):
+            result.append(name)
+            del pending[name]
+    return result
@@ -1,29 +1,57 @@
 """
     Example of usage.
     To run do in the command line: bokeh serve main.py
+
+    To format the data and build the dashboard only once, and create the
+    documents of new sessions from a cached template, run the application
+    directory (see app_hooks.py): bokeh serve stocksdashboard
 """
 
 import numpy as np
 import pandas as pd
+from bokeh.io import curdoc
 from stocksdashboard import StocksDashboard
-from bokeh.sampledata.stocks import AAPL, GOOG, IBM, MSFT
-
-
-window_size = 30
-window = np.ones(window_size) / float(window_size)
-aapl = np.array(AAPL['adj_close'])
-aapl_dates = np.array(AAPL['date'], dtype=np.datetime64)
-aapl_avg = pd.DataFrame([aapl_dates,
-                         np.convolve(aapl, window, 'same')],
-                        index=['date', 'adj_close']).T
-
-# Multiple formats for each line.
-StocksDashboard().build_dashboard(
-    input_data={'stocks': {'AAPL': AAPL, 'GOOG': GOOG,
-                           'IBM': IBM, 'MSFT': MSFT},
-                'avg': {'AAPL_avg': aapl_avg}},
-    params={'stocks': {'GOOG': {'line_dash': 'dashed'},
-                       'AAPL': {'color': 'blue'}},
-            'avg': {'color': 'orange',
-                    'line_width': 1.5}},
-    line_width=2.5)
+from stocksdashboard.template_cache import DocumentTemplate
+
+
+def example_data():
+    """
+        Input data of the example dashboard.
+    """
+    from bokeh.sampledata.stocks import AAPL, GOOG, IBM, MSFT
+
+    window_size = 30
+    window = np.ones(window_size) / float(window_size)
+    aapl = np.array(AAPL['adj_close'])
+    aapl_dates = np.array(AAPL['date'], dtype=np.datetime64)
+    aapl_avg = pd.DataFrame([aapl_dates,
+                             np.convolve(aapl, window, 'same')],
+                            index=['date', 'adj_close']).T
+
+    return {'stocks': {'AAPL': AAPL, 'GOOG': GOOG, 'IBM': IBM, 'MSFT': MSFT},
+            'avg': {'AAPL_avg': aapl_avg}}
+
+
+def example_dashboard(input_data=None):
+    """
+        Parameters of :meth:`StocksDashboard.build_dashboard` for the
+        example dashboard. The example data is loaded if ``input_data``
+        is not given.
+    """
+    # Multiple formats for each line.
+    return dict(
+        input_data=example_data() if input_data is None else input_data,
+        params={'stocks': {'GOOG': {'line_dash': 'dashed'},
+                           'AAPL': {'color': 'blue'}},
+                'avg': {'color': 'orange',
+                        'line_width': 1.5}},
+        line_width=2.5)
+
+
+# Not run when imported from app_hooks.py.
+if __name__ != 'stocksdashboard.main':
+    template = DocumentTemplate.from_context(curdoc())
+    if template is not None:
+        template.new_document(curdoc())
+    else:
+        StocksDashboard().build_dashboard(**example_dashboard())
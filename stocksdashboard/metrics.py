@@ -0,0 +1,336 @@
+#!/usr/bin/env python3
+# Authors: Mabel Villalba Jimenez <mabelvj@gmail.com>,
+#          Emilio Molina Martinez <emilio.mol.mar@gmail.com>
+# License: GPLv3
+
+"""
+    Runtime metrics of the dashboards in Prometheus text format.
+
+    - ``stocksdashboard_update_data_seconds``: duration of
+      :meth:`DashboardWithWidgets.update_data`.
+    - ``stocksdashboard_source_change_bytes``: bytes of the columns sent
+      per change of a source, by kind of change ('data', 'stream' or
+      'patch'), in the documents passed to :func:`instrument_document`.
+    - ``stocksdashboard_sessions``: open sessions (see
+      :func:`on_session_created` and :func:`on_session_destroyed`).
+    - ``stocksdashboard_sources``: ColumnDataSources of the dashboards
+      alive.
+
+    The metrics are exposed by :class:`MetricsHandler`, i.e.:
+
+        >>> Server(applications, extra_patterns=extra_patterns())
+
+    or, with bokeh serve, by a local HTTP server started from the
+    ``on_server_loaded`` hook with :func:`listen`.
+
+    The metrics are those of the process that serves them: with several
+    processes (bokeh serve --num-procs N), each worker must serve its own
+    in a different port (see app_hooks.py).
+"""
+
+import contextlib
+import threading
+import time
+import weakref
+
+import numpy as np
+from tornado.web import Application
+from tornado.web import RequestHandler
+
+from bokeh.document.events import ColumnDataChangedEvent
+from bokeh.document.events import ColumnsPatchedEvent
+from bokeh.document.events import ColumnsStreamedEvent
+from bokeh.document.events import ModelChangedEvent
+from bokeh.models import ColumnDataSource
+
+
+def _format_labels(names, values, extra=()):
+    labels = list(zip(names, values)) + list(extra)
+    if not labels:
+        return ''
+    return '{%s}' % ','.join(['%s="%s"' % (k, str(v).replace('"', '\\"'))
+                              for k, v in labels])
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value))
+
+
+class _Metric():
+
+    """
+        Base class of the metrics. Each metric has a value per combination
+        of the values of its ``labels``.
+    """
+
+    type_name = None
+
+    def __init__(self, name, documentation, labels=()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels):
+        if set(labels.keys()) != set(self.labels):
+            raise(ValueError("Expected labels %s, " % list(self.labels) +
+                             "found: %s" % list(labels.keys())))
+        return tuple([labels[k] for k in self.labels])
+
+    def render(self):
+        """ Lines of the metric in Prometheus text format. """
+        lines = ['# HELP %s %s' % (self.name, self.documentation),
+                 '# TYPE %s %s' % (self.name, self.type_name)]
+        with self._lock:
+            samples = self._samples()
+        for suffix, key, extra, value in samples:
+            lines.append('%s%s%s %s' % (
+                self.name, suffix, _format_labels(self.labels, key, extra),
+                _format_value(value)))
+        return lines
+
+    def _samples(self):
+        return [('', key, (), value)
+                for key, value in sorted(self._values.items())]
+
+
+class Counter(_Metric):
+
+    """ Value that only increases, i.e. number of events. """
+
+    type_name = 'counter'
+
+    def inc(self, amount=1, **labels):
+        assert amount >= 0, "Counters can only increase."
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        return self._values.get(self._key(labels), 0)
+
+
+class Gauge(_Metric):
+
+    """
+        Value that can go up and down. If ``function`` is given, the value
+        is computed with it when rendered.
+    """
+
+    type_name = 'gauge'
+
+    def __init__(self, name, documentation, labels=(), function=None):
+        super(Gauge, self).__init__(name, documentation, labels)
+        self.function = function
+
+    def set(self, value, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+    def value(self, **labels):
+        if self.function is not None:
+            return self.function()
+        return self._values.get(self._key(labels), 0)
+
+    def _samples(self):
+        if self.function is not None:
+            return [('', (), (), self.function())]
+        return super(Gauge, self)._samples()
+
+
+class Histogram(_Metric):
+
+    """
+        Distribution of observed values (i.e. durations or sizes) in
+        cumulative ``buckets``, with their sum and count.
+    """
+
+    type_name = 'histogram'
+    default_buckets = (.005, .01, .025, .05, .1, .25, .5, 1., 2.5, 5., 10.)
+
+    def __init__(self, name, documentation, labels=(), buckets=None):
+        super(Histogram, self).__init__(name, documentation, labels)
+        self.buckets = tuple(sorted(buckets or self.default_buckets)) + (
+            float('inf'),)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        i = int(np.searchsorted(self.buckets, value, side='left'))
+        with self._lock:
+            counts, total = self._values.get(
+                key, ([0] * len(self.buckets), 0.))
+            counts[i] += 1
+            self._values[key] = (counts, total + value)
+
+    def count(self, **labels):
+        counts, _ = self._values.get(self._key(labels), ([0], 0.))
+        return sum(counts)
+
+    def sum(self, **labels):
+        return self._values.get(self._key(labels), ([0], 0.))[1]
+
+    def time(self, **labels):
+        """
+            Observe the duration (seconds) of a block or function, as a
+            context manager or decorator.
+        """
+        histogram = self
+
+        class _Timer(contextlib.ContextDecorator):
+            def _recreate_cm(self):
+                # a new timer per decorated call.
+                return _Timer()
+
+            def __enter__(self):
+                self.start = time.perf_counter()
+                return self
+
+            def __exit__(self, *exc_info):
+                histogram.observe(time.perf_counter() - self.start,
+                                  **labels)
+                return False
+
+        return _Timer()
+
+    def _samples(self):
+        samples = []
+        for key, (counts, total) in sorted(self._values.items()):
+            cumulative = np.cumsum(counts)
+            samples += [('_bucket', key, [('le', _format_value(b))], c)
+                        for b, c in zip(self.buckets, cumulative)]
+            samples += [('_sum', key, (), total),
+                        ('_count', key, (), cumulative[-1])]
+        return samples
+
+
+class Registry():
+
+    """ Collection of metrics rendered together. """
+
+    def __init__(self):
+        self.metrics = {}
+
+    def register(self, metric):
+        if metric.name in self.metrics:
+            raise(ValueError("Metric '%s' already registered." %
+                             metric.name))
+        self.metrics[metric.name] = metric
+        return metric
+
+    def render(self):
+        """ All the metrics in Prometheus text format. """
+        lines = []
+        for name in sorted(self.metrics.keys()):
+            lines += self.metrics[name].render()
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = Registry()
+
+# Sources of the dashboards alive.
+_sources = weakref.WeakSet()
+# Documents whose source changes are measured.
+_documents = weakref.WeakSet()
+
+UPDATE_DATA_SECONDS = REGISTRY.register(Histogram(
+    'stocksdashboard_update_data_seconds',
+    'Duration of DashboardWithWidgets.update_data.'))
+SOURCE_CHANGE_BYTES = REGISTRY.register(Histogram(
+    'stocksdashboard_source_change_bytes',
+    'Bytes of the columns sent per change of a source.', labels=('kind',),
+    buckets=[10 ** i for i in range(2, 10)]))
+SESSIONS = REGISTRY.register(Gauge(
+    'stocksdashboard_sessions', 'Open sessions.'))
+SOURCES = REGISTRY.register(Gauge(
+    'stocksdashboard_sources', 'ColumnDataSources of the dashboards alive.',
+    function=lambda: len(_sources)))
+
+
+def track_sources(sources):
+    """ Count ``sources`` in ``stocksdashboard_sources`` while alive. """
+    for source in sources:
+        _sources.add(source)
+
+
+def _nbytes(data, columns=None):
+    return sum([np.asarray(v).nbytes for k, v in list(data.items())
+                if columns is None or k in columns])
+
+
+def _on_document_change(event):
+    if not (isinstance(event, ModelChangedEvent) and
+            isinstance(event.model, ColumnDataSource) and
+            event.attr == 'data'):
+        return
+    hint = event.hint
+    if isinstance(hint, ColumnsStreamedEvent):
+        SOURCE_CHANGE_BYTES.observe(_nbytes(hint.data), kind='stream')
+    elif isinstance(hint, ColumnsPatchedEvent):
+        nbytes = sum([np.asarray(value).nbytes
+                      for patches in list(hint.patches.values())
+                      for _, value in patches])
+        SOURCE_CHANGE_BYTES.observe(nbytes, kind='patch')
+    else:
+        columns = hint.cols if isinstance(hint, ColumnDataChangedEvent) \
+            else None
+        SOURCE_CHANGE_BYTES.observe(_nbytes(event.model.data, columns),
+                                    kind='data')
+
+
+def instrument_document(doc):
+    """
+        Measure the bytes of the source changes of ``doc`` in
+        ``stocksdashboard_source_change_bytes``. Only done once per
+        document.
+    """
+    if doc not in _documents:
+        _documents.add(doc)
+        doc.on_change(_on_document_change)
+    return doc
+
+
+def on_session_created(session_context):
+    """ Lifecycle hook (see app_hooks.py) counting the open sessions. """
+    SESSIONS.inc()
+
+
+def on_session_destroyed(session_context):
+    """ Lifecycle hook (see app_hooks.py) counting the open sessions. """
+    SESSIONS.dec()
+
+
+class MetricsHandler(RequestHandler):
+
+    """ Tornado handler returning the metrics in Prometheus text format. """
+
+    def initialize(self, registry=REGISTRY):
+        self.registry = registry
+
+    def get(self):
+        self.set_header('Content-Type', 'text/plain; version=0.0.4')
+        self.write(self.registry.render())
+
+
+def extra_patterns(path='/metrics', registry=REGISTRY):
+    """ ``extra_patterns`` of a bokeh.server.server.Server. """
+    return [(path, MetricsHandler, {'registry': registry})]
+
+
+def listen(port, address='127.0.0.1', path='/metrics', registry=REGISTRY):
+    """
+        Serve the metrics in ``http://address:port/path`` with the current
+        IOLoop, i.e. from the ``on_server_loaded`` hook of bokeh serve.
+    """
+    application = Application(extra_patterns(path, registry))
+    return application.listen(port, address=address)
@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+# Authors: Mabel Villalba Jimenez <mabelvj@gmail.com>,
+#          Emilio Molina Martinez <emilio.mol.mar@gmail.com>
+# License: GPLv3
+
+"""
+    Sampling profiler of the widget callbacks (see the ``profile`` param of
+    :class:`DashboardWithWidgets`).
+
+    Each profiled call is split in phases, i.e.::
+
+        update_data;materialise
+        update_data;evaluate;EMA
+        update_data;write
+
+    The time of each phase is measured, and the stack of the profiled
+    thread is sampled every ``interval`` seconds from another thread. The
+    samples are prefixed with the phases, and saved as collapsed stacks
+    (``.folded``), one line per stack with its count, i.e.::
+
+        update_data;evaluate;EMA;<module>;mean;_apply 12
+
+    to be rendered with flamegraph.pl or speedscope.
+"""
+
+import collections
+import contextlib
+import os
+import sys
+import threading
+import time
+
+
+class CallbackProfiler():
+
+    """
+        Params
+        ------
+        path: str, optional
+            Directory where the collapsed stacks of each profiled call are
+            written, as ``<name>_<call number>.folded``. If None, they are
+            only kept in memory (see ``stacks`` and :meth:`write`).
+        interval: float, default 0.001
+            Seconds between samples. Note that the sampler needs the GIL,
+            so the effective interval is at least ``sys.getswitchinterval``
+            while the profiled thread runs Python code.
+
+        Attributes
+        ----------
+        timings: dict
+            Seconds spent in each phase, i.e. 'update_data;evaluate;EMA',
+            over all the profiled calls.
+        stacks: collections.Counter
+            Samples of each collapsed stack, over all the profiled calls.
+        calls: int
+            Number of profiled calls.
+    """
+
+    def __init__(self, path=None, interval=0.001):
+        self.path = path
+        self.interval = interval
+        self.timings = collections.defaultdict(float)
+        self.stacks = collections.Counter()
+        self.calls = 0
+        self._phases = []
+        self._root = None
+        self._thread_id = None
+        if path is not None and not os.path.isdir(path):
+            os.makedirs(path)
+
+    @contextlib.contextmanager
+    def profile(self, name):
+        """
+            Profile the block as a call ``name``, sampling the frames called
+            from the frame where the block runs.
+        """
+        # frames: this generator <- contextlib.__enter__ <- caller
+        self._root = sys._getframe(0).f_back.f_back
+        self._thread_id = threading.get_ident()
+        samples = collections.Counter()
+        stop = threading.Event()
+        sampler = threading.Thread(target=self._sample, args=(stop, samples),
+                                   daemon=True)
+        sampler.start()
+        try:
+            with self.phase(name):
+                yield self
+        finally:
+            stop.set()
+            sampler.join()
+            self._root = None
+            self.calls += 1
+            self.stacks.update(samples)
+            if self.path is not None:
+                self.write(os.path.join(
+                    self.path, '%s_%04d.folded' % (name, self.calls)),
+                    samples)
+
+    @contextlib.contextmanager
+    def phase(self, *names):
+        """ Measure the block as the phase ``names`` of the current one. """
+        self._phases.extend(names)
+        key = ';'.join(self._phases)
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.timings[key] += time.perf_counter() - start
+            del self._phases[-len(names):]
+
+    @staticmethod
+    def _frame_name(frame):
+        code = frame.f_code
+        return '%s (%s:%d)' % (code.co_name,
+                               os.path.basename(code.co_filename),
+                               code.co_firstlineno)
+
+    def _sample(self, stop, samples):
+        while not stop.wait(self.interval):
+            frame = sys._current_frames().get(self._thread_id)
+            phases = list(self._phases)
+            stack = []
+            while frame is not None and frame is not self._root:
+                stack.append(self._frame_name(frame))
+                frame = frame.f_back
+            if frame is None or not phases:
+                # outside of the profiled block
+                continue
+            # the frames of contextlib entering the phases are not useful
+            stack = [f for f in stack[::-1] if 'contextlib.py' not in f]
+            samples[';'.join(phases + stack)] += 1
+
+    def write(self, filename, stacks=None):
+        """ Write the collapsed ``stacks`` (default: all) to ``filename``. """
+        stacks = self.stacks if stacks is None else stacks
+        with open(filename, 'w') as f:
+            for stack, count in sorted(stacks.items()):
+                f.write('%s %d\n' % (stack, count))
+        return filename
+
+    def signal_timings(self, name='update_data'):
+        """ Seconds spent evaluating each signal in the calls ``name``. """
+        prefix = '%s;evaluate;' % name
+        return {k[len(prefix):]: v for k, v in list(self.timings.items())
+                if k.startswith(prefix)}
+
+    def report(self):
+        """ Table of the seconds spent in each phase. """
+        lines = ['%-50s %10s %10s' % ('phase', 'total ms', 'per call ms')]
+        for key, seconds in sorted(self.timings.items()):
+            lines.append('%-50s %10.2f %10.2f' % (
+                key, 1000 * seconds, 1000 * seconds / max(self.calls, 1)))
+        return '\n'.join(lines)
@@ -0,0 +1,214 @@
+#!/usr/bin/env python3
+# Authors: Mabel Villalba Jimenez <mabelvj@gmail.com>,
+#          Emilio Molina Martinez <emilio.mol.mar@gmail.com>
+# License: GPLv3
+
+import numpy as np
+import pandas as pd
+import json
+import os
+import shutil
+import tempfile
+import time
+
+from .formatter import Formatter
+
+
+class SharedData():
+
+    """
+        Formatted data stored once in memory-mapped files and attached
+        read-only by several processes, i.e. the workers of
+        ``bokeh serve --num-procs N``.
+
+        The pages of the files are shared by all the processes that attach
+        them, so memory scales with the data and not with the number of
+        workers.
+
+        Data is stored in the directory ``path``: one .npy file per array
+        and a 'manifest.json' describing the panels. Aligned panels are
+        stored as a single 2-D (Fortran ordered) array and attached as
+        wide pd.DataFrames, which :class:`Formatter` plots without copies.
+        Panels whose series have different indices are stored per series.
+
+        Parameters
+        ----------
+        path: str
+            Directory containing the shared data.
+
+        Examples
+        --------
+
+            >>> shared = SharedData('/tmp/stocksdashboard')
+            >>> input_data = shared.get_or_create(load_data)
+            >>> StocksDashboard().build_dashboard(input_data=input_data)
+    """
+
+    manifest_name = 'manifest.json'
+
+    def __init__(self, path):
+        self.path = os.path.abspath(path)
+
+    @property
+    def lock_path(self):
+        return self.path + '.lock'
+
+    def exists(self):
+        return os.path.exists(os.path.join(self.path, self.manifest_name))
+
+    @staticmethod
+    def _save(directory, values, arrays):
+        """
+            Save ``values`` in ``directory`` once (arrays are identified
+            by id) and return the entry of the manifest.
+
+            ``arrays`` keeps a reference to the saved objects, so that
+            their ids are not reused by other arrays while publishing.
+        """
+        if id(values) not in arrays:
+            array = np.asarray(values)
+            filename = '%d.npy' % len(arrays)
+            np.save(os.path.join(directory, filename), array,
+                    allow_pickle=array.dtype.hasobject)
+            arrays[id(values)] = (values, {'file': filename,
+                                           'mmap': not array.dtype.hasobject})
+        return arrays[id(values)][1]
+
+    def _load(self, entry):
+        mmap_mode = 'r' if entry['mmap'] else None
+        return np.load(os.path.join(self.path, entry['file']),
+                       mmap_mode=mmap_mode, allow_pickle=not entry['mmap'])
+
+    def publish(self, formatted_data):
+        """
+            Store ``formatted_data`` (dict with a list of pd.Series per
+            plot title, as returned by :meth:`Formatter.format_input_data`)
+            in ``self.path``.
+
+            The data is written to a temporary directory that is renamed
+            to ``self.path``, so other processes never see partial data.
+        """
+        parent = os.path.dirname(self.path)
+        directory = tempfile.mkdtemp(
+            prefix=os.path.basename(self.path) + '.tmp', dir=parent)
+        arrays = {}
+        indices = {}
+        manifest = {'panels': []}
+        try:
+            for plot_title, series in list(formatted_data.items()):
+                panel = {'title': plot_title,
+                         'names': [s.name for s in series]}
+                if (len(series) > 1 and
+                        all([s.index.equals(series[0].index) and
+                             s.dtype == series[0].dtype and
+                             not s.dtype.hasobject for s in series])):
+                    values = np.empty((len(series[0]), len(series)),
+                                      dtype=series[0].dtype, order='F')
+                    for i, s in enumerate(series):
+                        values[:, i] = s.values
+                    panel['values'] = self._save(directory, values, arrays)
+                    panel['index'] = self._save(
+                        directory, indices.setdefault(
+                            id(series[0].index),
+                            np.asarray(series[0].index)), arrays)
+                else:
+                    panel['series'] = [
+                        {'values': self._save(directory, s.values, arrays),
+                         'index': self._save(directory, indices.setdefault(
+                             id(s.index), np.asarray(s.index)), arrays)}
+                        for s in series]
+                manifest['panels'].append(panel)
+            with open(os.path.join(directory, self.manifest_name), 'w') as f:
+                json.dump(manifest, f)
+            os.rename(directory, self.path)
+        except Exception:
+            shutil.rmtree(directory, ignore_errors=True)
+            raise
+        return self
+
+    def attach(self):
+        """
+            Attach the shared data read-only.
+
+            Returns
+            -------
+            input_data: dict
+                Dict with the data of each plot title, to be passed as
+                ``input_data`` to :meth:`StocksDashboard.build_dashboard`:
+                a wide pd.DataFrame for aligned panels or a dict of
+                pd.Series otherwise. The values are memory-mapped.
+        """
+        with open(os.path.join(self.path, self.manifest_name)) as f:
+            manifest = json.load(f)
+        indices = {}
+
+        def _index(entry):
+            if entry['file'] not in indices:
+                indices[entry['file']] = pd.Index(self._load(entry))
+            return indices[entry['file']]
+
+        input_data = {}
+        for panel in manifest['panels']:
+            if 'values' in panel:
+                input_data[panel['title']] = Formatter.from_array(
+                    self._load(panel['values']),
+                    index=_index(panel['index']), columns=panel['names'])
+            else:
+                input_data[panel['title']] = {
+                    name: pd.Series(self._load(entry['values']),
+                                    index=_index(entry['index']), name=name,
+                                    copy=False)
+                    for name, entry in zip(panel['names'], panel['series'])}
+        return input_data
+
+    def get_or_create(self, load_data, column='adj_close', timeout=600.,
+                      **formatter_params):
+        """
+            Attach the shared data, creating it first if it does not exist.
+
+            Only one process formats and publishes the data: the one that
+            creates the lock file ``self.path + '.lock'``. The others wait
+            until the data is published.
+
+            Params
+            ------
+            load_data: callable
+                Function returning the input data of the dashboard. Only
+                called by the process that creates the data.
+            column: str
+                Column of the data to be plotted.
+            timeout: float
+                Seconds to wait for another process to publish the data.
+            **formatter_params:
+                Parameters of :class:`Formatter`.
+        """
+        start = time.time()
+        while not self.exists():
+            try:
+                fd = os.open(self.lock_path,
+                             os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+            except FileExistsError:
+                if time.time() - start > timeout:
+                    raise(TimeoutError(
+                        "Timeout waiting for the shared data in " +
+                        "'%s'. Remove '%s' " % (self.path, self.lock_path) +
+                        "if no other process is creating it."))
+                time.sleep(0.05)
+                continue
+            try:
+                os.close(fd)
+                if not self.exists():
+                    formatted_data, _, _ = Formatter(
+                        **formatter_params).format_input_data(load_data(),
+                                                              column)
+                    self.publish(formatted_data)
+            finally:
+                os.remove(self.lock_path)
+        return self.attach()
+
+    def unlink(self):
+        """
+            Remove the shared data. Processes that attached it keep their
+            mappings valid.
+        """
+        shutil.rmtree(self.path, ignore_errors=True)
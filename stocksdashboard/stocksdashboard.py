@@ -3,17 +3,22 @@
 #          Emilio Molina Martinez <emilio.mol.mar@gmail.com>
 # License: GPLv3
 
-try:
-    from .formatter import Formatter
-except Exception as excinfo:
-    print(str(excinfo))
-    from formatter import Formatter
+from .formatter import Formatter
+from .formatter import convert_to_datetime
+from .aggregations import cross_sectional_quantiles
+from .aggregations import quantile_column
+from .aggregations import returns_matrix
+from .aggregations import bin_rows
+from .windowing import WindowCache
+from .metrics import instrument_document
+from .metrics import track_sources
 
 import numpy as np
 import pandas as pd
 import datetime
 
 from bokeh.layouts import gridplot
+from bokeh.layouts import column as column_layout
 from bokeh.plotting import figure
 from bokeh.models import ColumnDataSource
 from bokeh.models import Range1d
@@ -27,22 +32,31 @@ import warnings
 import copy
 
 from bokeh.models import HoverTool
+from bokeh.models import GlyphRenderer
+from bokeh.models import Plot
+from bokeh.models import CustomJS
+from bokeh.models import CustomJSTransform
+from bokeh.models import RadioButtonGroup
+from bokeh.models import MultiChoice
+from bokeh.models import ColorBar
+from bokeh.models import FixedTicker
+from bokeh.models import LinearColorMapper
+from bokeh.events import RangesUpdate
+from bokeh.transform import transform
 from bokeh.io import curdoc
-from bokeh.palettes import all_palettes
-from bokeh.layouts import row, widgetbox
 import bokeh
 
 WIDTH = 1024
 HEIGHT = 648
+# Percentiles of the quantile panels (see ``panel_type``).
+QUANTILES = (5, 25, 50, 75, 95)
 COLOR_WARNING = False
 
 
-def convert_to_datetime(x):
-    return np.array(x, dtype=np.datetime64)
-
-
 def get_colors(number_of_colors, palette_name='Category20'):
     global COLOR_WARNING
+    # all_palettes is large, import it only when colors are needed.
+    from bokeh.palettes import all_palettes
     if not COLOR_WARNING:
         url_palettes = 'https://bokeh.pydata.org/en/' + \
                        'latest/docs/reference/palettes.html'
@@ -64,12 +78,27 @@ class StocksDashboard():
     }
     mode = 'vline'
     names = None
-    datasources = []
+    memory_report = None
+    view_selector = None
+    # Handle of the notebook cell showing the dashboard (see
+    # :meth:`show_notebook`).
+    notebook_handle = None
+    # Labels of the views (see ``views`` in :meth:`build_dashboard`) and of
+    # their y axes.
+    views = ['Price', 'Rebased 100', 'Return %']
+    views_axis_labels = [None, 'Rebased (100)', 'Return (%)']
+    # Types of panels (see ``panel_type`` in :meth:`build_dashboard`).
+    panel_types = ('lines', 'quantiles', 'heatmap', 'picker')
+    quantiles_color = 'steelblue'
+    # prefetch the windows next to the visible one of the heatmaps on pan.
+    heatmap_prefetch = True
 
     def __init__(self, width=WIDTH, height=HEIGHT, ncols=1):
         self.width = width
         self.height = height
         self.ncols = ncols
+        # Sources of the dashboard, filled by :meth:`build_dashboard`.
+        self.datasources = []
         self._check_variables()
 
     def _check_variables(self, varname=None):
@@ -207,6 +236,26 @@ class StocksDashboard():
                 result[k] = v
         return result
 
+    @staticmethod
+    def _deepcopy_params(params):
+        """
+            Deep copy of ``params`` that does not copy the Bokeh models
+            (i.e. a shared 'x_range'), since their copies keep the same id.
+        """
+        memo = {}
+
+        def _find_models(value):
+            if isinstance(value, bokeh.model.Model):
+                memo[id(value)] = value
+            elif isinstance(value, dict):
+                for v in list(value.values()):
+                    _find_models(v)
+            elif isinstance(value, (list, tuple)):
+                for v in value:
+                    _find_models(v)
+        _find_models(params)
+        return copy.deepcopy(params, memo)
+
     def __get_kwargs_to_figure(self, _params):
         """
             From the input parameter for the current plot,
@@ -214,7 +263,7 @@ class StocksDashboard():
             and remove them from 'params' so the rest available
             are just params for Line.
         """
-        params = copy.deepcopy(_params)
+        params = self._deepcopy_params(_params)
         kwargs_to_figure = self.__get_class_attr(params,
                                                  bokeh.plotting.figure())
         for k, v in list(kwargs_to_figure.items()):
@@ -227,7 +276,7 @@ class StocksDashboard():
         for k, v in list(params.items()):
             try:
                 bokeh.plotting.figure(**{k: v})
-                kwargs_to_figure[k] = copy.deepcopy(v)
+                kwargs_to_figure[k] = self._deepcopy_params(v)
                 del(params[k])
             except Exception as excinfo:
                 # print(str(excinfo))
@@ -258,20 +307,37 @@ class StocksDashboard():
     def __update_datasource(self, datasource, stock, column, name):
         """
             Update the object datasource with data from each stock.
+
+            The columns share the buffers of the input data (i.e. of a wide
+            frame). They are read-only views, so they are copied by
+            :meth:`_patch_source` (and :class:`tailing.FileRefresher`)
+            before being patched instead of modifying the input data.
         """
-        x, y = Formatter._get_x_y(stock, column)
-        datasource.add(name=name, data=y)
+        if isinstance(stock, pd.Series):
+            # Use the buffers of the formatted series, without copies.
+            x, y = stock.index, stock
+        else:
+            x, y = Formatter._get_x_y(stock, column)
+        datasource.add(name=name, data=self._shared_column(y))
         if 'x' not in datasource.data:
-            datasource.add(name='x', data=x)
+            datasource.add(name='x', data=self._shared_column(x))
         return datasource
 
+    @staticmethod
+    def _shared_column(values):
+        """ Read-only view of ``values``, without copies. """
+        values = np.asarray(values).view()
+        values.setflags(write=False)
+        return values
+
     def get_y_limits(self, data, aligment, position='right', x_range=None):
-        ix_range = pd.date_range(x_range.start, x_range.end)
         _min = None
         _max = None
         for i, (stockname, al) in enumerate(list(aligment.items())):
             if al == position:
-                _data = data[i][ix_range]
+                # Slice by label so that series that do not share the
+                # same index (see ``Formatter(align=False)``) are valid.
+                _data = data[i].loc[x_range.start:x_range.end]
                 if _min:
                     _min = min(_min, np.nanmin(_data))
                 else:
@@ -329,51 +395,79 @@ class StocksDashboard():
          extra_y_ranges) = self.__get_ranges(kwargs_to_figure,
                                              'extra_y_ranges')
         kwargs_to_figure_general.update(kwargs_to_figure)
-        _kwargs_to_figure = copy.deepcopy(kwargs_to_figure_general)
+        _kwargs_to_figure = self._deepcopy_params(kwargs_to_figure_general)
 
         return params, kwargs_to_bokeh, _kwargs_to_figure, extra_y_ranges
 
+    def _create_figure(self, data, aligment, params, kwargs_to_bokeh,
+                       height=None):
+        """
+            Create the figure of a panel, with the figure attributes in
+            ``params`` and ``kwargs_to_bokeh`` and the y limits of ``data``.
+
+            Returns the figure and the remaining (line) params and kwargs.
+        """
+        (params,
+         kwargs_to_bokeh,
+         kwargs_to_figure,
+         extra_y_ranges) = self.separate_Figure_and_Line_params(
+            params, kwargs_to_bokeh)
+        p = figure(x_axis_type="datetime", sizing_mode='scale_both',
+                   plot_width=self.width,
+                   **kwargs_to_figure)
+        if height:
+            p.plot_height = int(height * self.height)
+            # print(int(height*self.height))
+        p.grid.grid_line_alpha = 0.3
+        p.xaxis.axis_label = 'Date'
+        p = self.set_limits(
+            p, data, aligment, extra_y_ranges, kwargs_to_figure['x_range'],
+            y_range_in_params=('y_range' in kwargs_to_figure))
+        return p, params, kwargs_to_bokeh
+
     def _plot_stock(self, data=None, names=None, p=None, column='adj_close',
                     ylabel_right=None, add_hover=True,
                     params={}, aligment={}, height=None,
-                    verbose=False, **kwargs_to_bokeh):
+                    verbose=False, align=True, **kwargs_to_bokeh):
+        """
+            Plot the timeseries in ``data`` as lines in the figure ``p``.
+
+            If ``align`` is True all the series share the same index and
+            are stored in a single ColumnDataSource. Otherwise, each series
+            is stored in its own ColumnDataSource with its own 'x', so
+            series with different indices are not padded with NaN.
+        """
         if not p:
-            (params,
-             kwargs_to_bokeh,
-             kwargs_to_figure,
-             extra_y_ranges) = self.separate_Figure_and_Line_params(
-                params, kwargs_to_bokeh)
-            p = figure(x_axis_type="datetime", sizing_mode='scale_both',
-                       plot_width=self.width,
-                       **kwargs_to_figure)
-            if height:
-                p.plot_height = int(height * self.height)
-                # print(int(height*self.height))
-            p.grid.grid_line_alpha = 0.3
-            p.xaxis.axis_label = 'Date'
-            p = self.set_limits(
-                p, data, aligment, extra_y_ranges, kwargs_to_figure['x_range'],
-                y_range_in_params=('y_range' in kwargs_to_figure))
+            p, params, kwargs_to_bokeh = self._create_figure(
+                data, aligment, params, kwargs_to_bokeh, height)
 
         # data, names = Formatter().format_data(input_data)
         colors = get_colors(len(data))
         params = self._update_params(params=params, kwargs=kwargs_to_bokeh,
                                      names=names, aligment=aligment)
         p_to_hover = []
-        __datasource = ColumnDataSource()
+        datasources = []
         for i, stock in enumerate(data):
+            if align and datasources:
+                __datasource = datasources[0]
+            else:
+                __datasource = ColumnDataSource()
+                datasources.append(__datasource)
             __datasource = self.__update_datasource(__datasource, stock,
                                                     column, names[i])
             _params = self._get_params(params, names[i], colors[i])
             if verbose:
                 print(names[i], _params)
-            _p = p.line(x='x', y=names[i], source=__datasource, **_params)
+            _p = p.line(x='x', y=names[i], source=__datasource,
+                        name=names[i], **_params)
             p_to_hover.append(_p)
 
-        assert(len(__datasource.data) == len(data) + 1), (
+        # each source contains its data and the x-axis
+        assert(sum([len(ds.data) - 1 for ds in datasources]) == len(data)), (
             "Number of elements used as source don't match " +
-            "data dimension.")  # len(data) + 1 -> all data and the x-axis
-        self.datasources.append(__datasource)
+            "data dimension.")
+        self.datasources.extend(datasources)
+        track_sources(datasources)
 
         assert(len(p_to_hover) == len(data)), "Number of Lines " + \
                                               "don't match data dimension."
@@ -396,6 +490,404 @@ class StocksDashboard():
             pass
         return p
 
+    def _quantile_data(self, data, names, quantiles, highlight=()):
+        """
+            Data of the source of a quantile panel: 'x', the percentiles
+            ``quantiles`` of all the series at each date (see
+            :func:`aggregations.cross_sectional_quantiles`) and the series
+            in ``highlight``.
+        """
+        index, values = cross_sectional_quantiles(data, quantiles)
+        source_data = {'x': np.asarray(index)}
+        for q, v in zip(quantiles, values):
+            source_data[quantile_column(q)] = v
+        for name in highlight:
+            if name in names:
+                stock = data[names.index(name)]
+                if not stock.index.equals(index):
+                    stock = stock.reindex(index)
+                source_data[name] = np.asarray(stock, dtype=float)
+            else:
+                source_data[name] = np.full(len(index), np.nan)
+        return source_data
+
+    def _plot_quantiles(self, data=None, names=None, quantiles=QUANTILES,
+                        highlight=(), add_hover=True, params={}, height=None,
+                        **kwargs_to_bokeh):
+        """
+            Plot the percentiles ``quantiles`` of the series in ``data`` at
+            each date, as bands between symmetric percentiles (i.e. 5-95%
+            and 25-75%) and a line for the middle one (i.e. the median),
+            and the series in ``highlight`` as lines.
+
+            Only the percentiles and the highlighted series are sent to the
+            browser, so the data does not grow with the number of series.
+        """
+        quantiles = sorted(quantiles)
+        highlight = [name for name in highlight if name in names]
+        source = ColumnDataSource(data=self._quantile_data(
+            data, names, quantiles, highlight))
+        index = pd.Index(source.data['x'])
+        plotted = [quantile_column(q) for q in quantiles] + highlight
+        p, params, kwargs_to_bokeh = self._create_figure(
+            [pd.Series(source.data[k], index=index) for k in plotted],
+            {k: 'left' for k in plotted}, params, kwargs_to_bokeh, height)
+
+        n = len(quantiles)
+        for i in range(n // 2):
+            lower, upper = quantiles[i], quantiles[n - 1 - i]
+            p.varea(x='x', y1=quantile_column(lower),
+                    y2=quantile_column(upper), source=source,
+                    fill_color=self.quantiles_color,
+                    fill_alpha=0.6 * (i + 1) / (n // 2 + 1),
+                    legend_label='%g-%g%%' % (lower, upper),
+                    name='%s-%s' % (quantile_column(lower),
+                                    quantile_column(upper)))
+        p_to_hover = []
+        if n % 2:
+            middle = quantiles[n // 2]
+            p_to_hover.append(p.line(
+                x='x', y=quantile_column(middle), source=source,
+                color=self.quantiles_color, line_width=2,
+                legend_label='%g%%' % middle, name=quantile_column(middle)))
+
+        colors = get_colors(len(highlight))
+        params = self._update_params(params=copy.deepcopy(params),
+                                     kwargs=kwargs_to_bokeh, names=names)
+        for i, name in enumerate(highlight):
+            _params = self._get_params(params, name, colors[i])
+            p_to_hover.append(p.line(x='x', y=name, source=source,
+                                     name=name, **_params))
+
+        self.datasources.append(source)
+        track_sources([source])
+        p.legend.location = "top_left"
+        p.legend.click_policy = "hide"
+        if add_hover and p_to_hover:
+            p.add_tools(StocksDashboard._create_hover(self.tooltips,
+                                                      self.formatters,
+                                                      self.mode,
+                                                      renderers=p_to_hover))
+        return p
+
+    @staticmethod
+    def _to_milliseconds(x):
+        """
+            Coordinates ``x`` (dates or numbers) as in the browser:
+            milliseconds since epoch for dates.
+        """
+        if isinstance(x, (pd.Index, np.ndarray)):
+            if x.dtype.kind == 'M':
+                return np.asarray(x, dtype='datetime64[ns]').astype(
+                    np.int64) / 1e6
+            return np.asarray(x, dtype=float)
+        if isinstance(x, (int, float, np.number)):
+            return float(x)
+        return pd.Timestamp(x).value / 1e6
+
+    def _bin_heatmap(self, plot_title, start=None, end=None):
+        """
+            Bin the returns of the heatmap ``plot_title`` to the pixels of
+            its plot between ``start`` and ``end`` (default: its x range)
+            and update its image.
+        """
+        heatmap = self.heatmaps[plot_title]
+        p = heatmap['plot']
+        start = self._to_milliseconds(p.x_range.start if start is None
+                                      else start)
+        end = self._to_milliseconds(p.x_range.end if end is None else end)
+        x = heatmap['x']
+        # not more bins than dates in the window.
+        n_dates = (np.searchsorted(x, end, side='right') -
+                   np.searchsorted(x, start, side='left'))
+        n_bins = max(min(heatmap['pixels'], n_dates), 1)
+        if heatmap.get('windows') is not None:
+            # sliced from the window prefetched while panning, if any.
+            first, binned = heatmap['windows'].get(start, end, n_bins)
+            dw = len(binned) * (end - start) / float(n_bins)
+        else:
+            first, dw = start, end - start
+            binned = bin_rows(x, heatmap['returns'], start, end, n_bins)
+        # first series at the top.
+        image = np.ascontiguousarray(binned.T[::-1])
+        heatmap['source'].data = {'image': [image], 'x': [first],
+                                  'y': [0], 'dw': [dw],
+                                  'dh': [image.shape[0]]}
+        return heatmap['source']
+
+    def _set_heatmap_data(self, plot_title, data, names):
+        """ Compute the returns of the heatmap ``plot_title``. """
+        heatmap = self.heatmaps[plot_title]
+        index, returns = returns_matrix(data)
+        heatmap.update(x=self._to_milliseconds(index), returns=returns,
+                       names=list(names))
+        if heatmap.get('windows') is not None:
+            heatmap['windows'].clear(data=(heatmap['x'], returns))
+        p = heatmap['plot']
+        n = len(names)
+        p.y_range.update(start=0, end=n)
+        p.yaxis.ticker = FixedTicker(ticks=[i + 0.5 for i in range(n)])
+        p.yaxis.major_label_overrides = {i + 0.5: name for i, name in
+                                         enumerate(reversed(names))}
+        finite = np.abs(returns[np.isfinite(returns)])
+        limit = np.percentile(finite, 99) if len(finite) else 1.
+        heatmap['color_mapper'].update(low=-limit, high=limit)
+        return heatmap
+
+    def _plot_heatmap(self, data=None, names=None, title=None, params={},
+                      height=None, **kwargs_to_bokeh):
+        """
+            Plot the returns (%) of the series in ``data`` as a heatmap
+            (dates x series) with a single image glyph.
+
+            The returns are averaged in bins of the width of a pixel in the
+            server, so the image does not grow with the number of dates. In
+            a Bokeh server, the image is binned again when the x range
+            changes (i.e. on zoom). While panning, the next window in the
+            direction of the pan is binned in a background thread (see
+            :class:`windowing.WindowCache` and ``heatmap_prefetch``).
+        """
+        from bokeh.palettes import RdYlGn11
+        p, params, kwargs_to_bokeh = self._create_figure(
+            [], {}, params, dict(kwargs_to_bokeh, title=title), height)
+        p.y_range = Range1d(0, 1)
+        p.yaxis.axis_label = None
+        p.grid.visible = False
+        color_mapper = LinearColorMapper(palette=list(reversed(RdYlGn11)),
+                                         low=-1, high=1, nan_color='white')
+        source = ColumnDataSource()
+        self.heatmaps[title] = {'plot': p, 'source': source,
+                                'color_mapper': color_mapper,
+                                'pixels': p.plot_width or self.width}
+        if self.heatmap_prefetch:
+            # binned from the snapshot (x, returns) of the request.
+            self.heatmaps[title]['windows'] = WindowCache(
+                lambda data, start, end, n_bins: bin_rows(
+                    data[0], data[1], start, end, n_bins))
+        self._set_heatmap_data(title, data, names)
+        self._bin_heatmap(title)
+        p.image(image='image', x='x', y='y', dw='dw', dh='dh',
+                source=source, color_mapper=color_mapper, name=title)
+        p.add_layout(ColorBar(color_mapper=color_mapper, title='Return %'),
+                     'right')
+        p.add_tools(HoverTool(tooltips=[('date', '$x{%F}'),
+                                        ('return %', '@image{0.00}')],
+                              formatters=self.formatters))
+        p.on_event(RangesUpdate,
+                   lambda event: self._bin_heatmap(title, event.x0,
+                                                   event.x1))
+        self.datasources.append(source)
+        track_sources([source])
+        return p
+
+    def _pick(self, plot_title, names):
+        """
+            Plot only the series ``names`` of the picker panel
+            ``plot_title``: its source is replaced with their data.
+        """
+        picker = self.pickers[plot_title]
+        names = [name for name in names if name in picker['data']]
+        colors = get_colors(20)
+        data = {'xs': [], 'ys': [], 'name': [], 'color': []}
+        for i, name in enumerate(names):
+            stock = picker['data'][name]
+            data['xs'].append(np.asarray(stock.index))
+            data['ys'].append(np.asarray(stock))
+            data['name'].append(name)
+            data['color'].append(colors[i % len(colors)])
+        picker['source'].data = data
+        return picker['source']
+
+    def _set_picker_data(self, plot_title, data, names):
+        """
+            Series that can be picked in the picker panel ``plot_title``.
+
+            Returns whether the chosen series changed (removed series):
+            then the widget's value is changed, which calls :meth:`_pick`
+            once the panel is plotted.
+        """
+        picker = self.pickers[plot_title]
+        picker['data'] = dict(zip(names, data))
+        picker['widget'].options = list(names)
+        value = [name for name in picker['widget'].value if name in names]
+        if value != picker['widget'].value:
+            picker['widget'].value = value
+            return True
+        return False
+
+    def _plot_picker(self, data=None, names=None, title=None, selected=(),
+                     params={}, height=None, **kwargs_to_bokeh):
+        """
+            Plot the series in ``data`` chosen in a MultiChoice widget
+            (with search), all with a single multi_line glyph.
+
+            Only the chosen series are in the source of the glyph (and in
+            the legend), so choosing 5 out of 2000 series only sends and
+            draws those 5. The series are chosen in a Bokeh server; in a
+            standalone document only the ``selected`` series are plotted.
+        """
+        p, params, kwargs_to_bokeh = self._create_figure(
+            [], {}, params, dict(kwargs_to_bokeh, title=title), height)
+        # fits the chosen series.
+        p.y_range = DataRange1d()
+        selected = [name for name in selected if name in names]
+        widget = MultiChoice(title=title, options=list(names),
+                             value=selected or list(names[:5]),
+                             sizing_mode='stretch_width')
+        source = ColumnDataSource()
+        self.pickers[title] = {'widget': widget, 'source': source}
+        self._set_picker_data(title, data, names)
+        self._pick(title, widget.value)
+        line_params = {k: v for k, v in list(kwargs_to_bokeh.items())
+                       if k in ('line_width', 'line_alpha', 'alpha')}
+        renderer = p.multi_line(xs='xs', ys='ys', line_color='color',
+                                legend_field='name', source=source,
+                                name=title, **line_params)
+        p.legend.location = "top_left"
+        p.add_tools(HoverTool(renderers=[renderer],
+                              tooltips=[('name', '@name')] + self.tooltips,
+                              formatters=self.formatters))
+        widget.on_change('value',
+                         lambda attr, old, new: self._pick(title, new))
+        self.datasources.append(source)
+        track_sources([source])
+        return p
+
+    # Value of each point relative to the first finite value of its series
+    # at or after the start of the visible x range.
+    _VIEW_TRANSFORM = """
+        const view = selector.active
+        if (view == 0)
+            return xs
+        const x = source.data['x']
+        let lo = 0
+        let hi = x.length
+        while (lo < hi) {
+            const mid = (lo + hi) >> 1
+            if (x[mid] < x_range.start)
+                lo = mid + 1
+            else
+                hi = mid
+        }
+        let base = NaN
+        for (let i = lo; i < xs.length; i++) {
+            if (isFinite(xs[i]) && xs[i] != 0) {
+                base = xs[i]
+                break
+            }
+        }
+        const offset = (view == 2) ? 100 : 0
+        const ys = new Float64Array(xs.length)
+        for (let i = 0; i < xs.length; i++)
+            ys[i] = 100 * xs[i] / base - offset
+        return ys
+    """
+
+    # Recomputes the transforms and fits the y ranges to the visible data.
+    _VIEW_CALLBACK = """
+        const view = selector.active
+        for (const source of sources)
+            source.change.emit()
+        for (const [axis, label] of axes)
+            axis.axis_label = (view == 0) ? label : labels[view]
+        for (const [range, start, end, renderers] of y_ranges) {
+            if (view == 0) {
+                range.setv({start: start, end: end})
+                continue
+            }
+            let lo = Infinity
+            let hi = -Infinity
+            for (const r of renderers) {
+                const x = r.data_source.data['x']
+                const y = r.glyph.y.transform.v_compute(
+                    r.data_source.data[r.glyph.y.field])
+                for (let i = 0; i < x.length; i++) {
+                    if (x[i] >= x_range.start && x[i] <= x_range.end &&
+                            isFinite(y[i])) {
+                        lo = Math.min(lo, y[i])
+                        hi = Math.max(hi, y[i])
+                    }
+                }
+            }
+            if (lo < hi)
+                range.setv({start: lo, end: hi})
+        }
+    """
+
+    def _add_views(self, plots, selector=None):
+        """
+            Add the views in ``self.views`` to the lines in ``plots``: the
+            price, the price rebased to 100 and the return (%), both
+            relative to the start of the visible x range.
+
+            The views are computed in the browser with a CustomJSTransform
+            per source, so changing the view or panning the x range does
+            not need the server nor sends data.
+
+            If ``selector`` is given, the views are only added to the new
+            lines (i.e. after :meth:`update_dashboard`).
+
+            Returns
+            -------
+            selector: bokeh.models.RadioButtonGroup
+                Widget to choose the view.
+        """
+        if selector is None:
+            selector = RadioButtonGroup(labels=self.views, active=0)
+        transforms = {}
+        sources = {}
+        axes = []
+        y_ranges = []
+        x_ranges = {}
+        for p in plots:
+            x_ranges[p.x_range.id] = p.x_range
+            axes.extend([[axis, axis.axis_label] for axis in
+                         p.left + p.right if isinstance(axis, Axis)])
+            renderers = {}
+            glyph_renderers = [r for r in p.renderers
+                               if isinstance(r, GlyphRenderer)]
+            for r in glyph_renderers:
+                if isinstance(r.glyph.y, dict) and 'transform' in r.glyph.y:
+                    transforms[r.data_source.id] = r.glyph.y['transform']
+            for r in glyph_renderers:
+                source = r.data_source
+                sources[source.id] = source
+                if source.id not in transforms:
+                    transforms[source.id] = CustomJSTransform(
+                        args=dict(source=source, x_range=p.x_range,
+                                  selector=selector),
+                        v_func=self._VIEW_TRANSFORM)
+                if not (isinstance(r.glyph.y, dict) and
+                        'transform' in r.glyph.y):
+                    spec = transform(r.glyph.y, transforms[source.id])
+                    for glyph in (r.glyph, r.selection_glyph,
+                                  r.nonselection_glyph, r.hover_glyph,
+                                  r.muted_glyph):
+                        if glyph is not None and glyph != 'auto':
+                            glyph.y = spec
+                renderers.setdefault(r.y_range_name, []).append(r)
+            for range_name, _renderers in list(renderers.items()):
+                y_range = (p.y_range if range_name == 'default'
+                           else p.extra_y_ranges[range_name])
+                if isinstance(y_range, Range1d):
+                    y_ranges.append([y_range, y_range.start, y_range.end,
+                                     _renderers])
+        args = dict(sources=list(sources.values()), axes=axes,
+                    y_ranges=y_ranges, labels=self.views_axis_labels)
+        for x_range in list(x_ranges.values()):
+            callbacks = [c for c in selector.js_property_callbacks.get(
+                'change:active', []) if c.args['x_range'] is x_range]
+            if callbacks:
+                callbacks[0].args = dict(callbacks[0].args, **args)
+                continue
+            callback = CustomJS(args=dict(args, selector=selector,
+                                          x_range=x_range),
+                                code=self._VIEW_CALLBACK)
+            x_range.js_on_change('start', callback)
+            x_range.js_on_change('end', callback)
+            selector.js_on_change('active', callback)
+        return selector
+
     def build_dashboard(self,
                         input_data={},
                         aligment={},
@@ -405,14 +897,33 @@ class StocksDashboard():
                         show=True,
                         column='adj_close',
                         height=[],
+                        align=True,
+                        dtypes=None,
+                        memory_budget=None,
+                        n_jobs=1,
+                        views=False,
+                        panel_type='lines',
+                        quantiles=QUANTILES,
+                        highlight=(),
                         **kwargs_to_bokeh):
         plots = []
-        _data, x_range, _names = Formatter().format_input_data(input_data,
-                                                               column)
-        _params = Formatter().format_params(_data, params, _names)
-        _aligment = Formatter().format_aligment(aligment, _names)
-        _y_label_right = Formatter().format_y_label_right(ylabel_right,
-                                                          ylabel, _names)
+        self.datasources = []
+        # a new layout: not shown in the notebook yet.
+        self.notebook_handle = None
+        formatter = Formatter(align=align, dtypes=dtypes, n_jobs=n_jobs)
+        _data, x_range, _names = formatter.format_input_data(input_data,
+                                                             column)
+        # Bytes used by the formatted data, per panel and series.
+        self.memory_report = formatter.memory_report(_data)
+        if memory_budget and self.memory_report['nbytes'] > memory_budget:
+            raise(ValueError("Formatted data uses %s bytes, " %
+                             self.memory_report['nbytes'] +
+                             "exceeding 'memory_budget' of %s bytes." %
+                             memory_budget))
+        _params = formatter.format_params(_data, params, _names)
+        _aligment = formatter.format_aligment(aligment, _names)
+        _y_label_right = formatter.format_y_label_right(ylabel_right,
+                                                        ylabel, _names)
         kwargs_to_bokeh['y_axis_label'] = ylabel
         if 'x_range' not in kwargs_to_bokeh:
             kwargs_to_bokeh['x_range'] = Range1d(x_range[0], x_range[-1])
@@ -426,8 +937,52 @@ class StocksDashboard():
             assert sum(height) == 1, (
                 "All heights should sum up to 1, " +
                 "found: %s, sum(height)=%s" % (height, sum(height)))
+        _panel_type = self._format_panel_type(panel_type, _data)
+        # Returns of the heatmap panels, binned again on zoom.
+        for heatmap in list(getattr(self, 'heatmaps', {}).values()):
+            if heatmap.get('windows') is not None:
+                heatmap['windows'].close()
+        self.heatmaps = {}
+        # Widgets and series of the picker panels.
+        self.pickers = {}
         for i, (plot_title, data) in enumerate(_data.items()):
-            plots.append(self._plot_stock(
+            if _panel_type[plot_title] == 'picker':
+                p = self._plot_picker(
+                    data=data,
+                    names=_names[plot_title],
+                    title=plot_title,
+                    selected=highlight,
+                    params=_params[plot_title],
+                    height=height[i],
+                    **kwargs_to_bokeh)
+                p.name = plot_title
+                plots.append(p)
+                continue
+            if _panel_type[plot_title] == 'heatmap':
+                p = self._plot_heatmap(
+                    data=data,
+                    names=_names[plot_title],
+                    title=plot_title,
+                    params=_params[plot_title],
+                    height=height[i],
+                    **kwargs_to_bokeh)
+                p.name = plot_title
+                plots.append(p)
+                continue
+            if _panel_type[plot_title] == 'quantiles':
+                p = self._plot_quantiles(
+                    data=data,
+                    names=_names[plot_title],
+                    quantiles=quantiles,
+                    highlight=highlight,
+                    title=plot_title,
+                    params=_params[plot_title],
+                    height=height[i],
+                    **kwargs_to_bokeh)
+                p.name = plot_title
+                plots.append(p)
+                continue
+            p = self._plot_stock(
                 data=data,
                 names=_names[plot_title],
                 title=plot_title,
@@ -435,13 +990,350 @@ class StocksDashboard():
                 aligment=_aligment[plot_title],
                 ylabel_right=_y_label_right[plot_title],
                 height=height[i],
-                ** kwargs_to_bokeh))
+                align=align,
+                ** kwargs_to_bokeh)
+            # used to find the plot in the layout on updates.
+            p.name = plot_title
+            plots.append(p)
+        # Settings reused by :meth:`update_dashboard`.
+        self.formatter_params = {'align': align, 'dtypes': dtypes,
+                                 'n_jobs': n_jobs}
+        self.column = column
+        self.aligment = _aligment
+        self.panel_type = _panel_type
+        self.quantiles = sorted(quantiles)
+        self.highlight = list(highlight)
 
         layout = gridplot(plots,
                           plot_width=self.width,
                           ncols=self.ncols)
+        widgets = [self.pickers[p.name]['widget'] for p in plots
+                   if p.name in self.pickers]
+        if views:
+            # Selector of the views computed in the browser.
+            self.view_selector = self._add_views(
+                [p for p in plots if _panel_type[p.name] == 'lines'])
+            widgets.insert(0, self.view_selector)
+        if widgets:
+            layout = column_layout(*(widgets + [layout]),
+                                   sizing_mode=layout.sizing_mode)
         self.layout = layout
-        if show:
+        if show == 'notebook':
+            curdoc().title = title
+            self.show_notebook()
+        elif show:
             curdoc().add_root(layout)
             curdoc().title = title
+            instrument_document(curdoc())
         return curdoc
+
+    def show_notebook(self, notebook_handle=True):
+        """
+            Show the dashboard built with :meth:`build_dashboard` in the
+            output of a Jupyter notebook cell (as ``show='notebook'``).
+
+            The dashboard is shown once: with a ``notebook_handle``, the
+            changes made later by :meth:`update_dashboard` (and by the
+            widgets and refreshers of the dashboard) are sent to the cell
+            as the same patches and streams of the sources as in a Bokeh
+            server, with :meth:`push_notebook`.
+
+            Returns the handle of the cell, also in ``self.notebook_handle``.
+        """
+        from bokeh.io import output_notebook
+        from bokeh.io import show
+        from bokeh.io.state import curstate
+        if getattr(self, 'layout', None) is None:
+            raise(ValueError("The dashboard should be built with " +
+                             "'build_dashboard' before showing it."))
+        if not curstate().notebook:
+            output_notebook(hide_banner=True)
+        self.notebook_handle = show(self.layout,
+                                    notebook_handle=notebook_handle)
+        instrument_document(curdoc())
+        return self.notebook_handle
+
+    def push_notebook(self):
+        """
+            Send the changes of the dashboard since the last push to the
+            notebook cell where it was shown with :meth:`show_notebook`.
+            Nothing is sent if it was not shown with a handle.
+        """
+        if self.notebook_handle is None:
+            return
+        from bokeh.io import push_notebook
+        push_notebook(handle=self.notebook_handle)
+
+    def _format_panel_type(self, panel_type, data):
+        """
+            Type of each panel of ``data``:
+
+            - 'lines': a line per series.
+            - 'quantiles': bands of the percentiles ``quantiles`` of all
+              the series at each date, and lines for the series in
+              ``highlight``. For panels with many series.
+            - 'heatmap': image of the returns of the series (dates x
+              series), binned to the pixels of the plot.
+            - 'picker': lines of the series chosen in a searchable widget
+              (initially those in ``highlight``, or the first 5).
+
+            Params
+            ------
+            panel_type: str or dict
+                Type of all the panels, or of each panel by plot title
+                (default 'lines').
+        """
+        if isinstance(panel_type, str):
+            panel_type = {plot_title: panel_type for plot_title in data}
+        result = {plot_title: panel_type.get(plot_title, 'lines')
+                  for plot_title in data}
+        for plot_title, _type in list(result.items()):
+            if _type not in self.panel_types:
+                raise(ValueError("Invalid panel type '%s' " % _type +
+                                 "for '%s'. " % plot_title +
+                                 "Valid types: %s" % list(self.panel_types)))
+        return result
+
+    @staticmethod
+    def _changed(old, new):
+        """
+            Boolean mask with the positions where the arrays ``old`` and
+            ``new`` (of the same length) differ. NaN equals NaN.
+        """
+        old = np.asarray(old)
+        new = np.asarray(new)
+        changed = np.asarray(old != new)
+        if changed.any() and old.dtype.kind in 'fcmM':
+            changed &= ~(pd.isnull(old) & pd.isnull(new))
+        return changed
+
+    def _patch_source(self, source, new_data):
+        """
+            Update ``source`` with ``new_data`` sending the minimum changes.
+
+            - If 'x' did not change, only the changed columns are sent: as
+              patches of the changed slice when possible or as new columns.
+            - If the new data extends the current one, the new rows are
+              streamed (after patching any changed row).
+            - Otherwise the data is replaced.
+
+            Columns are only patched in place if the source owns their
+            buffers, so the input data of the dashboard is never modified.
+        """
+        old = source.data
+        x_old, x_new = old.get('x', []), new_data['x']
+        n = len(x_old)
+        same_columns = set(old.keys()) == set(new_data.keys())
+        if not n or len(x_new) < n or self._changed(
+                x_old, np.asarray(x_new)[:n]).any():
+            source.data = {k: np.array(v) for k, v in new_data.items()}
+            return source
+        if len(x_new) > n and not same_columns:
+            source.data = {k: np.array(v) for k, v in new_data.items()}
+            return source
+
+        columns = {}
+        patches = {}
+        for name, values in list(new_data.items()):
+            values = np.asarray(values)
+            if name not in old:
+                columns[name] = np.array(values)
+                continue
+            changed = np.flatnonzero(self._changed(old[name], values[:n]))
+            if not len(changed):
+                continue
+            column = old[name]
+            if (isinstance(column, np.ndarray) and column.flags.owndata and
+                    column.flags.writeable and column.dtype == values.dtype):
+                ind = slice(int(changed[0]), int(changed[-1]) + 1)
+                patches[name] = [(ind, values[ind])]
+            else:
+                columns[name] = np.array(values)
+                if len(x_new) > n:
+                    # cannot stream into a replaced column.
+                    source.data = {k: np.array(v)
+                                   for k, v in new_data.items()}
+                    return source
+
+        if not same_columns:
+            # columns removed or added, change the data at once.
+            data = {k: columns[k] if k in columns else old[k]
+                    for k in new_data}
+            source.data = data
+        elif columns:
+            source.data.update(columns)
+        if patches:
+            source.patch(patches)
+        if len(x_new) > n:
+            source.stream({k: np.asarray(v)[n:]
+                           for k, v in list(new_data.items())})
+        return source
+
+    @staticmethod
+    def _update_glyph(renderer, params):
+        """
+            Update the properties of the line glyph of ``renderer`` that
+            differ from ``params``.
+        """
+        glyph_props = {}
+        renderer_props = {}
+        for k, v in list(params.items()):
+            if k in ('legend', 'name'):
+                continue
+            if k in ('color', 'alpha'):
+                k = 'line_' + k
+            if k in renderer.glyph.properties():
+                if getattr(renderer.glyph, k) != v:
+                    glyph_props[k] = v
+            elif k in renderer.properties():
+                if getattr(renderer, k) != v:
+                    renderer_props[k] = v
+        if glyph_props:
+            renderer.glyph.update(**glyph_props)
+        if renderer_props:
+            renderer.update(**renderer_props)
+        return renderer
+
+    @staticmethod
+    def _remove_renderer(p, renderer):
+        """
+            Remove ``renderer`` from the figure ``p``, its legend and its
+            hover tools.
+        """
+        p.renderers = [r for r in p.renderers if r is not renderer]
+        for legend in p.legend:
+            legend.items = [item for item in legend.items
+                            if renderer not in item.renderers]
+        for hover in p.select({'type': HoverTool}):
+            if isinstance(hover.renderers, list):
+                hover.renderers = [r for r in hover.renderers
+                                   if r is not renderer]
+
+    def _update_plot(self, p, data, names, params={}, aligment={},
+                     align=True, **kwargs_to_bokeh):
+        """
+            Update the figure ``p`` to plot ``data``: patches the sources
+            with changed data, updates the properties of the lines whose
+            style changed and adds or removes the lines of added or
+            removed names.
+        """
+        (params, kwargs_to_bokeh, _, _) = self.separate_Figure_and_Line_params(
+            params, kwargs_to_bokeh)
+        colors = get_colors(len(data))
+        params = self._update_params(params=params, kwargs=kwargs_to_bokeh,
+                                     names=names, aligment=aligment)
+        # Not p.select(), which also finds the renderers of other plots
+        # referenced by callbacks (i.e. the views).
+        renderers = {r.name: r for r in p.renderers
+                     if isinstance(r, GlyphRenderer)}
+        for name in list(renderers.keys()):
+            if name not in names:
+                self._remove_renderer(p, renderers.pop(name))
+
+        sources = {}
+        new_data = {}
+        sources_of = {}
+        for i, stock in enumerate(data):
+            if names[i] in renderers:
+                source = renderers[names[i]].data_source
+            elif align and sources:
+                source = list(sources.values())[0]
+            elif align and renderers:
+                source = list(renderers.values())[0].data_source
+            else:
+                source = ColumnDataSource()
+            sources[source.id] = source
+            sources_of[names[i]] = source
+            new_data.setdefault(source.id, {'x': np.asarray(stock.index)})
+            new_data[source.id][names[i]] = np.asarray(stock)
+        for source_id, source in list(sources.items()):
+            self._patch_source(source, new_data[source_id])
+
+        hover = p.select_one({'type': HoverTool})
+        for i, name in enumerate(names):
+            _params = self._get_params(params, name, colors[i])
+            if name in renderers:
+                self._update_glyph(renderers[name], _params)
+            else:
+                renderer = p.line(x='x', y=name, source=sources_of[name],
+                                  name=name, **_params)
+                if hover is not None and isinstance(hover.renderers, list):
+                    hover.renderers = hover.renderers + [renderer]
+        return p
+
+    def update_dashboard(self, input_data={}, params={}, **kwargs_to_bokeh):
+        """
+            Update the dashboard built with :meth:`build_dashboard` with
+            new data and parameters, without recreating it.
+
+            The new data is compared against the current ``self.layout``:
+
+            - sources whose data changed are patched (or streamed, if the
+              new data only appends rows),
+            - the properties of lines whose style changed are updated,
+            - lines are added or removed only for added or removed names.
+
+            The input arguments are the same as in :meth:`build_dashboard`.
+            The panels (plot titles) must be the same as when built.
+        """
+        if getattr(self, 'layout', None) is None:
+            raise(ValueError("The dashboard should be built with " +
+                             "'build_dashboard' before updating it."))
+        formatter = Formatter(**self.formatter_params)
+        _data, x_range, _names = formatter.format_input_data(input_data,
+                                                             self.column)
+        self.memory_report = formatter.memory_report(_data)
+        _params = formatter.format_params(_data, params, _names)
+        _aligment = formatter.format_aligment(
+            {k: dict(v) for k, v in list(self.aligment.items())}, _names)
+        plots = {p.name: p for p in self.layout.select({'type': Plot})}
+        if set(plots.keys()) != set(_data.keys()):
+            raise(ValueError("Panels cannot be added or removed on " +
+                             "update. Expected: %s, " % list(plots.keys()) +
+                             "found: %s." % list(_data.keys())))
+
+        if 'x_range' not in kwargs_to_bokeh:
+            for p in list(plots.values()):
+                if (isinstance(p.x_range, Range1d) and
+                        (p.x_range.start, p.x_range.end) !=
+                        (x_range[0], x_range[-1])):
+                    p.x_range.update(start=x_range[0], end=x_range[-1])
+        panel_type = getattr(self, 'panel_type', {})
+        for plot_title, data in list(_data.items()):
+            if panel_type.get(plot_title) == 'quantiles':
+                source = [r for r in plots[plot_title].renderers
+                          if isinstance(r, GlyphRenderer)][0].data_source
+                self._patch_source(source, self._quantile_data(
+                    data, _names[plot_title], self.quantiles,
+                    [r.name for r in plots[plot_title].renderers
+                     if r.name in self.highlight]))
+                continue
+            if panel_type.get(plot_title) == 'picker':
+                # picked by the change of the widget's value, if any.
+                if not self._set_picker_data(plot_title, data,
+                                             _names[plot_title]):
+                    self._pick(plot_title,
+                               self.pickers[plot_title]['widget'].value)
+                continue
+            if panel_type.get(plot_title) == 'heatmap':
+                self._set_heatmap_data(plot_title, data, _names[plot_title])
+                self._bin_heatmap(plot_title)
+                continue
+            self._update_plot(plots[plot_title], data, _names[plot_title],
+                              params=_params[plot_title],
+                              aligment=_aligment[plot_title],
+                              align=self.formatter_params['align'],
+                              **kwargs_to_bokeh)
+
+        if self.view_selector is not None:
+            self._add_views([p for p in list(plots.values())
+                             if panel_type.get(p.name, 'lines') == 'lines'],
+                            self.view_selector)
+
+        # keep only the sources that are still plotted.
+        sources = {}
+        for r in self.layout.select({'type': GlyphRenderer}):
+            sources[r.data_source.id] = r.data_source
+        self.datasources = list(sources.values())
+        self.push_notebook()
+        return self.layout
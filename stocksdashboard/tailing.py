@@ -0,0 +1,228 @@
+#!/usr/bin/env python3
+# Authors: Mabel Villalba Jimenez <mabelvj@gmail.com>,
+#          Emilio Molina Martinez <emilio.mol.mar@gmail.com>
+# License: GPLv3
+
+"""
+    Incremental refresh of a dashboard from CSV files to which rows are
+    appended (i.e. by an end-of-day job), without reading them again:
+
+        >>> files = {'stocks': {'AAPL': 'aapl.csv', 'GOOG': 'goog.csv'}}
+        >>> refresher = FileRefresher(files)
+        >>> sdb = StocksDashboard()
+        >>> sdb.build_dashboard(input_data=refresher.read(), show=True)
+        >>> refresher.start(sdb, curdoc(), period_milliseconds=60000)
+"""
+
+import io
+import os
+import warnings
+
+import numpy as np
+import pandas as pd
+
+
+class CsvTail():
+
+    """
+        Read the rows appended to a CSV file since the last read.
+
+        The file is polled with its modification time and size. Only the
+        appended bytes are read, up to the last complete line. If the file
+        is truncated or replaced by a smaller one, it is read again from the
+        start.
+
+        Params
+        ------
+        path: str
+            CSV file with a header.
+        date_column: str, default 'date'
+            Column with the dates of the rows.
+        column: str, default 'adj_close'
+            Column with the values.
+    """
+
+    def __init__(self, path, date_column='date', column='adj_close'):
+        self.path = path
+        self.date_column = date_column
+        self.column = column
+        self.offset = 0
+        self.header = None
+        self._stat = None
+
+    def changed(self):
+        """ Whether the file was modified since the last read. """
+        try:
+            stat = os.stat(self.path)
+        except OSError:
+            return False
+        return (stat.st_mtime, stat.st_size) != self._stat
+
+    def read(self):
+        """
+            Rows appended since the last read (all the rows on the first
+            read), as a pd.Series of the values indexed by date.
+        """
+        stat = os.stat(self.path)
+        if stat.st_size < self.offset:
+            # truncated or replaced: read it again.
+            self.offset = 0
+            self.header = None
+        with open(self.path, 'rb') as f:
+            f.seek(self.offset)
+            data = f.read(stat.st_size - self.offset)
+        self._stat = (stat.st_mtime, stat.st_size)
+        # only complete lines, the rest is read when completed.
+        end = data.rfind(b'\n') + 1
+        data = data[:end]
+        self.offset += end
+        if self.header is None:
+            newline = data.find(b'\n') + 1
+            self.header, data = data[:newline], data[newline:]
+        if not data.strip():
+            return pd.Series([], dtype=float,
+                             index=pd.DatetimeIndex([], name=self.date_column),
+                             name=self.column)
+        frame = pd.read_csv(io.BytesIO(self.header + data),
+                            usecols=[self.date_column, self.column],
+                            parse_dates=[self.date_column],
+                            index_col=self.date_column)
+        values = frame[self.column].astype(float)
+        return values[~values.index.duplicated(keep='last')]
+
+
+class FileRefresher():
+
+    """
+        Append the rows added to CSV files to the sources of a dashboard.
+
+        Params
+        ------
+        files: dict
+            Path of the CSV file of each series, by panel (plot title) and
+            name, i.e.: {'stocks': {'AAPL': 'aapl.csv'}}.
+        date_column, column: str
+            See :class:`CsvTail`.
+    """
+
+    def __init__(self, files, date_column='date', column='adj_close'):
+        self.tails = {plot_title: {name: CsvTail(path, date_column, column)
+                                   for name, path in list(paths.items())}
+                      for plot_title, paths in list(files.items())}
+        self.sdb = None
+
+    def read(self):
+        """
+            Read all the files (the first time) or the new rows, as the
+            ``input_data`` of :meth:`StocksDashboard.build_dashboard`.
+        """
+        return {plot_title: {name: tail.read()
+                             for name, tail in list(tails.items())}
+                for plot_title, tails in list(self.tails.items())}
+
+    def start(self, sdb, doc, period_milliseconds=1000):
+        """
+            Poll the files every ``period_milliseconds`` with a periodic
+            callback of the Bokeh document ``doc``, appending their new rows
+            to the sources of ``sdb``.
+        """
+        self.sdb = sdb
+        return doc.add_periodic_callback(self.poll, period_milliseconds)
+
+    def poll(self, sdb=None):
+        """
+            Read the new rows of the modified files and add them to the
+            sources of ``sdb``: streamed if they are after the last date of
+            the source, patched if the date is already in it.
+
+            Returns the number of rows read.
+        """
+        from bokeh.models import GlyphRenderer, Plot
+        sdb = self.sdb if sdb is None else sdb
+        # by panel: the same name can be in several panels.
+        new_rows = {}
+        for plot_title, tails in list(self.tails.items()):
+            for name, tail in list(tails.items()):
+                if tail.changed():
+                    rows = tail.read()
+                    if len(rows):
+                        new_rows.setdefault(plot_title, {})[name] = rows
+        if not new_rows:
+            return 0
+        plots = {p.name: p for p in sdb.layout.select({'type': Plot})}
+        for plot_title, rows in list(new_rows.items()):
+            if plot_title not in plots:
+                continue
+            # Not p.select(), which also finds the renderers of other
+            # plots referenced by callbacks.
+            sources = {}
+            for r in plots[plot_title].renderers:
+                source = r.data_source if isinstance(r, GlyphRenderer) \
+                    else None
+                if source is None or 'x' not in source.data:
+                    continue
+                names = [name for name in rows if name in source.data]
+                if names:
+                    sources[source.id] = (source, names)
+            for source, names in list(sources.values()):
+                self._add_rows(sdb, source, {name: rows[name]
+                                             for name in names})
+        sdb.push_notebook()
+        return sum([len(s) for rows in list(new_rows.values())
+                    for s in list(rows.values())])
+
+    @staticmethod
+    def _extend_x_range(sdb, last, new_last):
+        """ Keep the x ranges that showed the last date at the last date. """
+        from .stocksdashboard import StocksDashboard
+        from bokeh.models import Plot, Range1d
+        last = StocksDashboard._to_milliseconds(last)
+        for p in sdb.layout.select({'type': Plot}):
+            if (isinstance(p.x_range, Range1d) and
+                    StocksDashboard._to_milliseconds(p.x_range.end) >= last):
+                p.x_range.end = new_last
+
+    def _add_rows(self, sdb, source, rows):
+        x = pd.DatetimeIndex(source.data['x'])
+        last = x[-1] if len(x) else None
+        dates = pd.DatetimeIndex(sorted(set().union(
+            *[s.index for s in list(rows.values())])))
+        new_dates = dates[dates > last] if last is not None else dates
+
+        patches = {}
+        for name, values in list(rows.items()):
+            old = values[values.index <= last] if last is not None else \
+                values.iloc[:0]
+            if not len(old):
+                continue
+            positions = x.get_indexer(old.index)
+            if (positions < 0).any():
+                warnings.warn("Rows of '%s' with dates not in the " % name +
+                              "dashboard are ignored: %s" %
+                              list(old.index[positions < 0]))
+            column = source.data[name]
+            if not (isinstance(column, np.ndarray) and
+                    column.flags.owndata and column.flags.writeable):
+                # do not modify the input data of the dashboard.
+                source.data[name] = np.array(column)
+            dtype = source.data[name].dtype
+            patches[name] = [(int(i), dtype.type(v)) for i, v in
+                             zip(positions, old.values) if i >= 0]
+        if patches:
+            source.patch(patches)
+
+        if len(new_dates):
+            new_data = {'x': np.asarray(new_dates)}
+            for name in source.data:
+                if name == 'x':
+                    continue
+                dtype = np.asarray(source.data[name]).dtype
+                if name in rows:
+                    values = rows[name].reindex(new_dates).values
+                else:
+                    values = np.full(len(new_dates), np.nan)
+                new_data[name] = values.astype(dtype)
+            source.stream(new_data)
+            if last is not None:
+                self._extend_x_range(sdb, last, new_dates[-1])
+        return source
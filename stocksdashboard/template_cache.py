@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+# Authors: Mabel Villalba Jimenez <mabelvj@gmail.com>,
+#          Emilio Molina Martinez <emilio.mol.mar@gmail.com>
+# License: GPLv3
+
+import numpy as np
+
+from bokeh.document import Document
+from bokeh.models import ColumnDataSource
+
+from .stocksdashboard import StocksDashboard
+from .metrics import instrument_document
+
+
+class DocumentTemplate():
+
+    """
+        Template of a dashboard document for the sessions of a Bokeh
+        server.
+
+        The data is formatted and the dashboard is built only once. New
+        session documents are created from the serialized models of the
+        template, without data, and their sources are filled with the
+        arrays of the template, which are shared (read-only) by all the
+        sessions.
+
+        Parameters
+        ----------
+        dashboard: StocksDashboard, default None
+            Dashboard used to build the template. Its sources are emptied,
+            so it should not be used afterwards. If None, a
+            StocksDashboard with the default settings is used.
+        **build_params:
+            Parameters passed to :meth:`StocksDashboard.build_dashboard`.
+
+        Examples
+        --------
+
+        In app_hooks.py of a Bokeh application directory:
+            >>> def on_server_loaded(server_context):
+            ...     DocumentTemplate(input_data=data).register(server_context)
+        In main.py:
+            >>> template = DocumentTemplate.from_context(curdoc())
+            >>> template.new_document(curdoc())
+    """
+
+    context_attribute = 'stocksdashboard_template'
+
+    def __init__(self, dashboard=None, **build_params):
+        if dashboard is None:
+            dashboard = StocksDashboard()
+        build_params['show'] = False
+        dashboard.build_dashboard(**build_params)
+        self.title = build_params.get('title', "Stock Closing Prices")
+
+        document = Document()
+        document.add_root(dashboard.layout)
+        self.data = {}
+        for source in document.select({'type': ColumnDataSource}):
+            self.data[source.id] = {k: self._read_only(v)
+                                    for k, v in list(source.data.items())}
+            # serialize the models without data.
+            source.data = {k: v[:0] for k, v in
+                           list(self.data[source.id].items())}
+        self.json = document.to_json()
+
+    @staticmethod
+    def _read_only(values):
+        values = np.asarray(values).view()
+        values.setflags(write=False)
+        return values
+
+    def new_document(self, doc=None):
+        """
+            Create the models of the dashboard in ``doc`` (a new Document
+            if None) and fill its sources with the shared data.
+        """
+        if doc is None:
+            doc = Document()
+        template = Document.from_json(self.json)
+        for root in list(template.roots):
+            template.remove_root(root)
+            doc.add_root(root)
+        for source in doc.select({'type': ColumnDataSource}):
+            if source.id in self.data:
+                source.data = dict(self.data[source.id])
+        doc.title = self.title
+        instrument_document(doc)
+        return doc
+
+    def register(self, server_context):
+        """
+            Store the template in the server context, i.e. in the
+            ``on_server_loaded`` lifecycle hook of the application.
+        """
+        setattr(server_context, self.context_attribute, self)
+        return self
+
+    @classmethod
+    def from_context(cls, doc):
+        """
+            Return the template registered in the server context of the
+            session of ``doc``, or None if there is no template.
+        """
+        session_context = getattr(doc, 'session_context', None)
+        server_context = getattr(session_context, 'server_context', None)
+        return getattr(server_context, cls.context_attribute, None)
@@ -0,0 +1,281 @@
+#!/usr/bin/env python3
+# Authors: Mabel Villalba Jimenez <mabelvj@gmail.com>,
+#          Emilio Molina Martinez <emilio.mol.mar@gmail.com>
+# License: GPLv3
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import numpy as np
+import pandas as pd
+from bokeh.document import Document
+from bokeh.document.events import ColumnDataChangedEvent
+
+from stocksdashboard.stocksdashboard import StocksDashboard
+from stocksdashboard.dashboard_with_widgets import DashboardWithWidgets
+
+size = 100
+np.random.seed(42)
+ix = pd.date_range(start='2000-01-01', periods=size)
+a = pd.Series(np.random.uniform(size=size), index=ix)
+b = pd.Series(np.random.uniform(size=size), index=ix)
+
+sliders_params = {'w': {'title': 'w', 'params': {'value': 5, 'start': 2,
+                                                 'end': 20, 'step': 1}}}
+signals_expressions = {'EMA': 'A.ewm(span=w).mean()',
+                       'DIFF': 'EMA - B'}
+
+
+def create_dashboard():
+    sdb = StocksDashboard()
+    sdb.build_dashboard(input_data={'stocks': {'A': a, 'B': b},
+                                    'signals': {'EMA': a, 'DIFF': a}},
+                        show=False)
+    dashboard = DashboardWithWidgets(sdb, sliders_params,
+                                     signals_expressions)
+    dashboard.create_sliders()
+    dashboard.widget_on_change()
+    return sdb, dashboard
+
+
+def column(sdb, name):
+    return [s.data[name] for s in sdb.datasources if name in s.data][0]
+
+
+def test_update_data():
+    sdb, dashboard = create_dashboard()
+    for w in [10, 3]:
+        dashboard.sliders['w'].value = w
+        ema = a.ewm(span=w).mean()
+        assert np.allclose(column(sdb, 'EMA'), ema.values)
+        assert np.allclose(column(sdb, 'DIFF'), (ema - b).values)
+
+
+def test_working_set_reused():
+    sdb, dashboard = create_dashboard()
+    dashboard.sliders['w'].value = 10
+    working_set = dashboard.working_set()
+    assert set(working_set.keys()) == {'x', 'A', 'B', 'EMA', 'DIFF'}
+    # the columns are not copied and the index is shared per source
+    source_a = [s for s in sdb.datasources if 'A' in s.data][0]
+    assert np.shares_memory(working_set['A'].values, source_a.data['A'])
+    assert working_set['A'].index is working_set['B'].index
+    dashboard.sliders['w'].value = 12
+    assert dashboard.working_set() is working_set
+    assert np.allclose(working_set['EMA'], a.ewm(span=12).mean())
+
+    # rebuilt when the data changes
+    c = a * 2
+    sdb.update_dashboard({'stocks': {'A': c, 'B': b},
+                          'signals': {'EMA': a, 'DIFF': a}})
+    assert dashboard.working_set() is not working_set
+    dashboard.sliders['w'].value = 10
+    assert np.allclose(column(sdb, 'EMA'), c.ewm(span=10).mean().values)
+
+    # or when the dashboard is rebuilt
+    working_set = dashboard.working_set()
+    sdb.build_dashboard(input_data={'stocks': {'A': b, 'B': b},
+                                    'signals': {'EMA': a, 'DIFF': a}},
+                        show=False)
+    assert dashboard.working_set() is not working_set
+    dashboard.sliders['w'].value = 12
+    assert np.allclose(column(sdb, 'EMA'), b.ewm(span=12).mean().values)
+
+
+def test_update_data_minimal_writes():
+    sdb = StocksDashboard()
+    sdb.build_dashboard(input_data={'stocks': {'A': a, 'B': b},
+                                    'signals': {'EMA': a, 'CONST': a}},
+                        show=False)
+    dashboard = DashboardWithWidgets(
+        sdb, sliders_params, {'EMA': 'A.ewm(span=w).mean()',
+                              'CONST': 'B * 2'})
+    dashboard.create_sliders()
+    dashboard.widget_on_change()
+    doc = Document()
+    doc.add_root(sdb.layout)
+    events = []
+    doc.on_change(lambda event: events.append(event))
+
+    dashboard.sliders['w'].value = 10
+    assert len(events) == 1
+    hint = events[0].hint
+    assert isinstance(hint, ColumnDataChangedEvent)
+    # the index did not change
+    assert sorted(hint.cols) == ['CONST', 'EMA']
+
+    del events[:]
+    dashboard.sliders['w'].value = 12
+    assert len(events) == 1
+    assert events[0].hint.cols == ['EMA']
+    assert np.allclose(column(sdb, 'EMA'), a.ewm(span=12).mean().values)
+    assert np.allclose(column(sdb, 'CONST'), (b * 2).values)
+
+
+def test_update_data_checks_lengths():
+    import pytest
+    from bokeh.util.warnings import BokehUserWarning
+
+    sdb = StocksDashboard()
+    sdb.build_dashboard(input_data={'stocks': {'A': a, 'B': b},
+                                    'signals': {'EMA': a, 'CONST': a}},
+                        show=False)
+    dashboard = DashboardWithWidgets(
+        sdb, sliders_params, {'EMA': 'A.ewm(span=w).mean().iloc[:w]',
+                              'CONST': 'B * 2'})
+    dashboard.create_sliders()
+    dashboard.widget_on_change()
+    # the other columns of the source keep their length.
+    with pytest.warns(BokehUserWarning, match='same length'):
+        dashboard.sliders['w'].value = 10
+
+
+def test_range_stats():
+    from stocksdashboard.aggregations import RangeStats
+
+    rng = np.random.RandomState(1)
+    values = 100 * np.exp(rng.normal(0, 0.02, size=(300, 3)).cumsum(0))
+    stats = RangeStats(values)
+    for lo, hi in [(0, 300), (17, 123), (100, 101), (3, 9), (255, 300)]:
+        window = pd.DataFrame(values[lo:hi])
+        returns = window.pct_change()
+        result = stats.query(lo, hi)
+        expected = {'return': window.iloc[-1] / window.iloc[0] - 1,
+                    'mean': returns.mean(), 'volatility': returns.std(),
+                    'min': window.min(), 'max': window.max(),
+                    'max_drawdown': (1 - window / window.cummax()).max()}
+        for k, v in list(expected.items()):
+            np.testing.assert_allclose(result[k], v.values, equal_nan=True)
+
+
+def test_create_stats():
+    sdb, dashboard = create_dashboard()
+    pretext = dashboard.create_stats()
+    lines = pretext.text.splitlines()
+    assert lines[0].split() == ['name', 'return', '%', 'mean', '%', 'vol',
+                                '%', 'min', 'max', 'max', 'dd', '%']
+    # the signals are not included by default.
+    assert [line.split()[0] for line in lines[1:]] == ['A', 'B']
+    values = [float(v) for v in lines[1].split()[1:]]
+    assert np.allclose(values[3:5], [round(a.min(), 2), round(a.max(), 2)])
+
+    # the visible range
+    x_range = dashboard.stats_x_range
+    x_range.update(start=ix[10], end=ix[20])
+    values = [float(v) for v in pretext.text.splitlines()[1].split()[1:]]
+    window = a.iloc[10:21]
+    assert np.allclose(values, np.round([
+        100 * (window.iloc[-1] / window.iloc[0] - 1),
+        100 * window.pct_change().mean(), 100 * window.pct_change().std(),
+        window.min(), window.max(),
+        100 * (1 - window / window.cummax()).max()], 2))
+
+    # own writes of the signals do not rebuild the statistics
+    stats = dashboard._stats
+    dashboard.sliders['w'].value = 10
+    assert dashboard._stats is stats
+    sdb.update_dashboard({'stocks': {'A': a * 2, 'B': b},
+                          'signals': {'EMA': a, 'DIFF': a}})
+    # (the update also resets the x range)
+    values = [float(v) for v in pretext.text.splitlines()[1].split()[1:]]
+    assert np.isclose(values[4], round(2 * a.max(), 2))
+
+
+def test_stats_watch_new_sources():
+    sdb = StocksDashboard()
+    sdb.build_dashboard(input_data={'stocks': {'A': a},
+                                    'signals': {'EMA': a}},
+                        show=False, align=False)
+    dashboard = DashboardWithWidgets(sdb, sliders_params,
+                                     {'EMA': 'A.ewm(span=w).mean()'})
+    dashboard.create_sliders()
+    dashboard.widget_on_change()
+    pretext = dashboard.create_stats()
+    assert [line.split()[0] for line in pretext.text.splitlines()[1:]] == \
+        ['A']
+
+    # a line with a new source
+    c = b * 3
+    sdb.update_dashboard({'stocks': {'A': a, 'C': c},
+                          'signals': {'EMA': a}})
+    lines = pretext.text.splitlines()
+    assert [line.split()[0] for line in lines[1:]] == ['A', 'C']
+    assert np.isclose(float(lines[2].split()[5]), round(c.max(), 2))
+
+    # the dashboard is rebuilt
+    sdb.build_dashboard(input_data={'stocks': {'A': b},
+                                    'signals': {'EMA': a}},
+                        show=False)
+    dashboard.sliders['w'].value = 10
+    lines = pretext.text.splitlines()
+    assert [line.split()[0] for line in lines[1:]] == ['A']
+    assert np.isclose(float(lines[1].split()[5]), round(b.max(), 2))
+    assert dashboard.stats_x_range is sdb.layout.select_one(
+        {'name': 'stocks'}).x_range
+    dashboard.stats_x_range.update(start=ix[10], end=ix[20])
+    assert np.isclose(float(pretext.text.splitlines()[1].split()[5]),
+                      round(b.iloc[10:21].max(), 2))
+
+
+def test_templated_signals():
+    stocks = {'A': a, 'B': b, 'C': a * b}
+    signals = {'%s_%s' % (name, s): a for name in ['A', 'B', 'C']
+               for s in ['EMA', 'DIFF']}
+    del signals['C_DIFF']
+    sdb = StocksDashboard()
+    sdb.build_dashboard(input_data={'stocks': stocks, 'signals': signals},
+                        show=False)
+    dashboard = DashboardWithWidgets(
+        sdb, sliders_params, {'{T}_EMA': '{T}.ewm(span=w).mean()',
+                              '{T}_DIFF': '{T} - {T}_EMA'}, mode='auto')
+    dashboard.create_sliders()
+    # only evaluated in the server.
+    assert dashboard.widget_on_change() is None
+    doc = Document()
+    doc.add_root(sdb.layout)
+    events = []
+    doc.on_change(lambda event: events.append(event))
+
+    dashboard.sliders['w'].value = 10
+    for name, stock in list(stocks.items()):
+        ema = stock.ewm(span=10).mean()
+        assert np.allclose(column(sdb, name + '_EMA'), ema.values)
+        if name != 'C':
+            assert np.allclose(column(sdb, name + '_DIFF'),
+                               (stock - ema).values)
+    assert dashboard._template_tickers('{T}_DIFF',
+                                       dashboard.working_set()) == ['A', 'B']
+    # all the outputs written at once.
+    assert len(events) == 1
+    assert sorted(events[0].hint.cols) == ['A_DIFF', 'A_EMA', 'B_DIFF',
+                                           'B_EMA', 'C_EMA']
+    # the frames of the columns are reused, not those of the signals.
+    frames = dict(dashboard._template_frames)
+    assert sorted(frames.keys()) == [('{T}', ('A', 'B')),
+                                     ('{T}', ('A', 'B', 'C'))]
+    dashboard.sliders['w'].value = 12
+    assert all([dashboard._template_frames[k] is v
+                for k, v in list(frames.items())])
+    assert np.allclose(column(sdb, 'B_DIFF'),
+                       (b - b.ewm(span=12).mean()).values)
+
+
+def test_templated_signals_native_index():
+    # each series with its own index (and source).
+    stocks = {'A': a, 'B': b.iloc[40:]}
+    sdb = StocksDashboard()
+    sdb.build_dashboard(input_data={'stocks': stocks,
+                                    'signals': {'A_EMA': a,
+                                                'B_EMA': b.iloc[40:]}},
+                        show=False, align=False)
+    dashboard = DashboardWithWidgets(
+        sdb, sliders_params, {'{T}_EMA': '{T}.ewm(span=w).mean()'})
+    dashboard.create_sliders()
+    dashboard.widget_on_change()
+    dashboard.sliders['w'].value = 10
+    for name, stock in list(stocks.items()):
+        source = [s for s in sdb.datasources if name + '_EMA' in s.data][0]
+        assert len(source.data['x']) == len(stock)
+        assert np.allclose(source.data[name + '_EMA'],
+                           stock.ewm(span=10).mean().values)
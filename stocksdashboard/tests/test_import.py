@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+# Authors: Mabel Villalba Jimenez <mabelvj@gmail.com>,
+#          Emilio Molina Martinez <emilio.mol.mar@gmail.com>
+# License: GPLv3
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import os
+import subprocess
+import sys
+from os.path import dirname
+
+import pytest
+
+import stocksdashboard
+
+
+def import_times(statement):
+    """
+        Run `statement` in a new interpreter with ``-X importtime`` and
+        return a dict with the cumulative import time in microseconds of
+        each imported module. The key 'total' contains the time of all the
+        imports at top level.
+    """
+    env = dict(os.environ)
+    env['PYTHONPATH'] = os.pathsep.join(
+        [dirname(dirname(dirname(os.path.abspath(__file__))))] +
+        [p for p in [env.get('PYTHONPATH')] if p])
+    result = subprocess.run([sys.executable, '-X', 'importtime',
+                             '-c', statement],
+                            env=env, stderr=subprocess.PIPE,
+                            universal_newlines=True, check=True)
+    times = {'total': 0}
+    for line in result.stderr.splitlines():
+        # import time: self [us] | cumulative | imported package
+        if not line.startswith('import time:') or 'imported package' in line:
+            continue
+        _, cumulative, module = line.split('|')
+        times[module.strip()] = int(cumulative)
+        if not module[1:].startswith(' '):
+            times['total'] += int(cumulative)
+    return times
+
+
+def test_import_does_not_import_bokeh():
+    times = import_times('import stocksdashboard; '
+                         'from stocksdashboard import Formatter')
+    assert 'stocksdashboard' in times
+    bokeh_modules = [m for m in times if m.split('.')[0] == 'bokeh']
+    assert bokeh_modules == []
+
+
+def test_import_time():
+    lazy = import_times('import stocksdashboard')['total']
+    full = import_times('import stocksdashboard; '
+                        'stocksdashboard.DashboardWithWidgets')['total']
+    assert 0 < lazy < full, (
+        "import stocksdashboard: %.1f ms, " % (lazy / 1000.) +
+        "with Bokeh dependent modules: %.1f ms" % (full / 1000.))
+
+
+def test_lazy_attributes():
+    assert (stocksdashboard.StocksDashboard.__module__ ==
+            'stocksdashboard.stocksdashboard')
+    assert (stocksdashboard.DashboardWithWidgets.__module__ ==
+            'stocksdashboard.dashboard_with_widgets')
+    assert callable(stocksdashboard.get_colors)
+    assert all([name in dir(stocksdashboard)
+                for name in stocksdashboard.__all__])
+    with pytest.raises(AttributeError,
+                       match="has no attribute 'not_an_attribute'"):
+        stocksdashboard.not_an_attribute
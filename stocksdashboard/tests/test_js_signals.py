@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+# Authors: Mabel Villalba Jimenez <mabelvj@gmail.com>,
+#          Emilio Molina Martinez <emilio.mol.mar@gmail.com>
+# License: GPLv3
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import json
+import shutil
+import subprocess
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from stocksdashboard.stocksdashboard import StocksDashboard
+from stocksdashboard.dashboard_with_widgets import DashboardWithWidgets
+from stocksdashboard.js_signals import translate_expression, sort_signals
+
+size = 60
+np.random.seed(42)
+ix = pd.date_range(start='2000-01-01', periods=size)
+aapl = pd.Series(np.random.uniform(low=10, high=20, size=size), index=ix)
+aapl.iloc[[0, 5, 6, 30]] = np.nan
+sliders_params = {'w': {'title': 'Window',
+                        'params': {'value': 7, 'start': 2, 'end': 50,
+                                   'step': 1}},
+                  'h': {'title': 'Half-life',
+                        'params': {'value': 4.5, 'start': 1, 'end': 50,
+                                   'step': 0.5}}}
+signals_expressions = {
+    'EMA': 'AAPL.ewm(span=w, min_periods=1, adjust=True, '
+           'ignore_na=False).mean()',
+    'EMA_2': 'AAPL.ewm(com=3, adjust=False, ignore_na=True).mean()',
+    'DIFF': 'AAPL.rolling(w).mean() - 2 * EMA',
+    'MEAN': 'AAPL.rolling(window=w, min_periods=2).mean()',
+    'OTHER': '-AAPL.shift(2) / AAPL.shift(-1) + '
+             'AAPL.ewm(halflife=h).mean() ** 2'}
+
+
+def create_dashboard(signals_expressions, mode):
+    input_data = {'stocks': {'AAPL': aapl},
+                  'signals': {name: aapl * 0 for name in
+                              signals_expressions}}
+    sdb = StocksDashboard()
+    sdb.datasources = []
+    sdb.build_dashboard(input_data=input_data, show=False)
+    dashboard = DashboardWithWidgets(sdb, sliders_params,
+                                     signals_expressions, mode=mode)
+    dashboard.create_sliders()
+    return dashboard
+
+
+def test_translate_expression():
+    code, columns, signals = translate_expression(
+        'AAPL.rolling(w).mean() - EMA', columns=['AAPL', 'EMA'],
+        sliders=['w'], signals=['EMA'])
+    assert code == ("binop(rolling_mean(column('AAPL'), " +
+                    "sliders['w'].value, null), signals['EMA'], " +
+                    "(x, y) => x - y)")
+    assert columns == {'AAPL'}
+    assert signals == {'EMA'}
+    for expr in ['AAPL.rolling(w).std()', 'AAPL.ewm().mean()',
+                 'AAPL.ewm(span=w, alpha=0.5).mean()', 'np.log(AAPL)',
+                 'AAPL.rolling(AAPL).mean()', 'OTHER + 1', 'w + 1',
+                 'AAPL[1:]']:
+        with pytest.raises(ValueError):
+            translate_expression(expr, columns=['AAPL'], sliders=['w'])
+
+
+def test_sort_signals():
+    assert sort_signals({'A': {'B'}, 'B': set(), 'C': {'A', 'B'}}) == [
+        'B', 'A', 'C']
+    with pytest.raises(ValueError) as excinfo:
+        sort_signals({'A': {'B'}, 'B': {'A'}})
+    assert "Circular dependencies" in str(excinfo.value)
+
+
+def test_widget_on_change_modes():
+    unsupported = dict(signals_expressions,
+                       EMA='AAPL.ewm(span=w).std()')
+    dashboard = create_dashboard(signals_expressions, 'client')
+    callback = dashboard.widget_on_change()
+    for slider in list(dashboard.sliders.values()):
+        assert slider.js_property_callbacks['change:value'] == [callback]
+        assert not slider._callbacks
+
+    dashboard = create_dashboard(unsupported, 'client')
+    with pytest.raises(ValueError):
+        dashboard.widget_on_change()
+
+    # 'auto' falls back to the server.
+    dashboard = create_dashboard(unsupported, 'auto')
+    assert dashboard.widget_on_change() is None
+    for slider in list(dashboard.sliders.values()):
+        assert not slider.js_property_callbacks
+        assert slider._callbacks['value']
+
+    with pytest.raises(ValueError):
+        create_dashboard(signals_expressions, 'browser')
+
+
+@pytest.mark.skipif(shutil.which('node') is None,
+                    reason="Node.js is not available.")
+def test_client_signals_match_pandas():
+    dashboard = create_dashboard(signals_expressions, 'client')
+    callback = dashboard.widget_on_change()
+    script = """
+        const columns = {AAPL: {data: {AAPL: %s.map(
+            v => (v === null) ? NaN : v)}}}
+        const source = {data: {}, change: {emit() {}}}
+        const outputs = {}
+        for (const name of %s)
+            outputs[name] = source
+        const sliders = {w: {value: 7}, h: {value: 4.5}};
+        (function() { %s })()
+        const result = {}
+        for (const name in source.data)
+            result[name] = Array.from(source.data[name]).map(
+                v => isNaN(v) ? null : v)
+        console.log(JSON.stringify(result))
+    """ % (json.dumps([None if np.isnan(v) else v for v in aapl]),
+           json.dumps(list(signals_expressions.keys())), callback.code)
+    result = json.loads(subprocess.check_output(['node', '-e', script]))
+    w, h = 7, 4.5
+    ema = aapl.ewm(span=w, min_periods=1, adjust=True,
+                   ignore_na=False).mean()
+    expected = {
+        'EMA': ema,
+        'EMA_2': aapl.ewm(com=3, adjust=False, ignore_na=True).mean(),
+        'DIFF': aapl.rolling(w).mean() - 2 * ema,
+        'MEAN': aapl.rolling(window=w, min_periods=2).mean(),
+        'OTHER': (-aapl.shift(2) / aapl.shift(-1) +
+                  aapl.ewm(halflife=h).mean() ** 2)}
+    for name, values in list(expected.items()):
+        assert np.allclose(np.array(result[name], dtype=float),
+                           values.values, equal_nan=True), name
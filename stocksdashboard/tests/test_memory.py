@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+# Authors: Mabel Villalba Jimenez <mabelvj@gmail.com>,
+#          Emilio Molina Martinez <emilio.mol.mar@gmail.com>
+# License: GPLv3
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import gc
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from stocksdashboard.formatter import Formatter
+from stocksdashboard.stocksdashboard import StocksDashboard
+
+# Synthetic universes: (number of tickers, number of dates). The tickers
+# are plotted in panels of 20 (the size of the default palette).
+universes = [(20, 2000), (60, 4000)]
+tickers_per_panel = 20
+
+# Recorded bounds of the memory used, as a multiple of the bytes of the
+# values of the universe (peak, retained), plus PANEL_BYTES per panel for
+# the Bokeh models of the figures.
+bounds = {'format_aligned': (2.2, 1.15),
+          'format_native': (1.15, 1.15),
+          'format_dict': (3.0, 1.2),
+          'build_dashboard': (2.2, 1.2)}
+PANEL_BYTES = 1 << 20
+
+
+def universe(n_tickers, n_dates, as_dict=False):
+    rng = np.random.RandomState(42)
+    index = pd.bdate_range('2000-01-03', periods=n_dates)
+    dates = index.strftime('%Y-%m-%d').tolist()
+    input_data = {}
+    for i in range(n_tickers):
+        values = rng.normal(100, 1, n_dates)
+        if as_dict:
+            values = {'date': dates, 'adj_close': list(values)}
+        else:
+            values = pd.Series(values, index=index)
+        panel = 'panel_%d' % (i // tickers_per_panel)
+        input_data.setdefault(panel, {})['T%03d' % i] = values
+    return input_data
+
+
+def measure(f):
+    """ Peak and retained bytes allocated while running ``f``. """
+    gc.collect()
+    tracemalloc.start()
+    try:
+        start = tracemalloc.get_traced_memory()[0]
+        result = f()
+        gc.collect()
+        current, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return peak - start, current - start, result
+
+
+def check_bounds(name, peak, retained, n_tickers, n_dates):
+    n_panels = -(-n_tickers // tickers_per_panel)
+    nbytes = 8 * n_tickers * n_dates
+    peak_bound, retained_bound = [b * nbytes + PANEL_BYTES * n_panels
+                                  for b in bounds[name]]
+    assert peak <= peak_bound, (
+        "%s: peak memory %.1f MB exceeds %.1f MB" % (
+            name, peak / 2. ** 20, peak_bound / 2. ** 20))
+    assert retained <= retained_bound, (
+        "%s: retained memory %.1f MB exceeds %.1f MB" % (
+            name, retained / 2. ** 20, retained_bound / 2. ** 20))
+
+
+@pytest.mark.parametrize('n_tickers, n_dates', universes)
+def test_memory_format_input_data(n_tickers, n_dates):
+    input_data = universe(n_tickers, n_dates)
+    for name, align in [('format_aligned', True), ('format_native', False)]:
+        peak, retained, result = measure(
+            lambda: Formatter(align=align).format_input_data(input_data))
+        check_bounds(name, peak, retained, n_tickers, n_dates)
+        del result
+    input_data = universe(n_tickers, n_dates, as_dict=True)
+    peak, retained, result = measure(
+        lambda: Formatter().format_input_data(input_data))
+    check_bounds('format_dict', peak, retained, n_tickers, n_dates)
+
+
+def build(input_data):
+    dashboard = StocksDashboard()
+    dashboard.build_dashboard(input_data=input_data, show=False)
+    return dashboard
+
+
+@pytest.mark.parametrize('n_tickers, n_dates', universes)
+def test_memory_build_dashboard(n_tickers, n_dates):
+    input_data = universe(n_tickers, n_dates)
+    peak, retained, dashboard = measure(lambda: build(input_data))
+    check_bounds('build_dashboard', peak, retained, n_tickers, n_dates)
+    assert len(dashboard.datasources) == len(input_data)
+
+
+def test_memory_discarded_dashboard():
+    input_data = universe(*universes[0])
+    dashboard = build(input_data)
+    # Nothing is retained once a dashboard is discarded, i.e. the sources
+    # are not kept by the class.
+    peak, retained, _ = measure(lambda: build(input_data) and None)
+    assert retained < (1 << 16)
+    assert len(StocksDashboard().datasources) == 0
+    assert len(dashboard.datasources) == len(input_data)
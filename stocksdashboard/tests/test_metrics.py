@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+# Authors: Mabel Villalba Jimenez <mabelvj@gmail.com>,
+#          Emilio Molina Martinez <emilio.mol.mar@gmail.com>
+# License: GPLv3
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import gc
+
+import numpy as np
+import pandas as pd
+import pytest
+from bokeh.document import Document
+from tornado.testing import AsyncHTTPTestCase
+from tornado.web import Application
+
+from stocksdashboard import metrics
+from stocksdashboard.stocksdashboard import StocksDashboard
+from stocksdashboard.dashboard_with_widgets import DashboardWithWidgets
+
+size = 50
+np.random.seed(42)
+ix = pd.date_range(start='2000-01-01', periods=size)
+a = pd.Series(np.random.uniform(size=size), index=ix)
+
+
+def test_registry_render():
+    registry = metrics.Registry()
+    counter = registry.register(metrics.Counter(
+        'events_total', 'Events.', labels=('kind',)))
+    gauge = registry.register(metrics.Gauge('open', 'Open.'))
+    histogram = registry.register(metrics.Histogram(
+        'size_bytes', 'Sizes.', buckets=[10, 100]))
+    counter.inc(kind='a')
+    counter.inc(2, kind='a')
+    gauge.inc()
+    gauge.inc()
+    gauge.dec()
+    for value in [5, 10, 50, 500]:
+        histogram.observe(value)
+    assert registry.render().splitlines() == [
+        '# HELP events_total Events.',
+        '# TYPE events_total counter',
+        'events_total{kind="a"} 3.0',
+        '# HELP open Open.',
+        '# TYPE open gauge',
+        'open 1.0',
+        '# HELP size_bytes Sizes.',
+        '# TYPE size_bytes histogram',
+        'size_bytes_bucket{le="10.0"} 2.0',
+        'size_bytes_bucket{le="100.0"} 3.0',
+        'size_bytes_bucket{le="+Inf"} 4.0',
+        'size_bytes_sum 565.0',
+        'size_bytes_count 4.0']
+    with pytest.raises(ValueError):
+        counter.inc(kind='a', other='b')
+    with pytest.raises(ValueError):
+        registry.register(metrics.Gauge('open', 'Open.'))
+
+
+def test_update_data_and_sources_metrics():
+    count = metrics.UPDATE_DATA_SECONDS.count()
+    gc.collect()
+    sources = metrics.SOURCES.value()
+    sdb = StocksDashboard()
+    sdb.build_dashboard(input_data={'stocks': {'A': a, 'EMA': a}},
+                        show=False)
+    assert metrics.SOURCES.value() == sources + 1
+    dashboard = DashboardWithWidgets(
+        sdb, {'w': {'title': 'w', 'params': {'value': 5, 'start': 2,
+                                             'end': 20, 'step': 1}}},
+        {'EMA': 'A.ewm(span=w).mean()'})
+    dashboard.create_sliders()
+    dashboard.widget_on_change()
+    dashboard.sliders['w'].value = 10
+    dashboard.sliders['w'].value = 12
+    assert metrics.UPDATE_DATA_SECONDS.count() == count + 2
+    del sdb, dashboard
+    gc.collect()
+    assert metrics.SOURCES.value() == sources
+
+
+def test_source_change_bytes():
+    sdb = StocksDashboard()
+    sdb.build_dashboard(input_data={'stocks': {'A': a}}, show=False)
+    doc = metrics.instrument_document(Document())
+    doc.add_root(sdb.layout)
+    assert metrics.instrument_document(doc) is doc
+    counts = {kind: metrics.SOURCE_CHANGE_BYTES.count(kind=kind)
+              for kind in ('data', 'patch', 'stream')}
+    nbytes = metrics.SOURCE_CHANGE_BYTES.sum(kind='data')
+
+    b = a.copy()
+    b.iloc[3] = -1
+    sdb.update_dashboard({'stocks': {'A': b}})
+    assert metrics.SOURCE_CHANGE_BYTES.count(kind='data') == (
+        counts['data'] + 1)
+    assert metrics.SOURCE_CHANGE_BYTES.sum(kind='data') == nbytes + 8 * size
+    b.iloc[4] = -1
+    sdb.update_dashboard({'stocks': {'A': b}})
+    assert metrics.SOURCE_CHANGE_BYTES.count(kind='patch') == (
+        counts['patch'] + 1)
+
+
+class TestMetricsHandler(AsyncHTTPTestCase):
+
+    def get_app(self):
+        return Application(metrics.extra_patterns())
+
+    def test_get(self):
+        metrics.on_session_created(None)
+        response = self.fetch('/metrics')
+        metrics.on_session_destroyed(None)
+        assert response.code == 200
+        assert response.headers['Content-Type'].startswith('text/plain')
+        body = response.body.decode()
+        assert '# TYPE stocksdashboard_sessions gauge' in body
+        assert '# TYPE stocksdashboard_update_data_seconds histogram' in body
@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+# Authors: Mabel Villalba Jimenez <mabelvj@gmail.com>,
+#          Emilio Molina Martinez <emilio.mol.mar@gmail.com>
+# License: GPLv3
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+from stocksdashboard.stocksdashboard import StocksDashboard
+from stocksdashboard.dashboard_with_widgets import DashboardWithWidgets
+from stocksdashboard.profiling import CallbackProfiler
+
+size = 2000
+np.random.seed(42)
+ix = pd.date_range(start='2000-01-01', periods=size)
+a = pd.Series(np.random.uniform(size=size), index=ix)
+
+
+def busy(seconds):
+    start = time.perf_counter()
+    while time.perf_counter() - start < seconds:
+        pass
+
+
+def test_profiler_phases_and_stacks(tmpdir):
+    profiler = CallbackProfiler(path=str(tmpdir), interval=0.0005)
+    for i in range(2):
+        with profiler.profile('callback'):
+            with profiler.phase('slow'):
+                busy(0.05)
+            with profiler.phase('fast'):
+                pass
+    assert profiler.calls == 2
+    assert profiler.timings['callback;slow'] >= 0.1
+    assert profiler.timings['callback;fast'] < profiler.timings[
+        'callback;slow']
+    assert profiler.timings['callback'] >= profiler.timings['callback;slow']
+    assert sorted(os.listdir(str(tmpdir))) == ['callback_0001.folded',
+                                               'callback_0002.folded']
+    with open(str(tmpdir.join('callback_0001.folded'))) as f:
+        lines = f.read().splitlines()
+    stacks = dict([line.rsplit(' ', 1) for line in lines])
+    assert any([s.startswith('callback;slow;busy (test_profiling.py')
+                for s in stacks])
+    # only the frames called from the profiled block
+    assert not any(['test_profiler_phases_and_stacks' in s for s in stacks])
+    assert sum(profiler.stacks.values()) >= sum(map(int, stacks.values()))
+    assert 'callback;slow' in profiler.report()
+
+
+def test_dashboard_with_widgets_profile(tmpdir):
+    sdb = StocksDashboard()
+    sdb.build_dashboard(input_data={'stocks': {'A': a, 'EMA': a, 'MA': a}},
+                        show=False)
+    dashboard = DashboardWithWidgets(
+        sdb, {'w': {'title': 'w', 'params': {'value': 5, 'start': 2,
+                                             'end': 20, 'step': 1}}},
+        {'EMA': 'A.ewm(span=w).mean()', 'MA': 'A.rolling(w).mean()'},
+        profile=str(tmpdir))
+    dashboard.create_sliders()
+    dashboard.widget_on_change()
+    dashboard.sliders['w'].value = 10
+    profiler = dashboard.profiler
+    assert profiler.calls == 1
+    assert set(profiler.signal_timings().keys()) == {'EMA', 'MA'}
+    for phase in ('materialise', 'write'):
+        assert profiler.timings['update_data;%s' % phase] > 0
+    assert os.listdir(str(tmpdir)) == ['update_data_0001.folded']
+    assert np.allclose(sdb.datasources[0].data['EMA'],
+                       a.ewm(span=10).mean().values)
+
+    assert DashboardWithWidgets(sdb, {}, {}).profiler is None
@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+# Authors: Mabel Villalba Jimenez <mabelvj@gmail.com>,
+#          Emilio Molina Martinez <emilio.mol.mar@gmail.com>
+# License: GPLv3
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import mmap
+import multiprocessing
+import os
+
+import numpy as np
+import pandas as pd
+
+from stocksdashboard.formatter import Formatter
+from stocksdashboard.shared_data import SharedData
+
+size = 50
+np.random.seed(42)
+ix = pd.date_range(start='2000-01-01', periods=size)
+input_data = {'stocks': {'A': pd.Series(np.random.uniform(size=size),
+                                        index=ix),
+                         'B': pd.Series(np.random.uniform(size=size),
+                                        index=ix)},
+              'avg': {'C': pd.Series(np.random.uniform(size=size // 2),
+                                     index=ix[:size // 2])}}
+
+
+def load_data(calls_path):
+    with open(calls_path, 'a') as f:
+        f.write('x')
+    return input_data
+
+
+def attach(path, calls_path, queue):
+    data = SharedData(path).get_or_create(lambda: load_data(calls_path))
+    queue.put(data['stocks'].sum().sum())
+
+
+def is_mapped(values):
+    while values is not None:
+        if isinstance(values, (np.memmap, mmap.mmap)):
+            return True
+        values = getattr(values, 'base', None)
+    return False
+
+
+def test_publish_and_attach(tmpdir):
+    formatted_data, _, _ = Formatter(align=False).format_input_data(
+        input_data)
+    shared = SharedData(str(tmpdir.join('data'))).publish(formatted_data)
+    data = shared.attach()
+    assert list(data['stocks'].columns) == ['A', 'B']
+    values = data['stocks'].values
+    assert is_mapped(values)
+    assert not values.flags.writeable
+    assert np.array_equal(data['stocks']['B'].values,
+                          input_data['stocks']['B'].values)
+    assert data['stocks'].index.equals(ix)
+    # Series with a different index are stored per series.
+    assert isinstance(data['avg'], dict)
+    assert data['avg']['C'].index.equals(ix[:size // 2])
+    assert is_mapped(data['avg']['C'].values)
+    # The attached data is plotted without copies.
+    formatted, x_range, _ = Formatter().format_input_data(data)
+    assert np.shares_memory(formatted['stocks'][0].values, values)
+    shared.unlink()
+    assert not shared.exists()
+
+
+def test_publish_aligned_panels(tmpdir):
+    # the matrices of the panels are freed while publishing: their ids
+    # must not map later panels to the files of earlier ones.
+    rng = np.random.RandomState(0)
+    data = {'p%d' % i: {'%s%d' % (name, i): pd.Series(rng.uniform(size=size),
+                                                      index=ix)
+                        for name in ['A', 'B', 'C']}
+            for i in range(4)}
+    formatted_data, _, _ = Formatter().format_input_data(data)
+    shared = SharedData(str(tmpdir.join('data'))).publish(formatted_data)
+    attached = shared.attach()
+    for plot_title, series in list(data.items()):
+        assert list(attached[plot_title].columns) == list(series.keys())
+        for name, s in list(series.items()):
+            assert np.array_equal(attached[plot_title][name].values,
+                                  s.values)
+
+
+def test_get_or_create_once(tmpdir):
+    path = str(tmpdir.join('data'))
+    calls_path = str(tmpdir.join('calls'))
+    queue = multiprocessing.Queue()
+    processes = [multiprocessing.Process(target=attach,
+                                         args=(path, calls_path, queue))
+                 for i in range(3)]
+    for p in processes:
+        p.start()
+    results = [queue.get(timeout=60) for p in processes]
+    for p in processes:
+        p.join()
+    expected = (input_data['stocks']['A'].sum() +
+                input_data['stocks']['B'].sum())
+    assert np.allclose(results, expected)
+    with open(calls_path) as f:
+        assert f.read() == 'x'
+    assert not os.path.exists(path + '.lock')
@@ -18,6 +18,7 @@ import pandas as pd
 import random
 import string
 import copy
+import os
 
 
 low = 0
@@ -481,3 +482,520 @@ def test_formatter_format_param_list():
     msg = "If input data contains a list, 'params' should contain " + \
           "a list of parameters for each element."
     assert(msg in str(excinfo))
+
+
+def test_formatter_format_input_data_native_index():
+    # Series with different date ranges keep their own index.
+    ix = pd.date_range(start='2000-01-01', periods=size)
+    data = {'stocks': {'A': pd.Series(data1['A'], index=ix),
+                       'B': pd.Series(data1['B'][10:], index=ix[10:])},
+            'intraday': {'X': pd.Series(data2['X'],
+                                        index=pd.date_range(
+                                            start='2000-01-01', freq='T',
+                                            periods=size))}}
+    result, x_range, names = Formatter(align=False).format_input_data(
+        data, 'col_1')
+    assert [len(s) for s in result['stocks']] == [size, size - 10]
+    assert [s.name for s in result['stocks']] == ['A', 'B']
+    assert result['stocks'][1].index.equals(ix[10:])
+    assert len(result['intraday'][0]) == size
+    expected_range = ix.union(result['intraday'][0].index)
+    assert x_range.equals(expected_range)
+
+    # Aligned data is padded to the union of the indices.
+    result, x_range, names = Formatter().format_input_data(data, 'col_1')
+    assert all([len(s) == len(expected_range)
+                for v in result.values() for s in v])
+
+
+def test_build_dashboard_native_index():
+    ix = pd.date_range(start='2000-01-01', periods=size)
+    data = {'stocks': {'A': pd.Series(data1['A'], index=ix),
+                       'B': pd.Series(data1['B'][10:], index=ix[10:])}}
+    dashboard = sdb()
+    dashboard.datasources = []
+    dashboard.build_dashboard(input_data=data, show=False, align=False)
+    assert [{k: len(v) for k, v in ds.data.items()}
+            for ds in dashboard.datasources] == [{'x': size, 'A': size},
+                                                 {'x': size - 10,
+                                                  'B': size - 10}]
+
+    dashboard = sdb()
+    dashboard.datasources = []
+    dashboard.build_dashboard(input_data=data, show=False)
+    assert [{k: len(v) for k, v in ds.data.items()}
+            for ds in dashboard.datasources] == [{'A': size, 'x': size,
+                                                  'B': size}]
+
+
+def test_formatter_dtypes_and_memory_report():
+    ix = pd.date_range(start='2000-01-01', periods=size)
+    data = {'stocks': {'A': pd.Series(data1['A'], index=ix),
+                       'B': pd.Series(data1['B'], index=ix)},
+            'avg': {'X': pd.Series(data2['X'], index=ix)}}
+    f = Formatter(dtypes={'values': 'float32', 'index': 'int64'})
+    result, x_range, names = f.format_input_data(data)
+    assert all([s.dtype == np.float32 for v in result.values() for s in v])
+    assert x_range.dtype == np.int64
+    assert x_range[0] == ix[0].value // 10 ** 6
+    # the index is still shared by all the series
+    assert result['stocks'][0].index is result['avg'][0].index
+
+    report = Formatter.memory_report(result)
+    assert report['panels']['stocks']['series'] == {
+        'A': 4 * size, 'B': 4 * size}
+    assert report['panels']['stocks']['index'] == 8 * size
+    assert report['panels']['stocks']['nbytes'] == 16 * size
+    assert report['nbytes'] == 3 * 4 * size + 8 * size
+
+    with pytest.raises(ValueError) as excinfo:
+        Formatter(dtypes={'names': 'category'}).format_input_data(data)
+    assert "Invalid key in 'dtypes': 'names'." in str(excinfo.value)
+
+
+def test_build_dashboard_memory_budget():
+    ix = pd.date_range(start='2000-01-01', periods=size)
+    data = {'stocks': {'A': pd.Series(data1['A'], index=ix)}}
+    dashboard = sdb()
+    dashboard.build_dashboard(input_data=data, show=False)
+    assert dashboard.memory_report['nbytes'] == 16 * size
+    with pytest.raises(ValueError) as excinfo:
+        sdb().build_dashboard(input_data=data, show=False,
+                              memory_budget=10 * size)
+    assert "exceeding 'memory_budget'" in str(excinfo.value)
+    sdb().build_dashboard(input_data=data, show=False,
+                          dtypes={'values': 'float32'},
+                          memory_budget=12 * size)
+
+
+def test_formatter_format_input_data_n_jobs():
+    ix = pd.date_range(start='2000-01-01', periods=size)
+    data = {'plot_' + str(h): {str(i): pd.Series(
+        np.random.uniform(low=low, high=high, size=(size - h,)),
+        index=ix[h:]) for i in range(3)}
+        for h in range(8)}
+    for align in (True, False):
+        expected, expected_range, expected_names = Formatter(
+            align=align).format_input_data(data)
+        result, x_range, names = Formatter(
+            align=align, n_jobs=4).format_input_data(data)
+        assert names == expected_names
+        assert x_range.equals(expected_range)
+        assert list(result.keys()) == list(expected.keys())
+        assert all([r.equals(e)
+                    for _r, _e in zip(result.values(), expected.values())
+                    for r, e in zip(_r, _e)])
+    assert Formatter(n_jobs=-1)._get_n_workers(1) == 1
+    assert Formatter(n_jobs=4)._get_n_workers(2) == 2
+    assert Formatter(n_jobs=-1)._get_n_workers(1000) == os.cpu_count()
+
+
+def test_formatter_wide_frame():
+    ix = pd.date_range(start='2000-01-01', periods=size)
+    values = np.asfortranarray(np.random.uniform(low=low, high=high,
+                                                 size=(size, 3)))
+    wide = Formatter.from_array(values, index=ix, columns=['A', 'B', 'C'])
+    assert np.shares_memory(wide.values, values)
+    data = {'stocks': wide,
+            'array': np.random.uniform(low=low, high=high, size=(size, 2))}
+    result, x_range, names = Formatter().format_input_data(
+        {'stocks': wide})
+    assert names == {'stocks': ['A', 'B', 'C']}
+    assert x_range.equals(ix)
+    assert all([np.shares_memory(s.values, values)
+                for s in result['stocks']])
+
+    result, x_range, names = Formatter(align=False).format_input_data(data)
+    assert names == {'stocks': ['A', 'B', 'C'], 'array': ['0', '1']}
+    assert np.array_equal(result['array'][1].values, data['array'][:, 1])
+
+    dashboard = sdb()
+    dashboard.datasources = []
+    dashboard.build_dashboard(input_data={'stocks': wide}, show=False)
+    source = dashboard.datasources[0]
+    assert all([np.shares_memory(source.data[c], values)
+                for c in ('A', 'B', 'C')])
+    # the shared columns are copied before being patched.
+    assert not source.data['A'].flags.writeable
+    expected = values.copy()
+    for i in [10, 11]:
+        wide2 = wide.copy()
+        wide2.iloc[10:i + 1, 0] = -1
+        dashboard.update_dashboard(input_data={'stocks': wide2})
+        assert source.data['A'][i] == -1
+    assert np.array_equal(values, expected)
+
+
+def test_formatter_parse_dates_shared():
+    dates = pd.date_range(start='2000-01-01', periods=size)
+    # Each ticker has its own list with the same dates.
+    data = {'stocks': {name: {'date': [str(d.date()) for d in dates],
+                              'adj_close': values}
+                       for name, values in data1.items()},
+            'other': {'X': {'date': [str(d.date()) for d in dates[5:]],
+                            'adj_close': data2['X'][5:]}}}
+    f = Formatter(align=False)
+    result, x_range, names = f.format_input_data(data)
+    assert x_range.equals(dates)
+    # each distinct list of dates is parsed once and shared.
+    assert len(f._dates_cache) == 2
+    assert all([s.index is result['stocks'][0].index
+                for s in result['stocks']])
+    assert result['other'][0].index.equals(dates[5:])
+    assert np.array_equal(result['stocks'][1].values, data1['B'])
+
+    # values as pd.Series (with a RangeIndex): taken by position.
+    data = {'stocks': {name: {'date': pd.Series([str(d.date())
+                                                 for d in dates]),
+                              'adj_close': pd.Series(values)}
+                       for name, values in data1.items()}}
+    result, x_range, names = Formatter().format_input_data(data)
+    assert result['stocks'][0].index.equals(dates)
+    assert np.array_equal(result['stocks'][1].values, data1['B'])
+
+    f = Formatter()
+    assert f._parse_dates(['a', 'b']).equals(pd.Index(['a', 'b']))
+    assert f._parse_dates(np.array(dates)).equals(dates)
+
+
+def test_update_dashboard():
+    from bokeh.document import Document
+    from bokeh.models import GlyphRenderer, HoverTool
+
+    ix = pd.date_range(start='2000-01-01', periods=size)
+    a = pd.Series(data1['A'], index=ix)
+    b = pd.Series(data1['B'], index=ix)
+    dashboard = sdb()
+    dashboard.datasources = []
+    dashboard.build_dashboard(input_data={'stocks': {'A': a, 'B': b}},
+                              show=False, line_width=2)
+    doc = Document()
+    doc.add_root(dashboard.layout)
+    events = []
+    doc.on_change(lambda event: events.append(event))
+
+    def hints():
+        result = [type(e.hint).__name__ for e in events]
+        del events[:]
+        return result
+
+    # Same data: nothing is sent.
+    dashboard.update_dashboard({'stocks': {'A': a, 'B': b}}, line_width=2)
+    assert hints() == []
+
+    # One value changed: the column is sent once and then patched.
+    a2 = a.copy()
+    a2.iloc[10] = -1
+    dashboard.update_dashboard({'stocks': {'A': a2, 'B': b}}, line_width=2)
+    assert hints() == ['ColumnDataChangedEvent']
+    a2.iloc[11] = -2
+    dashboard.update_dashboard({'stocks': {'A': a2, 'B': b}}, line_width=2)
+    assert hints() == ['ColumnsPatchedEvent']
+    source = dashboard.datasources[0]
+    assert source.data['A'][11] == -2
+    # the input data is not modified.
+    assert a.iloc[11] == data1['A'][11]
+
+    # New rows are streamed.
+    ix2 = pd.date_range(start='2000-01-01', periods=size + 2)
+    a3 = pd.Series(np.r_[a2.values, [1, 2]], index=ix2)
+    b3 = pd.Series(np.r_[b.values, [3, 4]], index=ix2)
+    dashboard.update_dashboard({'stocks': {'A': a3, 'B': b3}}, line_width=2)
+    assert 'ColumnsStreamedEvent' in hints()
+    assert list(source.data['B'][-2:]) == [3, 4]
+
+    # Renderers are only added or removed for added or removed names.
+    renderer_a = doc.select_one({'type': GlyphRenderer, 'name': 'A'})
+    dashboard.update_dashboard({'stocks': {'A': a3, 'C': b3}},
+                               params={'stocks': {'A': {'color': 'red'}}},
+                               line_width=2)
+    renderers = {r.name: r for r in doc.select({'type': GlyphRenderer})}
+    assert set(renderers.keys()) == {'A', 'C'}
+    assert renderers['A'] is renderer_a
+    assert renderer_a.glyph.line_color == 'red'
+    assert set(source.data.keys()) == {'x', 'A', 'C'}
+    hover = doc.select_one({'type': HoverTool})
+    assert [r.name for r in hover.renderers] == ['A', 'C']
+    assert dashboard.datasources == [source]
+
+    with pytest.raises(ValueError) as excinfo:
+        dashboard.update_dashboard({'other': {'A': a3}})
+    assert "Panels cannot be added or removed on update." in str(
+        excinfo.value)
+
+
+def test_build_dashboard_views():
+    from bokeh.models import GlyphRenderer, Plot, RadioButtonGroup
+
+    ix = pd.date_range(start='2000-01-01', periods=size)
+    input_data = {'stocks': {'A': pd.Series(data1['A'], index=ix),
+                             'B': pd.Series(data1['B'], index=ix)},
+                  'other': {'X': pd.Series(data2['X'], index=ix)}}
+    dashboard = sdb()
+    dashboard.datasources = []
+    dashboard.build_dashboard(input_data=input_data, show=False, views=True,
+                              aligment={'other': {'X': 'right'}})
+    selector = dashboard.layout.children[0]
+    assert isinstance(selector, RadioButtonGroup)
+    assert selector is dashboard.view_selector
+    assert selector.labels == ['Price', 'Rebased 100', 'Return %']
+
+    def transforms():
+        renderers = dashboard.layout.select({'type': GlyphRenderer})
+        return {r.name: r.glyph.y['transform'] for r in renderers}
+
+    # one transform per source.
+    _transforms = transforms()
+    assert _transforms['A'] is _transforms['B']
+    assert _transforms['A'] is not _transforms['X']
+    callbacks = selector.js_property_callbacks['change:active']
+    assert len(callbacks) == 1
+    assert len(callbacks[0].args['sources']) == 2
+    x_range = callbacks[0].args['x_range']
+    # the panels share the same x_range (not copies with the same id).
+    assert all([p.x_range is x_range
+                for p in dashboard.layout.select({'type': Plot})])
+    assert x_range.js_property_callbacks['change:start'] == callbacks
+
+    # New lines use the transform of their source.
+    input_data['stocks']['C'] = pd.Series(data1['C'], index=ix)
+    dashboard.update_dashboard(input_data)
+    assert transforms()['C'] is _transforms['A']
+    assert len(selector.js_property_callbacks['change:active']) == 1
+
+
+def test_cross_sectional_quantiles():
+    from stocksdashboard.aggregations import cross_sectional_quantiles
+
+    ix = pd.date_range(start='2000-01-01', periods=30)
+    rng = np.random.RandomState(0)
+    values = rng.normal(size=(30, 50))
+    values[3, :] = np.nan
+    values[5, :10] = np.nan
+    series = [pd.Series(values[:, i], index=ix) for i in range(50)]
+    # a series with other index is aligned to the union.
+    series.append(pd.Series([1.], index=[ix[-1] + pd.Timedelta('1D')]))
+    index, result = cross_sectional_quantiles(series, [5, 50, 95],
+                                              chunk_size=7)
+    assert len(index) == 31
+    assert result.shape == (3, 31)
+    keep = np.arange(30) != 3
+    expected = np.nanpercentile(values[keep], [5, 50, 95], axis=1)
+    np.testing.assert_allclose(result[:, :30][:, keep], expected)
+    assert np.isnan(result[:, 3]).all()
+    np.testing.assert_allclose(result[:, 30], 1.)
+
+
+def test_build_dashboard_quantiles():
+    from bokeh.models import GlyphRenderer, Plot, VArea
+
+    ix = pd.date_range(start='2000-01-01', periods=size)
+    rng = np.random.RandomState(0)
+    universe = {'T%02d' % i: pd.Series(rng.normal(size=size), index=ix)
+                for i in range(40)}
+    input_data = {'universe': universe,
+                  'stocks': {'A': pd.Series(data1['A'], index=ix)}}
+    dashboard = sdb()
+    dashboard.build_dashboard(input_data=input_data, show=False,
+                              panel_type={'universe': 'quantiles'},
+                              highlight=['T01', 'T02', 'OTHER'], views=True)
+    plots = {p.name: p for p in dashboard.layout.select({'type': Plot})}
+    renderers = {r.name: r for r in plots['universe'].renderers
+                 if isinstance(r, GlyphRenderer)}
+    assert sorted(renderers.keys()) == ['T01', 'T02', 'q25-q75', 'q5-q95',
+                                        'q50']
+    assert isinstance(renderers['q5-q95'].glyph, VArea)
+    source = renderers['q50'].data_source
+    # only the percentiles and the highlighted series.
+    assert sorted(source.data.keys()) == ['T01', 'T02', 'q25', 'q5', 'q50',
+                                          'q75', 'q95', 'x']
+    frame = pd.DataFrame(universe)
+    np.testing.assert_allclose(source.data['q50'], frame.median(axis=1))
+    np.testing.assert_allclose(source.data['T01'], universe['T01'])
+    assert source in dashboard.datasources
+    # the views are only added to the lines.
+    assert not isinstance(renderers['q50'].glyph.y, dict)
+
+    universe['T01'] = universe['T01'] * 2
+    dashboard.update_dashboard(input_data)
+    np.testing.assert_allclose(source.data['T01'], universe['T01'])
+    np.testing.assert_allclose(source.data['q50'],
+                               pd.DataFrame(universe).median(axis=1))
+
+    with pytest.raises(ValueError):
+        sdb().build_dashboard(input_data=input_data, show=False,
+                              panel_type='bars')
+
+
+def test_bin_rows():
+    from stocksdashboard.aggregations import bin_rows
+
+    x = np.array([0., 1., 2., 3., 6., 7.])
+    values = np.array([[1., 10.], [3., np.nan], [5., 30.], [7., 40.],
+                       [9., 50.], [11., 60.]])
+    binned = bin_rows(x, values, 0, 8, 4)
+    np.testing.assert_allclose(binned, [[2., 10.], [6., 35.],
+                                        [np.nan, np.nan], [10., 55.]])
+    # only the rows between start and end.
+    np.testing.assert_allclose(bin_rows(x, values, 1, 2, 1), [[4., 30.]])
+    assert np.isnan(bin_rows(x, values, 20, 30, 3)).all()
+
+
+def test_build_dashboard_heatmap():
+    from bokeh.events import RangesUpdate
+    from bokeh.models import GlyphRenderer, Image, Plot
+
+    ix = pd.date_range(start='2000-01-01', periods=size)
+    rng = np.random.RandomState(0)
+    universe = {'T%02d' % i: pd.Series(100 + rng.uniform(size=size),
+                                       index=ix)
+                for i in range(30)}
+    input_data = {'universe': universe,
+                  'stocks': {'A': pd.Series(data1['A'], index=ix)}}
+    dashboard = sdb(width=40)
+    dashboard.build_dashboard(input_data=input_data, show=False,
+                              panel_type={'universe': 'heatmap'})
+    plots = {p.name: p for p in dashboard.layout.select({'type': Plot})}
+    p = plots['universe']
+    renderers = [r for r in p.renderers if isinstance(r, GlyphRenderer)]
+    assert len(renderers) == 1
+    assert isinstance(renderers[0].glyph, Image)
+    source = renderers[0].data_source
+    image = source.data['image'][0]
+    # tickers x pixels
+    assert image.shape == (30, min(40, size))
+    assert p.yaxis[0].major_label_overrides[29.5] == 'T00'
+    returns = pd.DataFrame(universe).pct_change() * 100
+    x_ms = (ix.values.astype(np.int64) / 1e6)
+    start, end = x_ms[0], x_ms[-1]
+    assert source.data['x'] == [start]
+    assert source.data['dw'] == [end - start]
+    n_bins = image.shape[1]
+    bins = np.minimum(((x_ms - start) * n_bins / (end - start)).astype(int),
+                      n_bins - 1)
+    expected = returns.groupby(bins).mean().reindex(range(n_bins))
+    np.testing.assert_allclose(image[::-1].T, expected.values)
+
+    # binned again on zoom: one pixel per date.
+    p._trigger_event(RangesUpdate(p, x0=x_ms[10], x1=x_ms[19]))
+    image = source.data['image'][0]
+    assert image.shape == (30, 10)
+    np.testing.assert_allclose(image[::-1, :9].T,
+                               returns.values[10:19], rtol=1e-10)
+
+    universe['T00'] = universe['T00'] * 2
+    dashboard.update_dashboard(input_data)
+    assert np.isnan(source.data['image'][0][-1]).sum() < size
+
+
+def test_build_dashboard_picker():
+    from bokeh.models import GlyphRenderer, MultiChoice, MultiLine, Plot
+
+    ix = pd.date_range(start='2000-01-01', periods=size)
+    rng = np.random.RandomState(0)
+    universe = {'T%03d' % i: pd.Series(rng.normal(size=size), index=ix)
+                for i in range(200)}
+    input_data = {'universe': universe,
+                  'stocks': {'A': pd.Series(data1['A'], index=ix)}}
+    dashboard = sdb()
+    dashboard.build_dashboard(input_data=input_data, show=False,
+                              panel_type={'universe': 'picker'},
+                              highlight=['T010', 'T020'], views=True)
+    # the view selector and then the pickers, above the plots.
+    widget = dashboard.layout.children[1]
+    assert isinstance(widget, MultiChoice)
+    assert widget is dashboard.pickers['universe']['widget']
+    assert len(widget.options) == 200
+    assert widget.value == ['T010', 'T020']
+    plots = {p.name: p for p in dashboard.layout.select({'type': Plot})}
+    renderers = [r for r in plots['universe'].renderers
+                 if isinstance(r, GlyphRenderer)]
+    assert len(renderers) == 1
+    assert isinstance(renderers[0].glyph, MultiLine)
+    source = renderers[0].data_source
+    assert source.data['name'] == ['T010', 'T020']
+    np.testing.assert_allclose(source.data['ys'][1], universe['T020'])
+    assert len(plots['universe'].legend[0].items) == 1
+
+    widget.value = ['T001', 'T002', 'T003']
+    assert source.data['name'] == ['T001', 'T002', 'T003']
+    assert len(source.data['ys']) == 3
+    np.testing.assert_allclose(source.data['ys'][0], universe['T001'])
+
+    from bokeh.document import Document
+    doc = Document()
+    doc.add_root(dashboard.layout)
+    changes = []
+    doc.on_change(lambda event: changes.append(event)
+                  if getattr(event, 'model', None) is source else None)
+    del universe['T002']
+    universe['T001'] = universe['T001'] * 2
+    dashboard.update_dashboard(input_data)
+    assert widget.value == ['T001', 'T003']
+    assert len(widget.options) == 199
+    np.testing.assert_allclose(source.data['ys'][0], universe['T001'])
+    # picked once
+    assert len(changes) == 1
+
+    del changes[:]
+    universe['T003'] = universe['T003'] * 2
+    dashboard.update_dashboard(input_data)
+    np.testing.assert_allclose(source.data['ys'][1], universe['T003'])
+    assert len(changes) == 1
+
+
+def test_show_notebook(monkeypatch):
+    import json
+    import bokeh.io.notebook
+    from bokeh.io import reset_output
+
+    class Comm():
+        def __init__(self):
+            self.messages = []
+
+        def send(self, data=None, buffers=None):
+            self.messages.append(data if buffers is None else buffers)
+
+    comm = Comm()
+    displayed = []
+    monkeypatch.setattr(bokeh.io.notebook, 'get_comms',
+                        lambda target_name: comm)
+    monkeypatch.setattr(bokeh.io.notebook, 'publish_display_data',
+                        lambda *args, **kwargs: displayed.append(args))
+    ix = pd.date_range(start='2000-01-01', periods=size)
+    input_data = {'stocks': {'A': pd.Series(data1['A'], index=ix),
+                             'B': pd.Series(data1['B'], index=ix)}}
+    dashboard = sdb()
+    try:
+        dashboard.build_dashboard(input_data=input_data, show='notebook')
+        assert dashboard.notebook_handle is not None
+        n_displayed = len(displayed)
+        # nothing changed
+        dashboard.update_dashboard(input_data)
+        assert comm.messages == []
+
+        # the new rows are streamed
+        ix2 = pd.date_range(start='2000-01-01', periods=size + 2)
+        input_data = {'stocks': {
+            name: pd.Series(np.append(data1[name], [1., 2.]), index=ix2)
+            for name in ['A', 'B']}}
+        dashboard.update_dashboard(input_data)
+        events = json.loads(comm.messages[2])['events']
+        streamed = [e for e in events if e['kind'] == 'ColumnsStreamed']
+        assert len(streamed) == 1
+        assert 'ColumnDataChanged' not in [e['kind'] for e in events]
+        assert streamed[0]['data']['A'] == [1., 2.]
+
+        # only the changed rows are sent
+        del comm.messages[:]
+        input_data['stocks']['B'] = input_data['stocks']['B'].copy()
+        input_data['stocks']['B'].iloc[3] = -1.
+        dashboard.update_dashboard(input_data)
+        events = json.loads(comm.messages[2])['events']
+        assert [e['kind'] for e in events] == ['ColumnsPatched']
+        assert events[0]['patches'] == {
+            'B': [[{'start': 3, 'step': None, 'stop': 4}, [-1.]]]}
+        # shown once
+        assert len(displayed) == n_displayed
+    finally:
+        reset_output()
@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+# Authors: Mabel Villalba Jimenez <mabelvj@gmail.com>,
+#          Emilio Molina Martinez <emilio.mol.mar@gmail.com>
+# License: GPLv3
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import numpy as np
+import pandas as pd
+from bokeh.document import Document
+from bokeh.models import Plot
+from bokeh.document.events import ColumnsPatchedEvent
+from bokeh.document.events import ColumnsStreamedEvent
+
+from stocksdashboard.stocksdashboard import StocksDashboard
+from stocksdashboard.tailing import CsvTail
+from stocksdashboard.tailing import FileRefresher
+
+dates = pd.date_range(start='2000-01-01', periods=20).strftime('%Y-%m-%d')
+
+
+def write_rows(path, rows, mode='a'):
+    with open(str(path), mode) as f:
+        if mode == 'w':
+            f.write('date,open,adj_close\n')
+        for date, value in rows:
+            f.write('%s,0,%s\n' % (date, value))
+
+
+def test_csv_tail(tmpdir):
+    path = tmpdir.join('a.csv')
+    write_rows(path, [(dates[0], 1.), (dates[1], 2.)], mode='w')
+    tail = CsvTail(str(path))
+    assert tail.changed()
+    first = tail.read()
+    assert list(first.values) == [1., 2.]
+    assert first.index[0] == pd.Timestamp(dates[0])
+    assert not tail.changed()
+    offset = tail.offset
+
+    # only complete lines are read
+    with open(str(path), 'a') as f:
+        f.write('%s,0,3\n%s,0,4' % (dates[2], dates[3]))
+    assert tail.changed()
+    assert list(tail.read().values) == [3.]
+    assert tail.offset > offset
+    with open(str(path), 'a') as f:
+        f.write('.5\n')
+    assert list(tail.read().values) == [4.5]
+    assert len(tail.read()) == 0
+
+    # replaced by a smaller file: read again
+    write_rows(path, [(dates[0], 7.)], mode='w')
+    assert list(tail.read().values) == [7.]
+
+
+def test_file_refresher(tmpdir):
+    files = {'stocks': {'A': str(tmpdir.join('a.csv')),
+                        'B': str(tmpdir.join('b.csv'))}}
+    write_rows(files['stocks']['A'], [(d, i) for i, d in
+                                      enumerate(dates[:10])], mode='w')
+    write_rows(files['stocks']['B'], [(d, -i) for i, d in
+                                      enumerate(dates[:10])], mode='w')
+    refresher = FileRefresher(files)
+    sdb = StocksDashboard()
+    sdb.build_dashboard(input_data=refresher.read(), show=False)
+    doc = Document()
+    doc.add_root(sdb.layout)
+    events = []
+    doc.on_change(lambda event: events.append(event.hint)
+                  if isinstance(event.hint, (ColumnsPatchedEvent,
+                                             ColumnsStreamedEvent))
+                  else None)
+    source = sdb.datasources[0]
+    assert refresher.poll(sdb) == 0
+
+    # A is updated first: B is NaN until its file is updated.
+    write_rows(files['stocks']['A'], [(dates[10], 10), (dates[11], 11)])
+    assert refresher.poll(sdb) == 2
+    assert len(source.data['x']) == 12
+    assert list(source.data['A'][-3:]) == [9, 10, 11]
+    assert np.isnan(source.data['B'][-2:]).all()
+    assert len(events) == 1
+    assert isinstance(events[0], ColumnsStreamedEvent)
+    assert len(events[0].data['x']) == 2
+    # the x range showed the last date: extended.
+    plot = sdb.layout.select_one({'type': Plot})
+    assert pd.Timestamp(plot.x_range.end) == pd.Timestamp(dates[11])
+
+    del events[:]
+    write_rows(files['stocks']['B'], [(dates[10], -10), (dates[11], -11),
+                                      (dates[12], -12)])
+    assert refresher.poll(sdb) == 3
+    assert list(source.data['B'][-3:]) == [-10, -11, -12]
+    assert np.isnan(source.data['A'][-1])
+    assert len(events) == 2
+    assert isinstance(events[0], ColumnsPatchedEvent)
+    assert isinstance(events[1], ColumnsStreamedEvent)
+
+
+def test_file_refresher_panels(tmpdir):
+    # the same name in two panels, from different files.
+    files = {'stocks': {'A': str(tmpdir.join('a.csv'))},
+             'other': {'A': str(tmpdir.join('other_a.csv'))}}
+    write_rows(files['stocks']['A'], [(d, i) for i, d in
+                                      enumerate(dates[:10])], mode='w')
+    write_rows(files['other']['A'], [(d, -i) for i, d in
+                                     enumerate(dates[:10])], mode='w')
+    refresher = FileRefresher(files)
+    sdb = StocksDashboard()
+    sdb.build_dashboard(input_data=refresher.read(), show=False,
+                        align=False)
+    plots = {p.name: p for p in sdb.layout.select({'type': Plot})}
+    source = {title: plots[title].renderers[0].data_source
+              for title in plots}
+    write_rows(files['other']['A'], [(dates[10], -10)])
+    assert refresher.poll(sdb) == 1
+    assert list(source['other'].data['A'][-2:]) == [-9, -10]
+    assert len(source['stocks'].data['A']) == 10
+    assert source['stocks'].data['A'][-1] == 9
@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+# Authors: Mabel Villalba Jimenez <mabelvj@gmail.com>,
+#          Emilio Molina Martinez <emilio.mol.mar@gmail.com>
+# License: GPLv3
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import numpy as np
+import pandas as pd
+from bokeh.document import Document
+from bokeh.models import ColumnDataSource, GlyphRenderer
+
+from stocksdashboard.template_cache import DocumentTemplate
+
+size = 50
+np.random.seed(42)
+ix = pd.date_range(start='2000-01-01', periods=size)
+input_data = {'stocks': {'A': pd.Series(np.random.uniform(size=size),
+                                        index=ix),
+                         'B': pd.Series(np.random.uniform(size=size),
+                                        index=ix)},
+              'avg': {'C': pd.Series(np.random.uniform(size=size),
+                                     index=ix)}}
+
+
+class ServerContext():
+    pass
+
+
+class SessionContext():
+    def __init__(self, server_context):
+        self.server_context = server_context
+
+
+class SessionDocument():
+    def __init__(self, server_context):
+        self.session_context = SessionContext(server_context)
+
+
+def test_new_document_shares_data():
+    template = DocumentTemplate(input_data=input_data, title='Test')
+    docs = [template.new_document() for i in range(2)]
+    sources = [{s.id: s for s in doc.select({'type': ColumnDataSource})}
+               for doc in docs]
+    assert sorted(sources[0].keys()) == sorted(template.data.keys())
+    for source_id, source in list(sources[0].items()):
+        other = sources[1][source_id]
+        assert source is not other
+        for k, v in list(source.data.items()):
+            assert v is other.data[k]
+            assert not v.flags.writeable
+    assert sorted([r.name for r in docs[0].select({'type': GlyphRenderer})
+                   ]) == ['A', 'B', 'C']
+    assert docs[0].title == 'Test'
+    assert np.array_equal(
+        docs[0].select_one({'type': GlyphRenderer, 'name': 'B'}
+                           ).data_source.data['B'],
+        input_data['stocks']['B'].values)
+
+
+def test_register_and_from_context():
+    doc = Document()
+    assert DocumentTemplate.from_context(doc) is None
+    server_context = ServerContext()
+    template = DocumentTemplate(input_data=input_data).register(
+        server_context)
+    doc = SessionDocument(server_context)
+    assert DocumentTemplate.from_context(doc) is template
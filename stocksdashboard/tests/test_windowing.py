@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+# Authors: Mabel Villalba Jimenez <mabelvj@gmail.com>,
+#          Emilio Molina Martinez <emilio.mol.mar@gmail.com>
+# License: GPLv3
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import threading
+
+import numpy as np
+import pandas as pd
+from bokeh.events import RangesUpdate
+from bokeh.models import Plot
+
+from stocksdashboard.aggregations import bin_rows
+from stocksdashboard.stocksdashboard import StocksDashboard
+from stocksdashboard.windowing import WindowCache
+
+rng = np.random.RandomState(0)
+x = np.arange(1000, dtype=float)
+values = rng.normal(size=(1000, 3))
+
+
+def test_window_cache():
+    calls = []
+
+    def compute(data, start, end, n_bins):
+        calls.append((start, end, n_bins))
+        return bin_rows(data[0], data[1], start, end, n_bins)
+
+    windows = WindowCache(compute, data=(x, values))
+    # zoom: nothing to prefetch
+    windows.get(0, 1000, 100)
+    windows.get(0, 100, 10)
+    windows.wait()
+    assert len(calls) == 2 and windows.misses == 2
+
+    # pan to the right: the next window is prefetched
+    start, binned = windows.get(20, 120, 10)
+    windows.wait()
+    assert calls[-1] == (20, 220, 20)
+    assert start == 20
+    np.testing.assert_allclose(binned, bin_rows(x, values, 20, 120, 10))
+
+    start, binned = windows.get(50, 150, 10)
+    windows.wait()
+    assert windows.hits == 1
+    assert start == 50
+    # the bins of the window (the last one without the row at its end).
+    np.testing.assert_allclose(binned,
+                               bin_rows(x, values, 20, 220, 20)[3:13])
+    assert calls[-1] == (50, 250, 20)
+    # not on the bins of the window: from the bin containing the start.
+    start, binned = windows.get(55, 155, 10)
+    windows.wait()
+    assert start == 50 and len(binned) == 11
+    np.testing.assert_allclose(binned,
+                               bin_rows(x, values, 20, 220, 20)[3:14])
+
+    # to the left
+    windows.get(40, 140, 10)
+    windows.wait()
+    windows.get(30, 130, 10)
+    windows.wait()
+    assert calls[-1] == (-70, 130, 20)
+
+    # discarded when the rows change
+    windows.clear()
+    windows.get(30, 130, 10)
+    assert windows.hits == 4 and calls[-1] == (30, 130, 10)
+    assert windows._executor is None
+
+
+def test_window_cache_snapshot():
+    started = threading.Event()
+    resume = threading.Event()
+    seen = []
+
+    def compute(data, start, end, n_bins):
+        if threading.current_thread() is not threading.main_thread():
+            started.set()
+            resume.wait(5)
+        seen.append(data)
+        return bin_rows(data[0], data[1], start, end, n_bins)
+
+    windows = WindowCache(compute, data=(x, values))
+    for start in [0, 10]:
+        windows.get(start, start + 100, 10)
+    assert started.wait(5)
+    # the rows change while the window is being prefetched
+    executor = windows._executor
+    windows.clear(data=(x[:500], values[:500]))
+    resume.set()
+    windows.wait()
+    assert seen[-1][0] is x and seen[-1][1] is values
+    assert windows._executor is None and executor._shutdown
+    assert not windows._windows
+    windows.get(10, 110, 10)
+    assert len(seen[-1][0]) == 500
+
+
+def test_heatmap_prefetch():
+    ix = pd.date_range(start='2000-01-01', periods=len(x))
+    universe = {'T%d' % i: pd.Series(100 + values[:, i], index=ix)
+                for i in range(values.shape[1])}
+    dashboard = StocksDashboard(width=40)
+    dashboard.build_dashboard(input_data={'universe': universe}, show=False,
+                              panel_type='heatmap')
+    p = dashboard.layout.select_one({'type': Plot})
+    heatmap = dashboard.heatmaps['universe']
+    source = heatmap['source']
+    day = 86400000.
+    x0 = heatmap['x'][0]
+    for shift in [100, 110, 120, 125]:
+        p._trigger_event(RangesUpdate(p, x0=x0 + shift * day,
+                                      x1=x0 + (shift + 80) * day))
+        start = source.data['x'][0]
+        n_bins = source.data['image'][0].shape[1]
+        # (the last bin of a prefetched window does not include its end)
+        np.testing.assert_allclose(
+            source.data['image'][0][:, :-1],
+            bin_rows(heatmap['x'], heatmap['returns'], start,
+                     start + n_bins * 2 * day, n_bins).T[::-1, :-1])
+        assert source.data['dw'][0] == n_bins * 2 * day
+        heatmap['windows'].wait()
+    assert heatmap['windows'].hits == 2
+
+    # the background thread is stopped on rebuild
+    windows = heatmap['windows']
+    assert windows._executor is not None
+    dashboard.build_dashboard(input_data={'universe': universe}, show=False,
+                              panel_type='heatmap')
+    assert windows._executor is None
+
+    # not prefetched
+    dashboard.heatmap_prefetch = False
+    dashboard.build_dashboard(input_data={'universe': universe}, show=False,
+                              panel_type='heatmap')
+    assert 'windows' not in dashboard.heatmaps['universe']
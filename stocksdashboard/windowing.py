@@ -0,0 +1,180 @@
+#!/usr/bin/env python3
+# Authors: Mabel Villalba Jimenez <mabelvj@gmail.com>,
+#          Emilio Molina Martinez <emilio.mol.mar@gmail.com>
+# License: GPLv3
+
+"""
+    Cache of the binned windows of a panel that is binned again on each
+    change of its x range (see the 'heatmap' ``panel_type`` of
+    :meth:`StocksDashboard.build_dashboard`), with the windows next to the
+    visible one computed in a background thread while the user pans.
+"""
+
+import collections
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+
+class WindowCache():
+
+    """
+        Binned windows of the rows of a panel, prefetched in the direction
+        of the pans.
+
+        When the last ``history`` windows requested have the same width and
+        move in the same direction, the window of twice that width from the
+        visible one towards that direction is binned in a background
+        thread, with the same bins. The next window of the pan is then
+        sliced from it if it is inside, instead of binning the rows again.
+
+        Params
+        ------
+        compute: callable
+            ``compute(data, start, end, n_bins)``: 2-D array (n_bins x
+            series) of the rows of ``data`` between ``start`` and ``end``,
+            i.e. :func:`aggregations.bin_rows`. Called from the background
+            thread too: it must not modify the document.
+        data: tuple, optional
+            Rows passed to ``compute``, i.e. (x, values). Replaced with
+            :meth:`clear`. The background thread uses the data at the time
+            the window was requested.
+        size: int, default 4
+            Windows kept.
+        history: int, default 2
+            Windows requested used to predict the direction of the pan.
+    """
+
+    def __init__(self, compute, data=None, size=4, history=2):
+        self.compute = compute
+        self.data = data
+        self.size = size
+        self._windows = collections.OrderedDict()
+        self._ranges = collections.deque(maxlen=max(history, 2))
+        self._lock = threading.Lock()
+        self._executor = None
+        self._pending = {}
+        self._generation = 0
+        self.hits = 0
+        self.misses = 0
+
+    def clear(self, data=None):
+        """
+            Forget the windows and the pan, i.e. when the rows change to
+            ``data`` (if given). The windows being prefetched are discarded.
+        """
+        with self._lock:
+            self._generation += 1
+            self._windows.clear()
+            self._ranges.clear()
+            if data is not None:
+                self.data = data
+        self.close()
+
+    def close(self):
+        """
+            Stop the background thread once the window being prefetched
+            (if any) is done. It is started again by the next prefetch.
+        """
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False)
+
+    def wait(self):
+        """ Wait for the windows being prefetched. """
+        with self._lock:
+            pending = list(self._pending.values())
+        for future in pending:
+            future.result()
+
+    def _find(self, start, end, bin_width):
+        tolerance = 1e-6 * bin_width
+        for key, (_start, binned) in list(self._windows.items()):
+            if (not np.isclose(key[1], bin_width, rtol=1e-9, atol=0) or
+                    start < _start - tolerance or
+                    end > _start + len(binned) * bin_width + tolerance):
+                continue
+            self._windows.move_to_end(key)
+            first = int(np.floor((start - _start) / bin_width + 1e-6))
+            last = int(np.ceil((end - _start) / bin_width - 1e-6))
+            last = max(last, first + 1)
+            return _start + first * bin_width, binned[first:last]
+        return None
+
+    def get(self, start, end, n_bins):
+        """
+            Bins of the rows between ``start`` and ``end``, and prefetch of
+            the next window of the pan.
+
+            Returns
+            -------
+            start: float
+                Start of the first bin: ``start``, or the start of the bin
+                containing it if sliced from a prefetched window.
+            binned: np.ndarray
+                2-D array (bins x series) of bins of width
+                ``(end - start) / n_bins``, from the returned start to
+                ``end``. The rows at the end of the last bin are only
+                included if it is the end of the window binned.
+        """
+        bin_width = (end - start) / float(n_bins)
+        with self._lock:
+            found = self._find(start, end, bin_width) if bin_width > 0 \
+                else None
+            self._ranges.append((start, end))
+            data = self.data
+        if found is None:
+            self.misses += 1
+            found = (start, self.compute(data, start, end, n_bins))
+        else:
+            self.hits += 1
+        if bin_width > 0:
+            self._prefetch(start, end, n_bins)
+        return found
+
+    def _direction(self):
+        ranges = list(self._ranges)
+        widths = [end - start for start, end in ranges]
+        if not np.allclose(widths, widths[-1], rtol=1e-6, atol=0):
+            return 0
+        moves = np.sign(np.diff([start for start, end in ranges]))
+        if len(moves) and (moves == moves[-1]).all():
+            return int(moves[-1])
+        return 0
+
+    def _prefetch(self, start, end, n_bins):
+        with self._lock:
+            direction = self._direction() if \
+                len(self._ranges) == self._ranges.maxlen else 0
+            if not direction:
+                return
+            width = end - start
+            bin_width = width / float(n_bins)
+            # one window at a time, and only if the next one is not cached.
+            if self._pending or self._find(start + direction * width,
+                                           end + direction * width,
+                                           bin_width) is not None:
+                return
+            _start = start if direction > 0 else start - width
+            key = (_start, bin_width)
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=1)
+            generation = self._generation
+            self._pending[key] = self._executor.submit(
+                self._compute_window, self.data, key, generation, 2 * n_bins)
+
+    def _compute_window(self, data, key, generation, n_bins):
+        _start, bin_width = key
+        binned = None
+        try:
+            binned = self.compute(data, _start, _start + n_bins * bin_width,
+                                  n_bins)
+        finally:
+            with self._lock:
+                self._pending.pop(key, None)
+                if binned is not None and generation == self._generation:
+                    self._windows[key] = (_start, binned)
+                    while len(self._windows) > self.size:
+                        self._windows.popitem(last=False)